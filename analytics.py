@@ -0,0 +1,158 @@
+"""Precomputed farmer analytics.
+
+Sales and offer activity are kept in one ``FarmerDailyRollup`` document per
+farmer, product and UTC day. Offer and Order saves apply ``$inc`` updates to
+the matching rollup (see models.py), so dashboard totals are read from at most
+``days x products`` small documents through one indexed query instead of
+scanning ``orders`` and ``offers`` on every page view.
+
+``rebuild()`` recomputes the rollups from history with ``$group`` pipelines;
+run it through rebuild_analytics.py to backfill or to repair drift.
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import archive
+from cache import documents
+from models import FarmerDailyRollup, Offer, Order, Product
+
+SUMMARY_DAYS = 30
+TOP_PRODUCTS = 5
+CENTS = Decimal('0.01')
+
+
+class FarmerAnalytics(namedtuple('FarmerAnalytics', [
+        'days', 'revenue', 'order_count', 'quantity',
+        'offers_received', 'offers_accepted', 'offers_rejected', 'top_products'])):
+    """Totals for the dashboard widgets"""
+
+    @property
+    def acceptance_rate(self):
+        """Share of answered offers that were accepted, or None if none were answered"""
+        answered = self.offers_accepted + self.offers_rejected
+        return self.offers_accepted / answered if answered else None
+
+
+class ProductTotals(namedtuple('ProductTotals', ['product_id', 'revenue', 'order_count', 'quantity'])):
+    """Per-product totals for the summary window"""
+
+    @property
+    def product(self):
+        """Get product object"""
+        return documents.get(Product, self.product_id)
+
+
+def summary_query(farmer_id, days=SUMMARY_DAYS):
+    """Raw query for the rollups covering the last ``days`` days (today included)"""
+    since = FarmerDailyRollup.day_of(datetime.utcnow()) - timedelta(days=days - 1)
+    return {'farmer_id': farmer_id, 'day': {'$gte': since}}
+
+
+def summarize(rollups, days=SUMMARY_DAYS):
+    """Fold rollup documents into a FarmerAnalytics"""
+    totals = defaultdict(int)
+    revenue = Decimal('0')
+    per_product = {}
+    for rollup in rollups:
+        revenue += rollup.revenue
+        for field in ('order_count', 'quantity', 'offers_received', 'offers_accepted', 'offers_rejected'):
+            totals[field] += getattr(rollup, field)
+        if rollup.order_count:
+            current = per_product.get(rollup.product_id, (Decimal('0'), 0, 0))
+            per_product[rollup.product_id] = (current[0] + rollup.revenue,
+                                              current[1] + rollup.order_count,
+                                              current[2] + rollup.quantity)
+
+    top_products = sorted(
+        (ProductTotals(product_id, product_revenue.quantize(CENTS), order_count, quantity)
+         for product_id, (product_revenue, order_count, quantity) in per_product.items()),
+        key=lambda totals: totals.revenue, reverse=True
+    )[:TOP_PRODUCTS]
+
+    return FarmerAnalytics(
+        days=days,
+        revenue=revenue.quantize(CENTS),
+        order_count=totals['order_count'],
+        quantity=totals['quantity'],
+        offers_received=totals['offers_received'],
+        offers_accepted=totals['offers_accepted'],
+        offers_rejected=totals['offers_rejected'],
+        top_products=top_products
+    )
+
+
+def farmer_summary(farmer_id, days=SUMMARY_DAYS):
+    """Return the FarmerAnalytics of ``farmer_id`` for the last ``days`` days"""
+    return summarize(FarmerDailyRollup.objects(__raw__=summary_query(farmer_id, days)), days)
+
+
+def _group_key(date_field):
+    return {
+        'farmer_id': '$farmer_id',
+        'product_id': '$product_id',
+        'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': date_field}},
+    }
+
+
+def _history(match):
+    """Yield ``(key, counts)`` pairs recomputed from the orders and offers
+    collections and their archives"""
+    orders = Order._get_collection().aggregate([
+        *archive.with_archive(Order, dict(match, status={'$ne': 'cancelled'})),
+        {'$group': {
+            '_id': _group_key('$created_at'),
+            'order_count': {'$sum': 1},
+            'quantity': {'$sum': '$quantity'},
+            'revenue': {'$sum': {'$toDecimal': '$total_amount'}},
+        }},
+    ], allowDiskUse=True)
+    for row in orders:
+        key = row.pop('_id')
+        row['revenue'] = row['revenue'].to_decimal().quantize(CENTS)
+        yield key, row
+
+    received = Offer._get_collection().aggregate([
+        *archive.with_archive(Offer, match),
+        {'$group': {'_id': _group_key('$created_at'), 'offers_received': {'$sum': 1}}},
+    ], allowDiskUse=True)
+    for row in received:
+        yield row.pop('_id'), row
+
+    answered = Offer._get_collection().aggregate([
+        *archive.with_archive(Offer, dict(match, status={'$in': ['accepted', 'rejected']}, responded_at={'$ne': None})),
+        {'$group': {
+            '_id': dict(_group_key('$responded_at'), status='$status'),
+            'count': {'$sum': 1},
+        }},
+    ], allowDiskUse=True)
+    for row in answered:
+        key = row['_id']
+        yield key, {f"offers_{key.pop('status')}": row['count']}
+
+
+def rebuild(farmer_id=None, batch_size=1000):
+    """Recompute the rollups of one farmer (or all farmers) from history.
+
+    Existing rollups in scope are replaced. Saves that land while the rebuild
+    is running can be lost, so run it when traffic is low.
+    Returns the number of rollup documents written.
+    """
+    match = {'farmer_id': farmer_id} if farmer_id is not None else {}
+    merged = defaultdict(dict)
+    for key, counts in _history(match):
+        bucket = merged[(key['farmer_id'], key['product_id'], key['day'])]
+        for field, value in counts.items():
+            bucket[field] = bucket.get(field, 0) + value
+
+    rollups = [
+        FarmerDailyRollup(farmer_id=farmer, product_id=product,
+                          day=datetime.strptime(day, '%Y-%m-%d'), **counts).to_mongo()
+        for (farmer, product, day), counts in merged.items()
+    ]
+
+    collection = FarmerDailyRollup._get_collection()
+    collection.delete_many(match)
+    for start in range(0, len(rollups), batch_size):
+        collection.insert_many(rollups[start:start + batch_size], ordered=False)
+    return len(rollups)
@@ -1,11 +1,12 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_from_directory
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_wtf.csrf import generate_csrf
 from werkzeug.utils import secure_filename
-from mongoengine import connect, Q
+from mongoengine import Q
+from mongoengine.errors import NotUniqueError
 from bson import ObjectId
 from bson.errors import InvalidId
 import os
+import re
 import uuid
 from datetime import datetime
 from decimal import Decimal
@@ -16,16 +17,50 @@ load_dotenv()
 
 # Import application modules
 from config import Config
+import archive
+import assets
+import auth
+import bootstrap
+import db
+import geo
+from cache import documents
+from dashboard import load_farmer_dashboard
+from facets import get_facets, normalize as facet_filter
+from passwords import HashingBusy
+import compression
+import conditional
+import metrics
+import price_history
+import render_cache
+import search
+import suggest
 from models import User, Product, CartItem, Offer, Order
-from forms import (RegistrationForm, LoginForm, ProductForm, EditProductForm, 
-                   AddToCartForm, OfferForm, UpdateCartItemForm, SearchForm)
+# forms (WTForms + email_validator) is imported inside the views that need it
+# to keep serverless cold starts short
 
 # Create Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# Initialize MongoDB connection
-connect(host=app.config['MONGODB_URI'])
+# Initialize Prometheus instrumentation
+metrics.init_app(app)
+
+# Initialize MongoDB connection (created lazily in each worker process)
+db.init_app(app)
+
+# Resolve fingerprinted asset URLs from the build manifest (see assets.py)
+assets.init_app(app)
+
+# Compress responses and serve precompressed static assets (see compression.py).
+# Registered before the page caches so its after_request hook runs after
+# theirs, on the final body.
+compression.init_app(app)
+
+# Answer conditional GETs for catalog pages before the page cache or the
+# views run (see conditional.py), then cache anonymous pages and product
+# card fragments (see render_cache.py)
+conditional.init_app(app)
+render_cache.init_app(app)
 
 # Initialize login manager
 login_manager = LoginManager()
@@ -36,16 +71,16 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user by ID for Flask-Login"""
+    """Load a cached user snapshot by ID for Flask-Login (see auth.py)"""
     try:
-        return User.objects(id=ObjectId(user_id)).first()
-    except (InvalidId, Exception):
+        return auth.load_user(user_id)
+    except Exception:
         return None
 
 # Context processor to make CSRF token available in all templates
 @app.context_processor
 def inject_csrf_token():
-    return dict(csrf_token=generate_csrf)
+    return dict(csrf_token=render_cache.csrf_token)
 
 # Helper functions
 def allowed_file(filename):
@@ -59,9 +94,20 @@ def save_uploaded_image(image_file):
         filename = str(uuid.uuid4()) + '.' + image_file.filename.rsplit('.', 1)[1].lower()
         image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         image_file.save(image_path)
+        metrics.record_upload(os.path.getsize(image_path))
         return filename
     return None
 
+def duplicate_user_field(error, form):
+    """Return the registration field a NotUniqueError on User refers to"""
+    match = re.search(r'index: (\w+?)_1', str(error))
+    if match and match.group(1) in form.DUPLICATE_ERRORS:
+        return match.group(1)
+    # No index name in the error text; only reached on the duplicate path
+    if User.objects(email=form.email.data).only('id').first():
+        return 'email'
+    return 'username'
+
 # Database connection check
 def check_database_connection():
     """Check if database is available"""
@@ -85,37 +131,70 @@ class Pagination:
         self.has_next = page < self.pages
         self.prev_num = page - 1 if self.has_prev else None
         self.next_num = page + 1 if self.has_next else None
+    
+    def iter_pages(self, left_edge=2, left_current=2, right_current=5, right_edge=2):
+        """Page numbers for the pagination bar; None marks a gap"""
+        last = 0
+        for num in range(1, self.pages + 1):
+            if (num <= left_edge or self.page - left_current - 1 < num < self.page + right_current
+                    or num > self.pages - right_edge):
+                if last + 1 != num:
+                    yield None
+                yield num
+                last = num
 
 def paginate_query(query, page, per_page):
     """Paginate MongoDB query"""
     total = query.count()
-    items = query.skip((page - 1) * per_page).limit(per_page)
+    items = list(query.skip((page - 1) * per_page).limit(per_page))
     return Pagination(page, per_page, total, items)
 
+def paginate_ranked(ranked_ids, query, page, per_page):
+    """Paginate ``query`` in the order of ``ranked_ids`` (search relevance)"""
+    matching = set(query.scalar('id'))
+    ranked = [product_id for product_id in ranked_ids if product_id in matching]
+    page_ids = ranked[(page - 1) * per_page:page * per_page]
+    found = documents.get_many(Product, page_ids)
+    return Pagination(page, per_page, len(ranked), [found[product_id] for product_id in page_ids if product_id in found])
+
+def prefetch_related(items, users=(), products=()):
+    """Warm the document cache for the relation properties templates use.
+
+    ``users`` and ``products`` name the ObjectId fields on ``items`` that point
+    to User and Product documents; each model is fetched with one query for
+    whatever is not cached yet.
+    """
+    if users:
+        documents.get_many(User, [getattr(item, field) for item in items for field in users])
+    if products:
+        documents.get_many(Product, [getattr(item, field) for item in items for field in products])
+
 # Routes
 @app.route('/')
 def index():
     """Homepage with featured products"""
-    search_form = SearchForm()
-    
     # Check database connection
     if not check_database_connection():
         flash('Database is currently unavailable. Please check back later.', 'warning')
-        return render_template('index.html', products=None, search_form=search_form, 
-                             search_query='', category='')
+        return render_template('index.html', products=None, search_query='', category='')
     
     # Get query parameters for search
     search_query = request.args.get('search_query', '').strip()
     category = request.args.get('category', '').strip()
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
+    near = geo.parse_near(request.args, getattr(current_user, 'location', None))
     
     try:
         # Build MongoDB query
         query_filters = Q(is_available=True)
         
-        # Apply search filters
-        if search_query:
+        # Apply search filters (fuzzy search index, see search.py)
+        ranked = search.ranked_ids(search_query) if search_query else None
+        if ranked is not None:
+            query_filters &= Q(id__in=ranked)
+        elif search_query:
+            # Index still building in this worker; fall back to substring search
             search_filters = Q(name__icontains=search_query) | Q(description__icontains=search_query) | Q(category__icontains=search_query)
             query_filters &= search_filters
         
@@ -128,17 +207,24 @@ def index():
         if max_price is not None:
             query_filters &= Q(price__lte=max_price)
         
+        if near:
+            query_filters &= Q(__raw__=geo.within(near))
+        
         # Get paginated results
         page = request.args.get('page', 1, type=int)
-        query = Product.objects(query_filters).order_by('-created_at')
-        products = paginate_query(query, page, 12)
+        if ranked is not None:
+            products = paginate_ranked(ranked, Product.objects(query_filters).read_preference(db.catalog_read_preference()), page, 12)
+        else:
+            query = Product.objects(query_filters).read_preference(db.catalog_read_preference()).order_by('-created_at')
+            products = paginate_query(query, page, 12)
+        prefetch_related(products.items, users=['farmer_id'])
+        facets = get_facets(facet_filter(request.args, near), ranked)
         
-        return render_template('index.html', products=products, search_form=search_form, 
-                             search_query=search_query, category=category)
+        return render_template('index.html', products=products, search_query=search_query, category=category,
+                               facets=facets, distances=geo.distances(products.items, near))
     except Exception as e:
         flash('Error loading products. Please try again later.', 'error')
-        return render_template('index.html', products=None, search_form=search_form, 
-                             search_query=search_query, category=category)
+        return render_template('index.html', products=None, search_query=search_query, category=category)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -146,17 +232,9 @@ def register():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
     
+    from forms import RegistrationForm
     form = RegistrationForm()
     if form.validate_on_submit():
-        # Check if username or email already exists
-        if User.objects(username=form.username.data).first():
-            flash('Username already exists. Please choose a different one.', 'error')
-            return render_template('register.html', form=form)
-        
-        if User.objects(email=form.email.data).first():
-            flash('Email already registered. Please use a different email.', 'error')
-            return render_template('register.html', form=form)
-        
         user = User(
             username=form.username.data,
             email=form.email.data,
@@ -165,12 +243,21 @@ def register():
             role=form.role.data,
             address=form.address.data
         )
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except HashingBusy:
+            flash('The server is busy right now. Please try again in a few seconds.', 'warning')
+            return render_template('register.html', form=form), 503, {'Retry-After': '5'}
         
         try:
-            user.save()
+            # Insert directly; the unique indexes on username/email (created on
+            # startup, see db.require_indexes) reject duplicates
+            user.save(force_insert=True)
             flash('Registration successful! You can now log in.', 'success')
             return redirect(url_for('login'))
+        except NotUniqueError as e:
+            field = duplicate_user_field(e, form)
+            getattr(form, field).errors.append(form.DUPLICATE_ERRORS[field])
         except Exception as e:
             flash('An error occurred during registration. Please try again.', 'error')
     
@@ -182,11 +269,26 @@ def login():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
     
+    from forms import LoginForm
     form = LoginForm()
     if form.validate_on_submit():
         user = User.objects(username=form.username.data).first()
         
-        if user and user.check_password(form.password.data):
+        try:
+            authenticated = user is not None and user.check_password(form.password.data)
+        except HashingBusy:
+            flash('Too many sign-in attempts right now. Please try again in a few seconds.', 'warning')
+            return render_template('login.html', form=form), 503, {'Retry-After': '5'}
+        
+        if authenticated:
+            # Upgrade the stored hash if the hashing parameters have changed
+            if user.password_needs_rehash():
+                try:
+                    user.set_password(form.password.data)
+                    user.save()
+                except HashingBusy:
+                    pass  # upgraded on a later login
+            
             login_user(user, remember=True)
             next_page = request.args.get('next')
             flash(f'Welcome back, {user.full_name}!', 'success')
@@ -219,16 +321,10 @@ def farmer_dashboard():
         flash('Access denied. Farmers only.', 'error')
         return redirect(url_for('index'))
     
-    # Get farmer's products
-    products = Product.objects(farmer_id=current_user.id).order_by('-created_at').limit(20)
+    # Products, offers and orders are queried concurrently (see dashboard.py)
+    dashboard = load_farmer_dashboard(current_user.id)
     
-    # Get recent offers
-    offers = Offer.objects(farmer_id=current_user.id).order_by('-created_at').limit(10)
-    
-    # Get recent orders
-    orders = Order.objects(farmer_id=current_user.id).order_by('-created_at').limit(10)
-    
-    return render_template('farmer_dashboard.html', products=products, offers=offers, orders=orders)
+    return render_template('farmer_dashboard.html', **dashboard._asdict())
 
 @app.route('/farmer/add_product', methods=['GET', 'POST'])
 @login_required
@@ -238,6 +334,7 @@ def add_product():
         flash('Access denied. Farmers only.', 'error')
         return redirect(url_for('index'))
     
+    from forms import ProductForm
     form = ProductForm()
     if form.validate_on_submit():
         # Handle image upload
@@ -287,6 +384,7 @@ def edit_product(product_id):
         flash('Access denied. You can only edit your own products.', 'error')
         return redirect(url_for('farmer_dashboard'))
     
+    from forms import EditProductForm
     form = EditProductForm()
     if request.method == 'GET':
         # Populate form with existing data
@@ -359,19 +457,24 @@ def delete_product(product_id):
 @app.route('/products')
 def product_list():
     """List all products"""
-    search_form = SearchForm()
-    
     # Get query parameters for search
     search_query = request.args.get('search_query', '').strip()
     category = request.args.get('category', '').strip()
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
+    near = geo.parse_near(request.args, getattr(current_user, 'location', None))
+    if request.args.get('radius') and near is None:
+        flash('Allow location access or add your address to filter products by distance.', 'info')
     
     # Build MongoDB query
     query_filters = Q(is_available=True)
     
-    # Apply search filters
-    if search_query:
+    # Apply search filters (fuzzy search index, see search.py)
+    ranked = search.ranked_ids(search_query) if search_query else None
+    if ranked is not None:
+        query_filters &= Q(id__in=ranked)
+    elif search_query:
+        # Index still building in this worker; fall back to substring search
         search_filters = Q(name__icontains=search_query) | Q(description__icontains=search_query) | Q(category__icontains=search_query)
         query_filters &= search_filters
     
@@ -384,18 +487,27 @@ def product_list():
     if max_price is not None:
         query_filters &= Q(price__lte=max_price)
     
+    if near:
+        query_filters &= Q(__raw__=geo.within(near))
+    
     # Get paginated results
     page = request.args.get('page', 1, type=int)
-    query = Product.objects(query_filters).order_by('-created_at')
-    products = paginate_query(query, page, 20)
+    if ranked is not None:
+        products = paginate_ranked(ranked, Product.objects(query_filters).read_preference(db.catalog_read_preference()), page, 20)
+    else:
+        query = Product.objects(query_filters).read_preference(db.catalog_read_preference()).order_by('-created_at')
+        products = paginate_query(query, page, 20)
+    prefetch_related(products.items, users=['farmer_id'])
+    facets = get_facets(facet_filter(request.args, near), ranked)
     
-    return render_template('product_list.html', products=products, search_form=search_form)
+    return render_template('product_list.html', products=products, facets=facets, near=near,
+                           distances=geo.distances(products.items, near), radius_choices=geo.RADIUS_CHOICES)
 
 @app.route('/product/<product_id>')
 def product_detail(product_id):
     """Product detail page"""
     try:
-        product = Product.objects(id=ObjectId(product_id)).first()
+        product = documents.get(Product, ObjectId(product_id))
     except InvalidId:
         flash('Invalid product ID.', 'error')
         return redirect(url_for('index'))
@@ -404,6 +516,7 @@ def product_detail(product_id):
         flash('Product not found.', 'error')
         return redirect(url_for('index'))
     
+    from forms import AddToCartForm, OfferForm
     add_to_cart_form = AddToCartForm()
     offer_form = OfferForm()
     
@@ -417,6 +530,7 @@ def add_to_cart():
     if current_user.role != 'consumer':
         return jsonify({'success': False, 'message': 'Only consumers can add items to cart'})
     
+    from forms import AddToCartForm
     form = AddToCartForm()
     if form.validate_on_submit():
         try:
@@ -473,7 +587,11 @@ def consumer_cart():
         flash('Access denied. Consumers only.', 'error')
         return redirect(url_for('index'))
     
-    cart_items = CartItem.objects(consumer_id=current_user.id)
+    cart_items = list(CartItem.objects(consumer_id=current_user.id))
+    if cart_items:
+        CartItem.touch(current_user.id)
+    # Names come from each item's snapshot; current price and stock are live
+    prefetch_related(cart_items, products=['product_id'])
     total = sum(item.total_price for item in cart_items)
     
     return render_template('consumer_cart.html', cart_items=cart_items, total=total)
@@ -499,12 +617,12 @@ def update_cart_item():
     
     if quantity <= 0:
         # Remove item
-        cart_item.delete()
+        cart_item.delete(**db.write_concern(db.EPHEMERAL))
     else:
         if quantity > cart_item.product.quantity:
             return jsonify({'success': False, 'message': f'Only {cart_item.product.quantity} {cart_item.product.unit} available'})
         cart_item.quantity = quantity
-        cart_item.save()
+        cart_item.save(write_concern=db.write_concern(db.EPHEMERAL))
     
     return jsonify({'success': True, 'message': 'Cart updated'})
 
@@ -527,7 +645,7 @@ def toggle_cart_item_selection():
         return jsonify({'success': False, 'message': 'Cart item not found'})
     
     cart_item.selected = not cart_item.selected
-    cart_item.save()
+    cart_item.save(write_concern=db.write_concern(db.EPHEMERAL))
     
     return jsonify({'success': True, 'selected': cart_item.selected})
 
@@ -538,6 +656,7 @@ def send_offer():
     if current_user.role != 'consumer':
         return jsonify({'success': False, 'message': 'Only consumers can send offers'})
     
+    from forms import OfferForm
     form = OfferForm()
     if form.validate_on_submit():
         try:
@@ -572,13 +691,11 @@ def send_offer():
 @login_required
 def offers():
     """View offers (farmer sees received, consumer sees sent)"""
-    if current_user.role == 'farmer':
-        offers_query = Offer.objects(farmer_id=current_user.id)
-    else:
-        offers_query = Offer.objects(consumer_id=current_user.id)
-    
+    field = 'farmer_id' if current_user.role == 'farmer' else 'consumer_id'
     page = request.args.get('page', 1, type=int)
-    offers_paginated = paginate_query(offers_query.order_by('-created_at'), page, 20)
+    # Recent offers first; the archive is read only past them (see archive.py)
+    total, items = archive.paginate(Offer, {field: current_user.id}, page, 20)
+    offers_paginated = Pagination(page, 20, total, items)
     
     return render_template('offers.html', offers=offers_paginated)
 
@@ -618,13 +735,11 @@ def respond_to_offer(offer_id, action):
 @login_required
 def orders():
     """View orders"""
-    if current_user.role == 'farmer':
-        orders_query = Order.objects(farmer_id=current_user.id)
-    else:
-        orders_query = Order.objects(consumer_id=current_user.id)
-    
+    field = 'farmer_id' if current_user.role == 'farmer' else 'consumer_id'
     page = request.args.get('page', 1, type=int)
-    orders_paginated = paginate_query(orders_query.order_by('-created_at'), page, 20)
+    total, items = archive.paginate(Order, {field: current_user.id}, page, 20)
+    orders_paginated = Pagination(page, 20, total, items)
+    bootstrap.mark_orders_seen()
     
     return render_template('orders.html', orders=orders_paginated)
 
@@ -633,6 +748,29 @@ def uploaded_file(filename):
     """Serve uploaded files"""
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
+@app.route('/api/username_available')
+def api_username_available():
+    """Live username availability check for the registration form"""
+    username = request.args.get('username', '').strip()
+    if not username:
+        return jsonify({'available': False})
+    
+    taken = User.objects(username=username).only('id').first() is not None
+    return jsonify({'available': not taken})
+
+@app.route('/api/suggest')
+def api_suggest():
+    """Type-ahead suggestions for the product search box"""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', type=int)
+    suggest.ensure_index()
+    terms = suggest.index.suggest(query, limit)
+    return jsonify({
+        'query': query,
+        'ready': suggest.is_ready(),
+        'suggestions': [{'text': term.text, 'kind': term.kind} for term in terms]
+    })
+
 @app.route('/api/cart_count')
 @login_required
 def api_cart_count():
@@ -643,6 +781,29 @@ def api_cart_count():
     count = CartItem.objects(consumer_id=current_user.id).count()
     return jsonify({'count': count})
 
+@app.route('/api/bootstrap')
+def api_bootstrap():
+    """Everything the page chrome needs in one request (see bootstrap.py)"""
+    if not current_user.is_authenticated:
+        return jsonify(bootstrap.payload(current_user))
+    return jsonify(bootstrap.payload(current_user, bootstrap.get_counts(current_user)))
+
+@app.route('/api/price_history/<product_id>')
+def api_price_history(product_id):
+    """Daily or weekly price summaries for the product page chart"""
+    period = request.args.get('period', 'day')
+    if period not in price_history.PRICE_PERIODS:
+        return jsonify({'error': 'Unknown period'}), 400
+    try:
+        product_id = ObjectId(product_id)
+    except InvalidId:
+        return jsonify({'error': 'Invalid product ID'}), 404
+    
+    response = jsonify(price_history.series(product_id, period))
+    response.cache_control.public = True
+    response.cache_control.max_age = price_history.MAX_AGE
+    return response
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -0,0 +1,140 @@
+"""Hot/cold storage of offers and orders.
+
+Accepted or rejected offers, and delivered or cancelled orders, created more
+than ``ARCHIVE_AFTER_DAYS`` ago are moved by ``python archive_history.py``
+into ``offers_archive`` and ``orders_archive`` (each model's
+``archive_collection``). Listings then scan and count only recent history,
+which keeps their working set small.
+
+A batch is copied to the archive (upserts, journaled on a majority) before
+it is deleted from the hot collection, so an interrupted run loses nothing
+and the next run picks up where it stopped. A document briefly in both
+collections is not listed twice on one page.
+
+The offers and orders pages list the hot documents first, newest first, and
+read the archive only for the pages past them (``paginate``). Archived
+counts are cached per listing in ``cache.archive_counts``, keyed by the
+archive generation: a ``CatalogVersion`` counter (``archive:<collection>``)
+that every archive batch bumps. A run in another process thus invalidates
+the cached counts of every worker.
+"""
+from datetime import datetime, timedelta
+
+from pymongo import DESCENDING, IndexModel, ReplaceOne
+
+import db
+from cache import archive_counts
+from config import Config
+from models import CatalogVersion, Offer, Order
+
+MODELS = (Offer, Order)
+NEWEST_FIRST = [('created_at', DESCENDING)]
+INDEXES = [
+    IndexModel([('consumer_id', 1), ('created_at', DESCENDING)]),
+    IndexModel([('farmer_id', 1), ('created_at', DESCENDING)]),
+]
+
+
+def archive_collection(model):
+    return model._get_db()[model.archive_collection]
+
+
+def archivable(model, cutoff):
+    """Query for the hot documents of ``model`` to archive"""
+    return {'status': {'$in': list(model.archived_statuses)}, 'created_at': {'$lt': cutoff}}
+
+
+def generation_key(model):
+    """The ``CatalogVersion`` key counting archive batches of ``model``"""
+    return f'archive:{model.archive_collection}'
+
+
+def generation(model):
+    key = generation_key(model)
+    return CatalogVersion.current(key)[key][0]
+
+
+def ensure_indexes():
+    for model in MODELS:
+        archive_collection(model).create_indexes(INDEXES)
+
+
+def archive(model, cutoff=None, batch_size=None):
+    """Move archivable documents of ``model`` in batches; returns how many moved"""
+    cutoff = cutoff or datetime.utcnow() - timedelta(days=Config.ARCHIVE_AFTER_DAYS)
+    batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+    query = archivable(model, cutoff)
+    hot = db.durable_collection(model, db.FINANCIAL)
+    cold = db.with_durability(archive_collection(model), db.FINANCIAL)
+    moved = 0
+    while True:
+        batch = list(hot.find(query).sort('_id', 1).limit(batch_size))
+        if not batch:
+            return moved
+        cold.bulk_write([ReplaceOne({'_id': son['_id']}, son, upsert=True) for son in batch], ordered=False)
+        # The query again, in case a document changed since it was read
+        moved += hot.delete_many(dict(query, _id={'$in': [son['_id'] for son in batch]})).deleted_count
+        CatalogVersion.bump(generation_key(model))
+
+
+def with_archive(model, match):
+    """Aggregation stages matching ``match`` in both the hot and the archive collection"""
+    return [
+        {'$match': match},
+        {'$unionWith': {'coll': model.archive_collection, 'pipeline': [{'$match': match}]}},
+    ]
+
+
+def _count_key(model, query, generation):
+    return (model.archive_collection, tuple(sorted(query.items())), generation)
+
+
+def lookup_count(model, query, generation):
+    """Cached number of archived documents matching ``query`` counted in
+    archive ``generation``, or None"""
+    return archive_counts.get(_count_key(model, query, generation))
+
+
+def store_count(model, query, generation, count):
+    archive_counts.set(_count_key(model, query, generation), count)
+
+
+def archived_count(model, query):
+    current = generation(model)
+    count = lookup_count(model, query, current)
+    if count is None:
+        count = archive_collection(model).count_documents(query)
+        store_count(model, query, current, count)
+    return count
+
+
+def archive_window(hot_total, page, per_page):
+    """``(skip, limit)`` of the archive part of a page, or None when the page
+    holds only hot documents"""
+    start = (page - 1) * per_page
+    end = start + per_page
+    if end <= hot_total:
+        return None
+    return max(0, start - hot_total), end - max(start, hot_total)
+
+
+def merge(hot_items, archived_items):
+    """A page of hot documents followed by archived ones, each shown once"""
+    seen = {item.id for item in hot_items}
+    return hot_items + [item for item in archived_items if item.id not in seen]
+
+
+def paginate(model, query, page, per_page):
+    """``(total, items)`` of a newest-first listing over the hot and archived
+    documents of ``model`` matching the raw ``query``"""
+    hot = model.objects(__raw__=query).order_by('-created_at')
+    hot_total = hot.count()
+    start = (page - 1) * per_page
+    items = list(hot.skip(start).limit(per_page)) if start < hot_total else []
+    archived_total = archived_count(model, query)
+    window = archive_window(hot_total, page, per_page)
+    if window is not None and archived_total:
+        skip, limit = window
+        cursor = archive_collection(model).find(query, sort=NEWEST_FIRST, skip=skip, limit=limit)
+        items = merge(items, [model._from_son(son) for son in cursor])
+    return hot_total + archived_total, items
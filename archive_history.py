@@ -0,0 +1,21 @@
+import sys
+from mongoengine import connect
+from archive import MODELS, archive
+from config import Config
+
+def archive_history(batch_size=None):
+    """Move resolved offers and delivered/cancelled orders older than
+    ARCHIVE_AFTER_DAYS into their archive collections.
+
+    Safe to interrupt and re-run: each batch is copied before it is removed
+    from the hot collection. Run it daily or weekly, preferably while
+    traffic is low, after create_indexes.py has created the archive indexes.
+    """
+    connect(host=Config.MONGODB_URI)
+
+    for model in MODELS:
+        moved = archive(model, batch_size=batch_size)
+        print(f"Archived {moved} documents from '{model._get_collection_name()}' to '{model.archive_collection}'")
+
+if __name__ == '__main__':
+    archive_history(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,268 @@
+"""Fingerprinted static assets.
+
+``python build_assets.py`` minifies every CSS and JS file under static/css
+and static/js and writes the result next to it under a content-hashed name
+(``css/styles.3f2a9c01b4de.css``). It also writes ``static/manifest.json``,
+which maps source names to hashed names. Templates link assets with
+``asset_url('css/styles.css')``. That resolves through the manifest, which
+is loaded once when the app starts, and falls back to the plain static URL
+when there is no manifest (development). A hashed file never changes, so it
+is served with a one-year ``immutable`` Cache-Control and a deploy never
+serves stale CSS or JS.
+
+The minifiers are conservative: they drop comments and redundant whitespace
+and keep line breaks in JS, but never rename or reorder anything.
+"""
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from urllib.parse import quote
+
+from flask import request, url_for
+
+# Folders under the static folder holding the assets to fingerprint
+ASSET_DIRS = ('css', 'js')
+MANIFEST = 'manifest.json'
+# A year, the longest max-age caches honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.(css|js)$')
+
+_urls = {}  # source name -> static path of the hashed file
+_immutable = set()  # hashed names relative to the static folder
+# When the loaded manifest was written (None without one); pages linking
+# the assets change with it (see conditional.py)
+built_at = None
+
+
+def _string_end(source, start):
+    """Index just past the string literal (or template literal) at ``start``"""
+    quote_char = source[start]
+    i = start + 1
+    while i < len(source):
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == quote_char:
+            return i + 1
+        if quote_char == '`' and source.startswith('${', i):
+            i = _expression_end(source, i + 2)
+            continue
+        i += 1
+    return len(source)
+
+
+def _expression_end(source, start):
+    """Index just past the ``}`` closing a template literal substitution"""
+    depth = 1
+    i = start
+    while i < len(source):
+        c = source[i]
+        if c in '\'"`':
+            i = _string_end(source, i)
+            continue
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return len(source)
+
+
+def _regex_end(source, start):
+    """Index just past the regular expression literal (and flags) at ``start``"""
+    i = start + 1
+    in_class = False
+    while i < len(source) and source[i] != '\n':
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            i += 1
+            while i < len(source) and (source[i].isalnum() or source[i] == '_'):
+                i += 1
+            return i
+        i += 1
+    return i
+
+
+# After these characters (or keywords) a slash starts a regex, not a division
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'delete')
+
+
+class _Output:
+    """Collects minified text, collapsing whitespace between tokens"""
+
+    def __init__(self):
+        self.parts = []
+        self.pending = None  # None, ' ' or '\n'
+
+    def whitespace(self, newline):
+        if newline:
+            self.pending = '\n'
+        elif self.pending is None:
+            self.pending = ' '
+
+    def write(self, text):
+        if self.pending and self.parts:
+            self.parts.append(self.pending)
+        self.pending = None
+        self.parts.append(text)
+
+    def last_token(self):
+        return self.parts[-1] if self.parts else ''
+
+    def text(self):
+        return ''.join(self.parts)
+
+
+def minify_js(source):
+    out = _Output()
+    i, n = 0, len(source)
+    while i < n:
+        c = source[i]
+        if c in '\'"`':
+            j = _string_end(source, i)
+            out.write(source[i:j])
+            i = j
+        elif source.startswith('//', i):
+            j = source.find('\n', i)
+            i = n if j == -1 else j
+        elif source.startswith('/*', i):
+            j = source.find('*/', i + 2)
+            j = n if j == -1 else j + 2
+            # A comment spanning lines still ends a statement (ASI)
+            out.whitespace(newline='\n' in source[i:j])
+            i = j
+        elif c.isspace():
+            j = i
+            while j < n and source[j].isspace():
+                j += 1
+            out.whitespace(newline='\n' in source[i:j])
+            i = j
+        elif c == '/':
+            before = out.last_token()
+            if (not before or before[-1] in _REGEX_PRECEDERS
+                    or re.search(r'(?:^|[^\w$])(?:%s)$' % '|'.join(_REGEX_KEYWORDS), before)):
+                j = _regex_end(source, i)
+            else:
+                j = i + 1
+            out.write(source[i:j])
+            i = j
+        else:
+            j = i + 1
+            while j < n and source[j] not in '\'"`/' and not source[j].isspace():
+                j += 1
+            out.write(source[i:j])
+            i = j
+    return out.text().strip() + '\n'
+
+
+def _squeeze_css(code):
+    """Minify CSS text that holds no string literals"""
+    code = re.sub(r'/\*.*?\*/', ' ', code, flags=re.S)
+    code = re.sub(r'\s+', ' ', code)
+    code = re.sub(r' ?([{};,>]) ?', r'\1', code)
+    return code.replace(': ', ':').replace(';}', '}')
+
+
+def minify_css(source):
+    out = []
+    start = i = 0
+    while i < len(source):
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = len(source) if end == -1 else end + 2
+        elif source[i] in '\'"':
+            end = _string_end(source, i)
+            out.append(_squeeze_css(source[start:i]))
+            out.append(source[i:end])
+            start = i = end
+        else:
+            i += 1
+    out.append(_squeeze_css(source[start:]))
+    return ''.join(out).strip() + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def build(static_folder):
+    """Write minified, content-hashed copies of the static CSS and JS and the
+    manifest mapping their names. Returns the manifest."""
+    manifest = {}
+    for folder in ASSET_DIRS:
+        for root, _, files in os.walk(os.path.join(static_folder, folder)):
+            for name in sorted(files):
+                stem, ext = os.path.splitext(name)
+                if ext not in MINIFIERS or _HASHED_NAME.search(name):
+                    continue
+                source = os.path.join(root, name)
+                with open(source, encoding='utf-8') as handle:
+                    minified = MINIFIERS[ext](handle.read()).encode('utf-8')
+                digest = hashlib.sha256(minified).hexdigest()[:12]
+                target = os.path.join(root, f'{stem}.{digest}{ext}')
+                if not os.path.exists(target):
+                    with open(target, 'wb') as handle:
+                        handle.write(minified)
+                relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+                manifest[relative] = os.path.relpath(target, static_folder).replace(os.sep, '/')
+    path = os.path.join(static_folder, MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    # Replaced atomically so a worker starting mid-build never reads half a file
+    os.replace(path + '.tmp', path)
+    return manifest
+
+
+def load(app):
+    """Read the manifest and resolve every asset's URL path once"""
+    global built_at
+    _urls.clear()
+    _immutable.clear()
+    built_at = None
+    path = os.path.join(app.static_folder, MANIFEST)
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as handle:
+        manifest = json.load(handle)
+    built_at = datetime.utcfromtimestamp(int(os.path.getmtime(path)))
+    for name, hashed in manifest.items():
+        _urls[name] = f'{app.static_url_path}/{quote(hashed)}'
+        _immutable.add(hashed)
+
+
+def asset_url(filename):
+    """URL of the fingerprinted copy of a static asset (``asset_url`` in templates)"""
+    path = _urls.get(filename)
+    if path is None:
+        return url_for('static', filename=filename)
+    return request.script_root + path
+
+
+def init_app(app):
+    """Load the manifest, add ``asset_url`` to templates and serve hashed
+    assets with long-lived caching"""
+    load(app)
+    app.add_template_global(asset_url)
+
+    @app.after_request
+    def cache_fingerprinted(response):
+        if (request.endpoint == 'static' and response.status_code in (200, 304)
+                and request.view_args.get('filename') in _immutable):
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        return response
@@ -0,0 +1,18 @@
+"""Async serving mode for AgriConnect.
+
+Same application as app.py, but the read-heavy views (home, product list and
+detail, dashboard, offers, orders, cart count) read through Motor: their
+queries run concurrently on a per-process event loop while rendering stays on
+the request threads. Run it next to the regular app with a threaded worker so
+many requests can wait on MongoDB at once:
+
+    pip install -r requirements-async.txt
+    gunicorn -c gunicorn.conf.py -k gthread --threads 32 async_app:app
+"""
+import async_views
+from app import app
+
+async_views.init_app(app)
+
+if __name__ == '__main__':
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
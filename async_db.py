@@ -0,0 +1,136 @@
+"""Motor (asyncio) data access for the async serving mode.
+
+Each process runs one event loop in a daemon thread. The loop owns a single
+Motor client, so its connection pool is shared by every request thread.
+Views stay sync and submit a coroutine holding their queries with ``run``,
+then wait for its result; independent queries in it run concurrently with
+``asyncio.gather`` instead of one round trip after another. The coroutines
+only await Motor and do no blocking work, which would stall the queries of
+every request in the process: rendering, sessions and cache lookups stay on
+the request thread.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Future
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import db
+from cache import documents
+
+_loop = None
+_client = None
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """The loop thread does not survive fork; start a new one on next use"""
+    global _loop, _client, _lock
+    _loop = None
+    _client = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_loop():
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='async-db', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run(coro):
+    """Run ``coro`` on the process event loop and wait for its result"""
+    loop = _get_loop()
+    context = contextvars.copy_context()
+    result = Future()
+
+    def copy_result(task):
+        if task.cancelled():
+            result.cancel()
+        elif task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set_result(task.result())
+
+    def schedule():
+        # Creating the task inside context.run() makes it run in a copy of
+        # the calling thread's context (Flask request/app context included)
+        task = context.run(loop.create_task, coro)
+        task.add_done_callback(copy_result)
+
+    loop.call_soon_threadsafe(schedule)
+    return result.result()
+
+
+def database():
+    """Return the Motor database (call from the event loop)"""
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(**db.client_settings())
+    return _client[db.database_name()]
+
+
+def collection(model, read_preference=None):
+    """``model``'s Motor collection; reads go to the primary unless
+    ``read_preference`` says otherwise (see db.catalog_read_preference)"""
+    coll = database()[model._get_collection_name()]
+    if read_preference is not None:
+        coll = coll.with_options(read_preference=read_preference)
+    return coll
+
+
+async def find(model, query, sort=None, skip=0, limit=0, projection=None, read_preference=None):
+    """Return Documents of ``model`` matching a raw ``query``"""
+    cursor = collection(model, read_preference).find(query, projection, sort=sort, skip=skip, limit=limit)
+    return [model._from_son(son) for son in await cursor.to_list(length=None)]
+
+
+async def find_one(model, query):
+    son = await collection(model).find_one(query)
+    return model._from_son(son) if son is not None else None
+
+
+async def aggregate(model, pipeline, read_preference=None):
+    return await collection(model, read_preference).aggregate(pipeline).to_list(length=None)
+
+
+async def count(model, query, read_preference=None):
+    return await collection(model, read_preference).count_documents(query)
+
+
+async def paginate(model, query, sort, page, per_page, read_preference=None):
+    """Return ``(total, items)``, running the count and the page query concurrently"""
+    return await asyncio.gather(
+        count(model, query, read_preference),
+        find(model, query, sort=sort, skip=(page - 1) * per_page, limit=per_page,
+             read_preference=read_preference)
+    )
+
+
+async def get_document(model, doc_id):
+    """Async counterpart of ``documents.get`` that fills the shared cache"""
+    found, missing, stamp = documents.lookup(model, [doc_id])
+    if found:
+        return found[doc_id]
+    document = await find_one(model, {'_id': doc_id})
+    if document is not None:
+        documents.fill(model, [document], stamp)
+    return document
+
+
+async def load_related(model, ids):
+    """Load uncached ``ids`` of ``model`` in one query into the document cache"""
+    found, missing, stamp = documents.lookup(model, ids)
+    if missing:
+        loaded = await find(model, {'_id': {'$in': list(missing.values())}})
+        documents.fill(model, loaded, stamp)
@@ -0,0 +1,365 @@
+"""Motor-backed versions of the read-heavy views (see async_app.py).
+
+``init_app`` swaps these views in for the sync ones under the same endpoint
+names, so templates, ``url_for`` and all write routes are unchanged. Each
+view runs on its request thread like any other and hands its queries to the
+process event loop in one ``async_db.run`` call (two for dependent reads),
+where independent queries run concurrently. Only the Motor awaits run on the
+loop: cache lookups, sessions, search and template rendering stay on the
+request thread, so a slow render or a blocking call never holds up the
+queries of other requests. Related users and products are loaded in the same
+step into the shared document cache so the relation properties used by the
+templates never go back to the database.
+"""
+import asyncio
+import re
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import flash, jsonify, redirect, render_template, request, session, url_for
+from flask_login import current_user, login_required
+
+import analytics
+import archive
+import async_db
+import bootstrap
+import db
+import facets
+import geo
+import price_history
+import search
+from app import Pagination
+from auth import SNAPSHOT_FIELDS, cache_snapshot
+from cache import user_snapshots
+from models import CartItem, CatalogVersion, FarmerDailyRollup, Offer, Order, PriceTrend, Product, User
+
+NEWEST_FIRST = [('created_at', -1)]
+
+
+def catalog_query(args, near=None):
+    """Build the raw product query used by the sync index/product_list views.
+
+    ``near`` is the distance filter (geo.Near or None). Returns ``(search_query, category, query, ranked)``; ``ranked`` holds the
+    search index matches in relevance order, or None when not searching or
+    while the index is still building.
+    """
+    search_query = args.get('search_query', '').strip()
+    category = args.get('category', '').strip()
+    min_price = args.get('min_price', type=float)
+    max_price = args.get('max_price', type=float)
+
+    query = {'is_available': True}
+    ranked = search.ranked_ids(search_query) if search_query else None
+    if ranked is not None:
+        query['_id'] = {'$in': ranked}
+    elif search_query:
+        pattern = {'$regex': re.escape(search_query), '$options': 'i'}
+        query['$or'] = [{'name': pattern}, {'description': pattern}, {'category': pattern}]
+    if category:
+        query['category'] = category
+    price = {}
+    if min_price is not None:
+        price['$gte'] = min_price
+    if max_price is not None:
+        price['$lte'] = max_price
+    if price:
+        query['price'] = price
+    if near:
+        query.update(geo.within(near))
+    return search_query, category, query, ranked
+
+
+async def find_user_snapshot(user_oid):
+    return await async_db.collection(User).find_one({'_id': user_oid}, {field: 1 for field in SNAPSHOT_FIELDS})
+
+
+def load_current_user():
+    """Warm the user snapshot cache through Motor so Flask-Login's loader
+    does not query with mongoengine"""
+    user_id = session.get('_user_id')
+    if not user_id or user_snapshots.get(user_id) is not None:
+        return
+    try:
+        user_oid = ObjectId(user_id)
+    except (InvalidId, TypeError):
+        return
+    son = async_db.run(find_user_snapshot(user_oid))
+    if son is not None:
+        cache_snapshot(user_id, User._from_son(son))
+
+
+async def paginate(model, query, page, per_page, read_preference=None):
+    total, items = await async_db.paginate(model, query, NEWEST_FIRST, page, per_page, read_preference)
+    return Pagination(page, per_page, total, items)
+
+
+async def load_history_page(model, query, page, per_page, read_preference):
+    """``(hot total, hot items, archive generation)`` of a history listing"""
+    (hot_total, items), version = await asyncio.gather(
+        async_db.paginate(model, query, NEWEST_FIRST, page, per_page),
+        async_db.collection(CatalogVersion, read_preference).find_one({'_id': archive.generation_key(model)})
+    )
+    return hot_total, items, version.get('version', 0) if version else 0
+
+
+async def load_archived(model, query, archived_total, window):
+    """``(archived count, archived documents of the page)``; the count is
+    only read when ``archived_total`` (the cached one) is None"""
+    cold = async_db.database()[model.archive_collection]
+
+    async def count():
+        if archived_total is not None:
+            return archived_total
+        return await cold.count_documents(query)
+
+    async def page_sons():
+        if window is None or archived_total == 0:
+            return []
+        skip, limit = window
+        return await cold.find(query, sort=NEWEST_FIRST, skip=skip, limit=limit).to_list(length=None)
+
+    return await asyncio.gather(count(), page_sons())
+
+
+def paginate_history(model, query, page, per_page):
+    """Motor counterpart of archive.paginate"""
+    hot_total, items, generation = async_db.run(load_history_page(model, query, page, per_page,
+                                                                  db.catalog_read_preference()))
+    archived_total = archive.lookup_count(model, query, generation)
+    window = archive.archive_window(hot_total, page, per_page)
+    if archived_total is None or (window is not None and archived_total):
+        counted, sons = async_db.run(load_archived(model, query, archived_total, window))
+        if archived_total is None:
+            archived_total = counted
+            archive.store_count(model, query, generation, archived_total)
+        if window is not None and archived_total:
+            items = archive.merge(items, [model._from_son(son) for son in sons])
+    return Pagination(page, per_page, hot_total + archived_total, items)
+
+
+async def paginate_ranked(query, ranked_ids, page, per_page, read_preference=None):
+    """Async counterpart of app.paginate_ranked for product search results"""
+    matching = {product.id for product in await async_db.find(Product, query, projection={'_id': 1},
+                                                              read_preference=read_preference)}
+    ranked = [product_id for product_id in ranked_ids if product_id in matching]
+    page_ids = ranked[(page - 1) * per_page:page * per_page]
+    found = {product.id: product for product in await async_db.find(Product, {'_id': {'$in': page_ids}},
+                                                                    read_preference=read_preference)}
+    return Pagination(page, per_page, len(ranked), [found[product_id] for product_id in page_ids if product_id in found])
+
+
+async def catalog_page(query, ranked, page, per_page, read_preference):
+    if ranked is not None:
+        return await paginate_ranked(query, ranked, page, per_page, read_preference)
+    return await paginate(Product, query, page, per_page, read_preference)
+
+
+async def load_related(items, users=(), products=()):
+    """Async counterpart of app.prefetch_related; both models load concurrently"""
+    await asyncio.gather(
+        async_db.load_related(User, [getattr(item, field) for item in items for field in users]),
+        async_db.load_related(Product, [getattr(item, field) for item in items for field in products])
+    )
+
+
+async def load_catalog(query, ranked, page, per_page, facet_stages, read_preference):
+    """``(Pagination, facet rows or None)``; the page and the facet counts
+    load concurrently, then the page's farmers"""
+    async def facet_rows():
+        if facet_stages is None:
+            return None
+        return await async_db.aggregate(Product, facet_stages, read_preference)
+
+    products, rows = await asyncio.gather(catalog_page(query, ranked, page, per_page, read_preference),
+                                          facet_rows())
+    await load_related(products.items, users=['farmer_id'])
+    return products, rows
+
+
+def catalog_with_facets(query, ranked, page, per_page, near):
+    """``(Pagination, Facets)`` of a catalog page; cached facet counts are
+    not queried again"""
+    flt = facets.normalize(request.args, near)
+    facet_counts, generation = facets.lookup(flt, ranked)
+    stages = facets.pipeline(flt, ranked) if facet_counts is None else None
+    products, rows = async_db.run(load_catalog(query, ranked, page, per_page, stages,
+                                               db.catalog_read_preference()))
+    if facet_counts is None:
+        facet_counts = facets.parse(rows[0])
+        facets.store(flt, ranked, facet_counts, generation)
+    return products, facet_counts
+
+
+def requested_near():
+    """The "near me" filter of the current request (see geo.parse_near)"""
+    return geo.parse_near(request.args, getattr(current_user, 'location', None))
+
+
+def index():
+    """Homepage with featured products"""
+    near = requested_near()
+    search_query, category, query, ranked = catalog_query(request.args, near)
+    page = request.args.get('page', 1, type=int)
+
+    try:
+        products, facet_counts = catalog_with_facets(query, ranked, page, 12, near)
+    except Exception as e:
+        flash('Error loading products. Please try again later.', 'error')
+        return render_template('index.html', products=None, search_query=search_query, category=category)
+
+    return render_template('index.html', products=products, search_query=search_query, category=category,
+                           facets=facet_counts, distances=geo.distances(products.items, near))
+
+
+def product_list():
+    """List all products"""
+    near = requested_near()
+    if request.args.get('radius') and near is None:
+        flash('Allow location access or add your address to filter products by distance.', 'info')
+    _, _, query, ranked = catalog_query(request.args, near)
+    page = request.args.get('page', 1, type=int)
+
+    products, facet_counts = catalog_with_facets(query, ranked, page, 20, near)
+
+    return render_template('product_list.html', products=products, facets=facet_counts, near=near,
+                           distances=geo.distances(products.items, near), radius_choices=geo.RADIUS_CHOICES)
+
+
+async def load_product(product_id):
+    """A product and its farmer, or None"""
+    product = await async_db.get_document(Product, product_id)
+    if product is not None:
+        await load_related([product], users=['farmer_id'])
+    return product
+
+
+def product_detail(product_id):
+    """Product detail page"""
+    try:
+        product = async_db.run(load_product(ObjectId(product_id)))
+    except InvalidId:
+        flash('Invalid product ID.', 'error')
+        return redirect(url_for('index'))
+
+    if not product:
+        flash('Product not found.', 'error')
+        return redirect(url_for('index'))
+
+    from forms import AddToCartForm, OfferForm
+    add_to_cart_form = AddToCartForm()
+    offer_form = OfferForm()
+
+    return render_template('product_detail.html', product=product,
+                           add_to_cart_form=add_to_cart_form, offer_form=offer_form)
+
+
+async def load_dashboard(farmer_id):
+    """Products, offers, orders and rollups of a farmer, queried concurrently"""
+    farmer = {'farmer_id': farmer_id}
+    return await asyncio.gather(
+        async_db.find(Product, farmer, sort=NEWEST_FIRST, limit=20),
+        async_db.find(Offer, farmer, sort=NEWEST_FIRST, limit=10),
+        async_db.find(Order, farmer, sort=NEWEST_FIRST, limit=10),
+        async_db.find(FarmerDailyRollup, analytics.summary_query(farmer_id))
+    )
+
+
+@login_required
+def farmer_dashboard():
+    """Farmer dashboard"""
+    if current_user.role != 'farmer':
+        flash('Access denied. Farmers only.', 'error')
+        return redirect(url_for('index'))
+
+    products, offers, orders, rollups = async_db.run(load_dashboard(current_user.id))
+    summary = analytics.summarize(rollups)
+    async_db.run(load_related(summary.top_products, products=['product_id']))
+
+    return render_template('farmer_dashboard.html', products=products, offers=offers, orders=orders,
+                           analytics=summary)
+
+
+@login_required
+def offers():
+    """View offers (farmer sees received, consumer sees sent)"""
+    field = 'farmer_id' if current_user.role == 'farmer' else 'consumer_id'
+    page = request.args.get('page', 1, type=int)
+
+    offers_paginated = paginate_history(Offer, {field: current_user.id}, page, 20)
+
+    return render_template('offers.html', offers=offers_paginated)
+
+
+@login_required
+def orders():
+    """View orders"""
+    field = 'farmer_id' if current_user.role == 'farmer' else 'consumer_id'
+    page = request.args.get('page', 1, type=int)
+
+    orders_paginated = paginate_history(Order, {field: current_user.id}, page, 20)
+    bootstrap.mark_orders_seen()
+
+    return render_template('orders.html', orders=orders_paginated)
+
+
+@login_required
+def api_cart_count():
+    """Get current user's cart item count"""
+    if current_user.role != 'consumer':
+        return jsonify({'count': 0})
+
+    count = async_db.run(async_db.count(CartItem, {'consumer_id': current_user.id}))
+    return jsonify({'count': count})
+
+
+def api_bootstrap():
+    """Everything the page chrome needs in one request (see bootstrap.py)"""
+    if not current_user.is_authenticated:
+        return jsonify(bootstrap.payload(current_user))
+
+    seen_at = bootstrap.orders_seen_at()
+    counts = bootstrap.lookup(current_user, seen_at)
+    if counts is None:
+        model, stages = bootstrap.pipeline(current_user, seen_at)
+        counts = bootstrap.parse(async_db.run(async_db.aggregate(model, stages)))
+        bootstrap.store(current_user, seen_at, counts)
+    return jsonify(bootstrap.payload(current_user, counts))
+
+
+def api_price_history(product_id):
+    """Daily or weekly price summaries for the product page chart"""
+    period = request.args.get('period', 'day')
+    if period not in price_history.PRICE_PERIODS:
+        return jsonify({'error': 'Unknown period'}), 400
+    try:
+        product_id = ObjectId(product_id)
+    except InvalidId:
+        return jsonify({'error': 'Invalid product ID'}), 404
+
+    query, sort, limit = price_history.trend_query(product_id, period)
+    rows = async_db.run(async_db.find(PriceTrend, query, sort=sort, limit=limit,
+                                      read_preference=db.catalog_read_preference()))
+    response = jsonify(price_history.serialize(period, rows))
+    response.cache_control.public = True
+    response.cache_control.max_age = price_history.MAX_AGE
+    return response
+
+
+ASYNC_VIEWS = {
+    'index': index,
+    'product_list': product_list,
+    'product_detail': product_detail,
+    'farmer_dashboard': farmer_dashboard,
+    'offers': offers,
+    'orders': orders,
+    'api_cart_count': api_cart_count,
+    'api_bootstrap': api_bootstrap,
+    'api_price_history': api_price_history,
+}
+
+
+def init_app(app):
+    """Serve the read-heavy endpoints from the Motor-backed views"""
+    app.before_request(load_current_user)
+    for endpoint, view in ASYNC_VIEWS.items():
+        app.view_functions[endpoint] = view
@@ -0,0 +1,74 @@
+"""User loading for Flask-Login.
+
+Authenticated requests only need a handful of user fields, so ``load_user``
+returns a ``UserSnapshot`` served from a short-TTL in-process LRU instead of
+reading the full ``User`` document on every request. The full document is
+fetched on demand the first time a route touches any other attribute.
+"""
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask_login import UserMixin
+
+from cache import user_snapshots
+from models import User
+
+SNAPSHOT_FIELDS = ('username', 'full_name', 'role', 'is_active', 'location')
+
+
+class UserSnapshot(UserMixin):
+    """Compact, read-only view of a user for the current request"""
+
+    def __init__(self, id, username, full_name, role, is_active, location):
+        self.id = id
+        self.username = username
+        self.full_name = full_name
+        self.role = role
+        self._is_active = is_active
+        self.location = location  # GeoJSON point for the "near me" filter
+        self._document = None
+
+    @property
+    def is_active(self):
+        return self._is_active
+
+    @property
+    def document(self):
+        """Full User document, loaded on first use"""
+        if self._document is None:
+            self._document = User.objects(id=self.id).first()
+        return self._document
+
+    def __getattr__(self, name):
+        # Only called for attributes the snapshot does not carry
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.document, name)
+
+    def get_id(self):
+        return str(self.id)
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.username}>'
+
+
+def load_user(user_id):
+    """Return a snapshot for ``user_id`` (cached field values) or None"""
+    values = user_snapshots.get(user_id)
+    if values is None:
+        try:
+            user = User.objects(id=ObjectId(user_id)).only(*SNAPSHOT_FIELDS).first()
+        except (InvalidId, TypeError):
+            return None
+        if user is None:
+            return None
+        values = cache_snapshot(user_id, user)
+    
+    # A fresh instance per request so the lazily loaded document is never shared
+    return UserSnapshot(*values)
+
+
+def cache_snapshot(user_id, user):
+    """Store the snapshot fields of ``user`` and return them"""
+    values = (user.id, user.username, user.full_name, user.role, user.is_active, user.location)
+    user_snapshots.set(user_id, values)
+    return values
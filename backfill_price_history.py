@@ -0,0 +1,21 @@
+import db
+from price_history import backfill
+from config import Config
+
+def backfill_price_history():
+    """Start the price history of products that have none.
+
+    Prices are recorded as they change from now on; this records each
+    product's current price once, dated at its last update, so every
+    product page has a chart. Run it once after create_indexes.py has
+    created the price_history collection. Re-running it only records
+    products added in between without history.
+    """
+    # The app's settings (pool, timeouts, database), connected on first use
+    db.configure(Config.MONGODB_SETTINGS)
+
+    recorded = backfill()
+    print(f"Recorded the current price of {recorded} products")
+
+if __name__ == '__main__':
+    backfill_price_history()
@@ -0,0 +1,54 @@
+import sys
+from mongoengine import connect
+from pymongo import UpdateOne
+from models import User, Product, CartItem, Offer, Order, ProductSnapshot
+from config import Config
+
+PRODUCT_FIELDS = ('name', 'unit', 'category', 'price', 'image_path', 'farmer_id')
+
+def _write_batch(collection, batch):
+    """Embed snapshots into one batch of raw documents with one query per model"""
+    products = {product.id: product for product in
+                Product.objects(id__in=list({son['product_id'] for son in batch})).only(*PRODUCT_FIELDS)}
+    for son in batch:
+        product = products.get(son['product_id'])
+        son.setdefault('farmer_id', product.farmer_id if product else None)
+    user_ids = {son[field] for son in batch for field in ('farmer_id', 'consumer_id') if son.get(field)}
+    users = {user.id: user for user in User.objects(id__in=list(user_ids)).only('full_name')}
+
+    requests = []
+    for son in batch:
+        snapshot = ProductSnapshot.build(products.get(son['product_id']), users.get(son['farmer_id']),
+                                         users.get(son.get('consumer_id')))
+        # The filter keeps snapshots written by the app since the batch was read
+        requests.append(UpdateOne({'_id': son['_id'], 'snapshot': None},
+                                  {'$set': {'snapshot': snapshot.to_mongo()}}))
+    return collection.bulk_write(requests, ordered=False).modified_count
+
+def backfill_snapshots(batch_size=1000):
+    """Embed product snapshots into cart items, offers and orders created
+    before snapshots existed.
+
+    New documents get their snapshot on creation. Run this once after
+    deploying; it is safe to re-run and only touches documents without a
+    snapshot. Products deleted before the backfill leave the product fields
+    of the snapshot empty.
+    """
+    connect(host=Config.MONGODB_URI)
+
+    for document in (CartItem, Offer, Order):
+        collection = document._get_collection()
+        projection = {'product_id': 1, 'consumer_id': 1, 'farmer_id': 1}
+        written = 0
+        batch = []
+        for son in collection.find({'snapshot': None}, projection, batch_size=batch_size):
+            batch.append(son)
+            if len(batch) >= batch_size:
+                written += _write_batch(collection, batch)
+                batch = []
+        if batch:
+            written += _write_batch(collection, batch)
+        print(f"Backfilled {written} snapshots in '{document._get_collection_name()}'")
+
+if __name__ == '__main__':
+    backfill_snapshots(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,113 @@
+"""Cold-start benchmark for the serverless entry point (vercel_app.py).
+
+Each run starts a fresh interpreter, imports ``vercel_app`` and serves one
+request through the Flask test client, which is what a Vercel cold start does.
+Reported numbers are wall-clock times measured from the parent process, so
+interpreter start-up is included.
+
+    python benchmarks/cold_start.py                 # time to first byte
+    python benchmarks/cold_start.py --profile       # import-time breakdown
+    python benchmarks/cold_start.py --path / --runs 20
+    python benchmarks/cold_start.py --budget 400    # fail above 400 ms
+
+Every run also checks that start-up stays lean: importing the app must not
+load the modules views import on demand (``DEFERRED_MODULES``), and a request
+that does not search must not start an in-memory index build. A violation,
+or a median import + first request time above ``--budget``, exits with
+status 1, so the script can guard changes in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported inside the views that need them, never at start-up
+DEFERRED_MODULES = ('wtforms', 'flask_wtf', 'email_validator', 'motor')
+
+CHILD = """
+import json, sys, threading, time
+t0 = time.perf_counter()
+import vercel_app
+t_import = time.perf_counter()
+deferred = [name for name in {deferred!r} if name in sys.modules]
+response = vercel_app.app.test_client().get({path!r})
+response.get_data()
+t_response = time.perf_counter()
+builds = [thread.name for thread in threading.enumerate() if thread.name.endswith('-index')]
+print(json.dumps({{'import': t_import - t0, 'first_request': t_response - t_import,
+                  'status': response.status_code, 'deferred': deferred, 'builds': builds}}))
+"""
+
+
+def run_once(path):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD.format(path=path, deferred=DEFERRED_MODULES)], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - start
+    result = json.loads(output.strip().splitlines()[-1])
+    result['total'] = total
+    return result
+
+
+def import_profile(top):
+    """Return the slowest top-level packages by cumulative import time"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import vercel_app'],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    by_package = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        by_package[name.strip().split('.')[0]] += int(self_us)
+    return sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/login',
+                        help='URL to request (the default does not need MongoDB)')
+    parser.add_argument('--profile', action='store_true', help='print import-time breakdown')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget', type=float,
+                        help='fail when the median import + first request exceeds this (ms)')
+    args = parser.parse_args()
+
+    if args.profile:
+        print(f"{'package':<30}{'self time (ms)':>16}")
+        for name, micros in import_profile(args.top):
+            print(f"{name:<30}{micros / 1000:>16.1f}")
+        print()
+
+    results = [run_once(args.path) for _ in range(args.runs)]
+    print(f"GET {args.path} -> {results[0]['status']} ({args.runs} cold starts)")
+    for key in ('import', 'first_request', 'total'):
+        values = sorted(r[key] * 1000 for r in results)
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f"{key:<15} median {statistics.median(values):8.1f} ms   p95 {p95:8.1f} ms")
+
+    failures = []
+    deferred = sorted({name for r in results for name in r['deferred']})
+    if deferred:
+        failures.append(f"imported at start-up: {', '.join(deferred)}")
+    builds = sorted({name for r in results for name in r['builds']})
+    if builds and 'search_query' not in args.path and not args.path.startswith('/api/suggest'):
+        failures.append(f"index builds started by GET {args.path}: {', '.join(builds)}")
+    if args.budget is not None:
+        startup = statistics.median((r['import'] + r['first_request']) * 1000 for r in results)
+        if startup > args.budget:
+            failures.append(f"import + first request {startup:.1f} ms is over the {args.budget:.0f} ms budget")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
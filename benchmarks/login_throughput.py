@@ -0,0 +1,69 @@
+"""Login throughput benchmark for the password hashing pool.
+
+Verifies a stored hash as many times as possible from a number of concurrent
+"requests" and reports verifications per second, per second per core, and how
+many requests were turned away with HashingBusy. No database is needed.
+
+    python benchmarks/login_throughput.py --clients 16 --seconds 5
+    PASSWORD_HASH_METHOD=scrypt:32768:8:1 python benchmarks/login_throughput.py
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import passwords  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=Config.PASSWORD_HASH_WORKERS * 4,
+                        help='concurrent login requests')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    pwhash = passwords.hash_password('correct horse battery staple')
+    deadline = time.perf_counter() + args.seconds
+    counts = {'ok': 0, 'busy': 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                passwords.verify_password(pwhash, 'correct horse battery staple')
+                result = 'ok'
+            except passwords.HashingBusy:
+                result = 'busy'
+                time.sleep(0.01)
+            with lock:
+                counts[result] += 1
+                if result == 'ok':
+                    latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    cores = os.cpu_count() or 1
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+    print(f"method={Config.PASSWORD_HASH_METHOD} workers={Config.PASSWORD_HASH_WORKERS} "
+          f"queue_limit={Config.PASSWORD_HASH_QUEUE_LIMIT} clients={args.clients} cores={cores}")
+    print(f"verifications/s      {counts['ok'] / elapsed:8.1f}")
+    print(f"verifications/s/core {counts['ok'] / elapsed / cores:8.1f}")
+    print(f"p95 latency          {p95 * 1000:8.1f} ms")
+    print(f"rejected (busy)      {counts['busy']:8d}")
+
+
+if __name__ == '__main__':
+    main()
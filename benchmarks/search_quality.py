@@ -0,0 +1,106 @@
+"""Fuzzy search recall and latency benchmark on a synthetic catalog.
+
+Builds a SearchIndex over generated products, then searches for product names
+with typos (dropped, doubled, swapped or replaced letters) and with regional
+synonyms substituted. Reports recall@10 (the target product is in the first
+ten results), the recall a plain substring match would get on the same
+queries, and query latency. No database is needed.
+
+    python benchmarks/search_quality.py --products 100000 --queries 2000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+
+from indexing import IndexedProduct  # noqa: E402
+from search import SYNONYMS, SearchIndex, normalize  # noqa: E402
+
+CATEGORIES = ['Vegetables', 'Fruits', 'Grains', 'Dairy & Eggs', 'Herbs', 'Natural Products']
+ADJECTIVES = ['organic', 'fresh', 'farm', 'desi', 'local', 'premium', 'hybrid', 'heirloom', 'red', 'green']
+PRODUCE = [group[0] for group in SYNONYMS] + ['apple', 'papaya', 'pumpkin', 'beetroot', 'lemon', 'honey']
+FARMS = ['valley', 'river', 'hill', 'sunrise', 'green acres', 'village', 'riverside']
+
+
+def typo(word, rng):
+    if len(word) < 4:
+        return word
+    position = rng.randrange(1, len(word) - 1)
+    kind = rng.choice(['drop', 'double', 'swap', 'replace'])
+    if kind == 'drop':
+        return word[:position] + word[position + 1:]
+    if kind == 'double':
+        return word[:position] + word[position] + word[position:]
+    if kind == 'swap':
+        return word[:position - 1] + word[position] + word[position - 1] + word[position + 1:]
+    return word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+
+
+def make_catalog(products, rng):
+    catalog = []
+    for number in range(products):
+        produce = rng.choice(PRODUCE)
+        name = f'{rng.choice(ADJECTIVES)} {produce} {number}'
+        description = f'{produce} grown at {rng.choice(FARMS)} farm, harvested this week'
+        catalog.append((ObjectId(), IndexedProduct(name, rng.choice(CATEGORIES), description), produce))
+    return catalog
+
+
+def make_queries(catalog, count, rng):
+    """``(query, target product id, produce)`` with a typo or a synonym in the produce word"""
+    aliases = {group[0]: group[1:] for group in SYNONYMS}
+    queries = []
+    for product_id, product, produce in rng.sample(catalog, count):
+        number = product.name.rsplit(' ', 1)[1]
+        if aliases.get(produce) and rng.random() < 0.3:
+            word = rng.choice(aliases[produce])
+        else:
+            word = ' '.join(typo(part, rng) for part in produce.split())
+        queries.append((f'{word} {number}', product_id, produce))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    catalog = make_catalog(args.products, rng)
+    queries = make_queries(catalog, args.queries, rng)
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.load((product_id, product) for product_id, product, _ in catalog)
+    build = time.perf_counter() - start
+
+    texts = {product_id: normalize(f'{product.name} {product.category} {product.description}')
+             for product_id, product, _ in catalog}
+    found = substring = 0
+    latencies = []
+    for query, target, _ in queries:
+        start = time.perf_counter()
+        results = index.search(query, limit=10)
+        latencies.append(time.perf_counter() - start)
+        found += any(product_id == target for product_id, _ in results)
+        substring += normalize(query) in texts[target]
+
+    latencies.sort()
+    print(f"products={args.products} queries={args.queries} min_similarity={index.min_similarity}")
+    print(f"build time           {build:8.2f} s")
+    print(f"recall@10            {found / len(queries):8.3f}")
+    print(f"substring recall     {substring / len(queries):8.3f}")
+    print(f"p50 latency          {latencies[len(latencies) // 2] * 1000:8.2f} ms")
+    print(f"p95 latency          {latencies[int(len(latencies) * 0.95)] * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Requests per second per core for the sync (app.py) and async (async_app.py) servers.
+
+Start the server under test, then point this script at it. Use the same
+worker count for both runs and pass it as --cores so the results compare:
+
+    gunicorn -c gunicorn.conf.py -w 2 -k gthread --threads 32 app:app
+    python benchmarks/serving_rps.py --url http://localhost:5000 --cores 2
+
+    gunicorn -c gunicorn.conf.py -w 2 -k gthread --threads 32 async_app:app
+    python benchmarks/serving_rps.py --url http://localhost:5000 --cores 2
+
+Log in paths (dashboard, offers, orders) by passing a session cookie with
+--cookie "session=...".
+"""
+import argparse
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+import http.client
+
+DEFAULT_PATHS = ['/', '/products', '/products?category=Vegetables']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=15.0)
+    parser.add_argument('--cores', type=int, required=True,
+                        help='CPU cores (worker processes) given to the server')
+    parser.add_argument('--cookie', default=None)
+    args = parser.parse_args()
+
+    target = urlsplit(args.url)
+    headers = {'Cookie': args.cookie} if args.cookie else {}
+    deadline = time.perf_counter() + args.seconds
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client(offset):
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        i = offset
+        while time.perf_counter() < deadline:
+            path = args.paths[i % len(args.paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                failed = response.status >= 500
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+                failed = True
+            with lock:
+                if failed:
+                    errors[0] += 1
+                else:
+                    latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    rps = len(latencies) / elapsed
+    print(f"{args.url} paths={len(args.paths)} concurrency={args.concurrency} cores={args.cores}")
+    print(f"requests/s           {rps:8.1f}")
+    print(f"requests/s/core      {rps / args.cores:8.1f}")
+    if latencies:
+        print(f"median latency       {statistics.median(latencies) * 1000:8.1f} ms")
+        print(f"p95 latency          {latencies[int(len(latencies) * 0.95)] * 1000:8.1f} ms")
+    print(f"errors               {errors[0]:8d}")
+
+
+if __name__ == '__main__':
+    main()
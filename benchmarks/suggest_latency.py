@@ -0,0 +1,82 @@
+"""Type-ahead index benchmark on a synthetic catalog.
+
+Loads a SuggestIndex with generated product names and categories, then reports
+build time, peak memory and per-query latency for short prefixes (precomputed)
+and long prefixes (scanned on first use, then memoized). No database is needed.
+
+    python benchmarks/suggest_latency.py --products 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexing import IndexedProduct  # noqa: E402
+from suggest import SuggestIndex  # noqa: E402
+
+CATEGORIES = ['Vegetables', 'Fruits', 'Grains', 'Dairy & Eggs', 'Meat & Poultry', 'Herbs', 'Natural Products']
+WORDS = ['organic', 'fresh', 'red', 'green', 'baby', 'wild', 'heirloom', 'local', 'sweet', 'desi',
+         'tomato', 'tamatar', 'potato', 'onion', 'brinjal', 'okra', 'mango', 'banana', 'apple', 'guava',
+         'rice', 'wheat', 'millet', 'ragi', 'paneer', 'ghee', 'eggs', 'chicken', 'basil', 'mint',
+         'coriander', 'turmeric', 'honey', 'jaggery', 'spinach', 'cabbage', 'carrot', 'garlic', 'ginger']
+
+
+def catalog(products, rng):
+    for number in range(products):
+        name = ' '.join(rng.sample(WORDS, rng.randint(1, 3)))
+        if rng.random() < 0.5:
+            name = f'{name} {number % 5000}'  # long tail of distinct names
+        orders = int(rng.paretovariate(1.5)) - 1
+        yield name, 'product', 1, orders
+        yield rng.choice(CATEGORIES), 'category', 1, orders
+
+
+def measure(index, prefixes, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for prefix in prefixes:
+            index.suggest(prefix)
+    return (time.perf_counter() - start) / (repeat * len(prefixes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    items = list(catalog(args.products, random.Random(args.seed)))
+    index = SuggestIndex()
+    start = time.perf_counter()
+    index.load(items)
+    build = time.perf_counter() - start
+
+    # Memory is measured on a second build; tracing slows the build down
+    tracemalloc.start()
+    SuggestIndex().load(items)
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    short = ['t', 'to', 'tom', 'b', 'ma', 'org', 'h']
+    long = ['toma', 'tomato 1', 'organic m', 'brinj', 'sweet man', 'heirloom t']
+    print(f"products={args.products} terms={len(index)} max_terms={index.max_terms}")
+    print(f"build time           {build:8.2f} s")
+    print(f"peak build memory    {memory / 2 ** 20:8.1f} MiB")
+    print(f"short prefix query   {measure(index, short, args.repeat) * 1e6:8.1f} us")
+    print(f"long prefix, cold    {measure(index, long, 1) * 1e6:8.1f} us")
+    print(f"long prefix, warm    {measure(index, long, args.repeat) * 1e6:8.1f} us")
+
+    inserts = 1000
+    start = time.perf_counter()
+    for number in range(inserts):
+        index.product_changed(None, IndexedProduct(f'new product {number}', 'Vegetables', ''))
+    print(f"incremental insert   {(time.perf_counter() - start) / inserts * 1e6:8.1f} us")
+
+
+if __name__ == '__main__':
+    main()
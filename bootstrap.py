@@ -0,0 +1,117 @@
+"""Client state for every page in one request (``/api/bootstrap``).
+
+main.js used to ask for the cart count on each page load, and cart and
+dashboard pages added more small requests. Each of them paid for session
+decoding, the user lookup and its own count query. ``/api/bootstrap``
+returns everything the page chrome shows at once:
+
+* ``cart_count``: items in a consumer's cart
+* ``pending_offers``: offers waiting for an answer (sent by a consumer,
+  received by a farmer)
+* ``order_updates``: orders changed (consumer) or placed (farmer) since the
+  user last opened the orders page in this session, or in the last week
+* ``csrf_token``: a fresh token for scripts that post forms
+
+The counts come from one aggregation, chained across collections with
+``$unionWith``, and are cached per user for ``BOOTSTRAP_CACHE_TTL``
+seconds in ``cache.client_counts``. Cart, offer and order writes drop the
+cached counts of the users involved (see models.py).
+"""
+import time
+from datetime import datetime, timedelta
+
+from flask import session
+
+from cache import client_counts
+
+# Orders changed before this are not "updates" for a session that has not
+# opened the orders page yet
+UNSEEN_LOOKBACK = timedelta(days=7)
+COUNTS = ('cart_count', 'pending_offers', 'order_updates')
+
+
+def orders_seen_at():
+    """When the orders page was last opened in this session"""
+    seen = session.get('orders_seen_at')
+    if seen is None:
+        # Whole hours, so the cached counts stay valid within the hour
+        start = datetime.utcnow() - UNSEEN_LOOKBACK
+        return start.replace(minute=0, second=0, microsecond=0)
+    return datetime.utcfromtimestamp(seen)
+
+
+def mark_orders_seen():
+    """Called by the orders page"""
+    session['orders_seen_at'] = int(time.time())
+
+
+def _count(match, name):
+    return [{'$match': match}, {'$count': name}]
+
+
+def pipeline(user, seen_at):
+    """``(model, aggregation)`` counting everything for ``user`` in one round trip"""
+    # Imported here because models imports this module
+    from models import CartItem, Offer, Order
+
+    if user.role == 'farmer':
+        orders = _count({'farmer_id': user.id, 'created_at': {'$gt': seen_at}}, 'order_updates')
+        return Offer, _count({'farmer_id': user.id, 'status': 'pending'}, 'pending_offers') + [
+            {'$unionWith': {'coll': Order._get_collection_name(), 'pipeline': orders}},
+        ]
+    offers = _count({'consumer_id': user.id, 'status': 'pending'}, 'pending_offers')
+    orders = _count({'consumer_id': user.id, 'updated_at': {'$gt': seen_at}}, 'order_updates')
+    return CartItem, _count({'consumer_id': user.id}, 'cart_count') + [
+        {'$unionWith': {'coll': Offer._get_collection_name(), 'pipeline': offers}},
+        {'$unionWith': {'coll': Order._get_collection_name(), 'pipeline': orders}},
+    ]
+
+
+def parse(rows):
+    """Merge the aggregation's ``{name: count}`` rows; no row means zero"""
+    counts = dict.fromkeys(COUNTS, 0)
+    for row in rows:
+        counts.update(row)
+    return counts
+
+
+def lookup(user, seen_at):
+    """Cached counts for ``user`` computed with the same ``seen_at``, or None"""
+    cached = client_counts.get(str(user.id))
+    if cached is not None and cached[0] == seen_at:
+        return cached[1]
+    return None
+
+
+def store(user, seen_at, counts):
+    client_counts.set(str(user.id), (seen_at, counts))
+
+
+def get_counts(user):
+    """Counts for ``user``, running the aggregation on a cache miss"""
+    seen_at = orders_seen_at()
+    counts = lookup(user, seen_at)
+    if counts is None:
+        model, stages = pipeline(user, seen_at)
+        counts = parse(model._get_collection().aggregate(stages))
+        store(user, seen_at, counts)
+    return counts
+
+
+def payload(user, counts=None):
+    """The ``/api/bootstrap`` response body; an anonymous user gets zero counts"""
+    # Imported here like forms: flask_wtf also loads WTForms (see app.py)
+    from flask_wtf.csrf import generate_csrf
+    data = parse([]) if counts is None else dict(counts)
+    data.update(
+        authenticated=user.is_authenticated,
+        role=user.role if user.is_authenticated else None,
+        csrf_token=generate_csrf(),
+    )
+    return data
+
+
+def forget(*user_ids):
+    """Drop cached counts after a write that changes them"""
+    for user_id in user_ids:
+        client_counts.pop(str(user_id))
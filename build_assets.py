@@ -0,0 +1,21 @@
+import sys
+from assets import build
+from compress_static import STATIC_FOLDER
+from compression import precompress
+
+def build_assets(static_folder=None):
+    """Minify and fingerprint the static CSS and JS, write the manifest and
+    the precompressed copies.
+
+    Run this on each deploy before starting the workers, which read the
+    manifest once at startup. Hashed files from earlier builds are kept so
+    pages rendered before the deploy still load their assets.
+    """
+    static_folder = static_folder or STATIC_FOLDER
+    manifest = build(static_folder)
+    for name, hashed in sorted(manifest.items()):
+        print(f"{name} -> {hashed}")
+    print(f"Wrote {precompress(static_folder)} precompressed files")
+
+if __name__ == '__main__':
+    build_assets(sys.argv[1] if len(sys.argv) > 1 else None)
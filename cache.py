@@ -0,0 +1,260 @@
+"""In-process caches shared by the app and the models.
+
+Caches here are per worker process and deliberately small; every entry has a
+TTL so that changes made by other processes become visible within a bounded
+time even when no local invalidation happens.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from config import Config
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a per-entry time-to-live"""
+
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value or ``default`` if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                hit = True
+            else:
+                if entry is not None:
+                    del self._data[key]
+                hit = False
+        metrics.record_cache(self.name, hit)
+        return entry[1] if hit else default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DocumentCache:
+    """Versioned cache of raw documents keyed by (collection, id).
+
+    Raw SON is cached and a fresh Document instance is built on every read, so
+    callers can never mutate a shared object. ``invalidate`` stamps the key
+    with a new version; a loader that started before that version does not
+    store its (possibly stale) result. Entries from other processes' writes are
+    bounded by the TTL.
+    """
+
+    def __init__(self, name, maxsize, ttl):
+        self._entries = LRUCache(name, maxsize, ttl)
+        self._lock = threading.Lock()
+        # Logical clock of invalidations; only the most recent ones are kept
+        # and anything older than ``_floor`` counts as invalidated at ``_floor``
+        self._clock = 0
+        self._floor = 0
+        self._invalidated = OrderedDict()
+        self._max_tracked = maxsize
+
+    @staticmethod
+    def _key(model, doc_id):
+        return (model._get_collection_name(), str(doc_id))
+
+    def _store(self, key, started, son):
+        with self._lock:
+            if self._invalidated.get(key, self._floor) > started:
+                return
+        self._entries.set(key, son)
+
+    def get(self, model, doc_id):
+        """Return the document with ``doc_id`` or None"""
+        if doc_id is None:
+            return None
+        return self.get_many(model, [doc_id]).get(doc_id)
+
+    def get_many(self, model, ids):
+        """Return ``{id: document}`` for ``ids``, querying only the misses"""
+        found, missing, stamp = self.lookup(model, ids)
+        if missing:
+            loaded = list(model.objects(id__in=list(missing.values())))
+            self.fill(model, loaded, stamp)
+            for document in loaded:
+                found[missing[str(document.id)]] = document
+        return found
+
+    def lookup(self, model, ids):
+        """Split ``ids`` into cached documents and misses without querying.
+
+        Returns ``(found, missing, stamp)`` where ``missing`` maps the string
+        form of each uncached id to the id as given; pass ``stamp`` to ``fill``
+        together with the documents loaded for the misses.
+        """
+        found = {}
+        missing = {}
+        with self._lock:
+            stamp = self._clock
+        for doc_id in ids:
+            if doc_id is None or doc_id in found or str(doc_id) in missing:
+                continue
+            son = self._entries.get(self._key(model, doc_id))
+            if son is not None:
+                found[doc_id] = model._from_son(son)
+            else:
+                missing[str(doc_id)] = doc_id
+        return found, missing, stamp
+
+    def fill(self, model, loaded, stamp):
+        """Cache documents loaded after ``lookup`` returned ``stamp``"""
+        for document in loaded:
+            self._store(self._key(model, document.id), stamp, document.to_mongo())
+
+    def invalidate(self, model, doc_id):
+        """Drop ``doc_id`` and reject in-flight loads that started earlier"""
+        key = self._key(model, doc_id)
+        with self._lock:
+            self._clock += 1
+            self._invalidated[key] = self._clock
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self._max_tracked:
+                _, stamp = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, stamp)
+        self._entries.pop(key)
+
+
+class GenerationCache:
+    """LRU cache of values derived from a whole collection.
+
+    Any write to the collection calls ``bump``, which retires every entry at
+    once. Values are stored under the generation that was current when their
+    computation started, so a result computed before a bump is never served
+    after it.
+    """
+
+    def __init__(self, name, maxsize, ttl):
+        self._entries = LRUCache(name, maxsize, ttl)
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def lookup(self, key):
+        """Return ``(value or None, generation)``; pass the generation to ``store``"""
+        with self._lock:
+            generation = self._generation
+        return self._entries.get((generation, key)), generation
+
+    def store(self, key, value, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+        self._entries.set((generation, key), value)
+
+    def bump(self):
+        """Retire all cached values"""
+        with self._lock:
+            self._generation += 1
+        self._entries.clear()
+
+
+class TaggedCache:
+    """LRU cache whose entries carry surrogate keys (tags).
+
+    ``purge(tag)`` drops every entry stored with that tag, so one product
+    write retires exactly the cached pages that could show it. As in
+    DocumentCache, a value whose computation started before one of its tags
+    was purged is not stored.
+    """
+
+    def __init__(self, name, maxsize, ttl):
+        self._entries = LRUCache(name, maxsize, ttl)
+        self._lock = threading.Lock()
+        self._keys = {}  # tag -> keys stored with it (may include evicted keys)
+        self._clock = 0
+        self._floor = 0
+        self._purged = OrderedDict()  # tag -> clock of its most recent purge
+        self._max_tracked = maxsize
+
+    def lookup(self, key):
+        """Return ``(value or None, stamp)``; pass the stamp to ``store``"""
+        with self._lock:
+            stamp = self._clock
+        return self._entries.get(key), stamp
+
+    def store(self, key, value, tags, stamp):
+        with self._lock:
+            if any(self._purged.get(tag, self._floor) > stamp for tag in tags):
+                return
+            for tag in tags:
+                self._keys.setdefault(tag, set()).add(key)
+            self._entries.set(key, value)
+            if len(self._keys) > 2 * self._max_tracked:
+                # Forget evicted and expired keys
+                self._keys = {tag: live for tag, keys in self._keys.items()
+                              if (live := {stored for stored in keys if stored in self._entries})}
+
+    def purge(self, *tags):
+        """Drop every entry stored with any of ``tags``"""
+        with self._lock:
+            for tag in tags:
+                self._clock += 1
+                self._purged[tag] = self._clock
+                self._purged.move_to_end(tag)
+                for key in self._keys.pop(tag, ()):
+                    self._entries.pop(key)
+            while len(self._purged) > self._max_tracked:
+                _, stamp = self._purged.popitem(last=False)
+                self._floor = max(self._floor, stamp)
+
+    def clear(self):
+        with self._lock:
+            self._clock += 1
+            self._floor = self._clock
+            self._purged.clear()
+            self._keys.clear()
+            self._entries.clear()
+
+
+# Hot User and Product documents (relation properties in models.py)
+documents = DocumentCache('document', Config.DOCUMENT_CACHE_SIZE, Config.DOCUMENT_CACHE_TTL)
+
+# Compact snapshots of logged-in users, keyed by user id string (see auth.py)
+user_snapshots = LRUCache('user_snapshot', Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL)
+
+# Catalog facet counts keyed by normalized filter (see facets.py)
+product_facets = GenerationCache('facet', Config.FACET_CACHE_SIZE, Config.FACET_CACHE_TTL)
+
+# Rendered anonymous catalog pages, tagged with the products they depend on
+# (see render_cache.py)
+pages = TaggedCache('page', Config.PAGE_CACHE_SIZE, Config.PAGE_CACHE_TTL)
+
+# Rendered product card fragments keyed by product id and updated_at
+fragments = LRUCache('fragment', Config.FRAGMENT_CACHE_SIZE, Config.FRAGMENT_CACHE_TTL)
+
+# Cart, offer and order counts shown in the page chrome, per user (see bootstrap.py)
+client_counts = LRUCache('client_counts', Config.BOOTSTRAP_CACHE_SIZE, Config.BOOTSTRAP_CACHE_TTL)
+
+# Archived offers/orders per listing (see archive.py); the archive only
+# changes when archive_history.py runs
+archive_counts = LRUCache('archive_count', Config.ARCHIVE_COUNT_CACHE_SIZE, Config.ARCHIVE_COUNT_CACHE_TTL)
@@ -0,0 +1,96 @@
+"""Expiry and cleanup of abandoned cart items.
+
+Cart items carry ``touched_at``, set whenever they are added or changed and
+refreshed (at most daily) when the consumer opens the cart page. A TTL index
+on it lets MongoDB delete items untouched for ``CART_ITEM_TTL_DAYS``.
+``create_indexes.py`` creates the index and applies a changed TTL to an
+existing one (``update_ttl``), which createIndexes alone cannot do.
+
+``python sweep_carts.py`` removes the items whose product was deleted, or
+has been unavailable for ``CART_UNAVAILABLE_GRACE_DAYS``. Products are
+looked up with ``$in`` batches of ``CART_SWEEP_BATCH_SIZE``, and the
+removals are counted in ``agriconnect_cart_items_purged_total``.
+"""
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+import db
+import metrics
+from config import Config
+from models import CartItem, Product
+
+TTL_KEY = {'touched_at': 1}
+REASONS = ('deleted_product', 'unavailable_product')
+
+
+def ttl_seconds():
+    return Config.CART_ITEM_TTL_DAYS * 24 * 3600
+
+
+def update_ttl():
+    """Apply ``CART_ITEM_TTL_DAYS`` to an existing TTL index.
+
+    Returns True when the index was changed.
+    """
+    collection = CartItem._get_collection()
+    for index in collection.list_indexes():
+        if dict(index['key']) == TTL_KEY and index.get('expireAfterSeconds') != ttl_seconds():
+            collection.database.command('collMod', collection.name,
+                                        index={'keyPattern': TTL_KEY, 'expireAfterSeconds': ttl_seconds()})
+            return True
+    return False
+
+
+def backfill_touched_at(batch_size=1000):
+    """Start the expiry clock of items created before it existed at their
+    ``added_at``. Returns the number of items updated."""
+    collection = CartItem._get_collection()
+    updated = 0
+    batch = []
+    for son in collection.find({'touched_at': {'$exists': False}}, {'added_at': 1}):
+        batch.append(UpdateOne({'_id': son['_id'], 'touched_at': {'$exists': False}},
+                               {'$set': {'touched_at': son.get('added_at') or datetime.utcnow()}}))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
+def _stale_products(product_ids, unavailable_before):
+    """``{reason: [product id]}`` for the products whose cart items should go"""
+    found = {son['_id']: son for son in Product._get_collection().find(
+        {'_id': {'$in': product_ids}}, {'is_available': 1, 'updated_at': 1})}
+    stale = {reason: [] for reason in REASONS}
+    for product_id in product_ids:
+        product = found.get(product_id)
+        if product is None:
+            stale['deleted_product'].append(product_id)
+        elif (product.get('is_available') is False
+              and (product.get('updated_at') or datetime.min) < unavailable_before):
+            stale['unavailable_product'].append(product_id)
+    return stale
+
+
+def sweep(batch_size=None):
+    """Delete cart items pointing to deleted or long unavailable products.
+
+    Returns ``{reason: items deleted}``.
+    """
+    batch_size = batch_size or Config.CART_SWEEP_BATCH_SIZE
+    unavailable_before = datetime.utcnow() - timedelta(days=Config.CART_UNAVAILABLE_GRACE_DAYS)
+    collection = db.durable_collection(CartItem, CartItem.durability)
+    product_ids = [row['_id'] for row in collection.aggregate([{'$group': {'_id': '$product_id'}}])]
+
+    purged = dict.fromkeys(REASONS, 0)
+    for start in range(0, len(product_ids), batch_size):
+        stale = _stale_products(product_ids[start:start + batch_size], unavailable_before)
+        for reason, stale_ids in stale.items():
+            if not stale_ids:
+                continue
+            deleted = collection.delete_many({'product_id': {'$in': stale_ids}}).deleted_count
+            purged[reason] += deleted
+            metrics.CART_ITEMS_PURGED.labels(reason=reason).inc(deleted)
+    return purged
@@ -0,0 +1,19 @@
+import os
+import sys
+from compression import precompress
+
+# Flask's default static folder next to app.py
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+def compress_static(static_folder=None):
+    """Write brotli and gzip copies of the static CSS and JS.
+
+    Run this as part of each deploy, after the assets change. Requests for
+    static/css and static/js files are then answered with the precompressed
+    copy the client accepts. Copies newer than their source are left alone.
+    """
+    written = precompress(static_folder or STATIC_FOLDER)
+    print(f"Wrote {written} precompressed files")
+
+if __name__ == '__main__':
+    compress_static(sys.argv[1] if len(sys.argv) > 1 else None)
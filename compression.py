@@ -0,0 +1,170 @@
+"""Response compression.
+
+Dynamic responses of a compressible type (HTML, JSON, CSS, JS) are
+compressed with brotli or gzip, whichever the client accepts and prefers
+(brotli when both are equal and the ``Brotli`` package is installed), once
+they reach ``COMPRESS_MIN_SIZE`` bytes; below that the saving does not pay
+for the extra CPU. Streamed responses are compressed chunk by chunk, each
+chunk flushed so the client can start rendering before the stream ends.
+
+Static CSS and JS are compressed once at build time instead, at the highest
+levels: ``python compress_static.py`` writes ``.br`` and ``.gz`` files next
+to everything under static/css and static/js, and requests for those assets
+are answered with the matching file.
+"""
+import gzip
+import mimetypes
+import os
+import zlib
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+from config import Config
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml',
+}
+
+# Folders under the static folder that compress_static.py precompresses
+PRECOMPRESSED_DIRS = ('css', 'js')
+# Content-Encoding -> file suffix, in order of preference
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings, encodings=None):
+    """The best of ``encodings`` (default: all available) the client accepts, or None"""
+    best, best_quality = None, 0
+    for encoding in encodings or available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, level=None):
+    if encoding == 'br':
+        return brotli.compress(data, quality=Config.COMPRESS_BROTLI_QUALITY if level is None else level)
+    return gzip.compress(data, compresslevel=Config.COMPRESS_GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def _compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks, flushing after each one"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=Config.COMPRESS_BROTLI_QUALITY)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(Config.COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+def _add_vary(response):
+    response.vary.add('Accept-Encoding')
+
+
+def compress_response(response):
+    """Compress ``response`` in place for the current request if worthwhile"""
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    _add_vary(response)
+    if not response.is_streamed and (response.content_length or 0) < Config.COMPRESS_MIN_SIZE:
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.iter_encoded(), encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    # A strong ETag names exact bytes, so the compressed body needs its own
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+def precompressed_file(static_folder, filename):
+    """``(file name, encoding)`` of the best precompressed copy of a static
+    asset the client accepts, or None"""
+    if filename.split('/', 1)[0] not in PRECOMPRESSED_DIRS:
+        return None
+    source = safe_join(static_folder, filename)
+    if source is None or not os.path.isfile(source):
+        return None
+    accepted = [encoding for encoding in SUFFIXES
+                if os.path.isfile(source + SUFFIXES[encoding])
+                and os.path.getmtime(source + SUFFIXES[encoding]) >= os.path.getmtime(source)]
+    encoding = choose_encoding(request.accept_encodings, accepted) if accepted else None
+    if encoding is None:
+        return None
+    return filename + SUFFIXES[encoding], encoding
+
+
+def precompress(static_folder):
+    """Write ``.br`` (if Brotli is installed) and ``.gz`` siblings for the
+    static CSS and JS that are missing or older than their source.
+
+    Returns the number of files written.
+    """
+    written = 0
+    for folder in PRECOMPRESSED_DIRS:
+        for root, _, files in os.walk(os.path.join(static_folder, folder)):
+            for name in files:
+                if name.endswith(tuple(SUFFIXES.values())):
+                    continue
+                source = os.path.join(root, name)
+                if mimetypes.guess_type(name)[0] not in COMPRESSIBLE_MIMETYPES:
+                    continue
+                with open(source, 'rb') as handle:
+                    data = handle.read()
+                for encoding in available_encodings():
+                    target = source + SUFFIXES[encoding]
+                    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+                        continue
+                    level = 11 if encoding == 'br' else 9
+                    with open(target, 'wb') as handle:
+                        handle.write(compress(data, encoding, level))
+                    written += 1
+    return written
+
+
+def init_app(app):
+    """Serve precompressed static assets and compress dynamic responses"""
+
+    @app.before_request
+    def serve_precompressed():
+        if request.endpoint != 'static' or request.method not in ('GET', 'HEAD'):
+            return None
+        found = precompressed_file(app.static_folder, request.view_args['filename'])
+        if found is None:
+            return None
+        filename, encoding = found
+        mimetype = mimetypes.guess_type(request.view_args['filename'])[0]
+        response = send_from_directory(app.static_folder, filename, mimetype=mimetype,
+                                       max_age=app.get_send_file_max_age(filename))
+        response.headers['Content-Encoding'] = encoding
+        _add_vary(response)
+        return response
+
+    @app.after_request
+    def compress_dynamic(response):
+        return compress_response(response)
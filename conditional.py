@@ -0,0 +1,132 @@
+"""Conditional GET for the catalog pages.
+
+Home, product list and product detail responses carry a weak ETag (and, for
+anonymous visitors, a Last-Modified date) built from cheap version data:
+the product's ``updated_at`` for a detail page, and the ``CatalogVersion``
+counters that product writes bump for a listing (see models.py). A request
+whose If-None-Match or If-Modified-Since still matches gets a 304 before the
+view runs, so nothing is rendered and no products or users are loaded.
+
+Besides the content versions the validators cover what makes the page
+differ per visitor: the logged-in user, the session's CSRF token and a time
+bucket of half the CSRF time limit, so a page revalidated with a 304 never
+holds a token that has expired. They also change with each asset build, so
+pages never keep linking the previous deploy's CSS and JS. Pages rendered while a flash message was
+shown, and distance filters around the user's saved location, are never
+validated.
+"""
+import hashlib
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import g, request, session
+
+import assets
+import render_cache
+from cache import documents
+from models import CatalogVersion, Product
+
+# Counter shown on every catalog page (farmer names and locations)
+ALL = 'all'
+
+
+def _csrf_bucket(app):
+    """``(bucket number, bucket start)`` of the CSRF token lifetime"""
+    limit = app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if not limit:
+        return 0, None
+    width = max(limit // 2, 1)
+    bucket = int(time.time() // width)
+    return bucket, datetime.utcfromtimestamp(bucket * width)
+
+
+def _listing_versions():
+    category = request.args.get('category', '').strip()
+    keys = (ALL, 'facets', f'category:{category}' if category else 'listing')
+    return list(CatalogVersion.current(*keys).values())
+
+
+def _detail_versions():
+    try:
+        product = documents.get(Product, ObjectId(request.view_args['product_id']))
+    except InvalidId:
+        return None
+    if product is None:
+        return None
+    return [(str(product.id), product.updated_at)] + list(CatalogVersion.current(ALL).values())
+
+
+def _versions():
+    """Version data the page depends on, or None when it must be rendered"""
+    if '_flashes' in session:
+        return None
+    if request.endpoint == 'product_detail':
+        return _detail_versions()
+    if request.args.get('radius') and not (request.args.get('lat') and request.args.get('lon')):
+        # Centred on the user's saved location, which the counters do not cover
+        return None
+    return _listing_versions()
+
+
+def _validators(app, versions):
+    """``(etag, last_modified)``; Last-Modified only for anonymous visitors"""
+    bucket, bucket_start = _csrf_bucket(app)
+    user_id = session.get('_user_id')
+    parts = (request.endpoint, tuple(versions), user_id, session.get('csrf_token'), bucket,
+             assets.built_at)
+    etag = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    if user_id is not None:
+        return etag, None
+    moments = [moment for _, moment in versions] + [bucket_start, assets.built_at]
+    last_modified = max((moment for moment in moments if moment), default=datetime(1970, 1, 1))
+    return etag, last_modified.replace(microsecond=0)
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return (last_modified is not None and since is not None
+            and since.replace(tzinfo=None) >= last_modified)
+
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Always revalidate; pages with a logged-in user stay out of shared caches
+    response.cache_control.no_cache = True
+    if last_modified is None:
+        response.cache_control.private = True
+
+
+def init_app(app):
+    """Answer conditional requests for the catalog pages before their views run"""
+
+    @app.before_request
+    def answer_conditional_get():
+        if request.method != 'GET' or request.endpoint not in render_cache.CACHED_ENDPOINTS:
+            return None
+        versions = _versions()
+        if versions is None:
+            return None
+        etag, last_modified = _validators(app, versions)
+        if _not_modified(etag, last_modified):
+            response = app.response_class(status=304)
+            _set_validators(response, etag, last_modified)
+            return response
+        g.page_versions = versions
+        return None
+
+    @app.after_request
+    def add_validators(response):
+        versions = g.pop('page_versions', None)
+        if (versions is None or response.status_code != 200 or response.mimetype != 'text/html'
+                or render_cache.flashed()):
+            return response
+        # The render may have created the session's CSRF token or logged in
+        # a remember-me user, so the validators are computed again
+        _set_validators(response, *_validators(app, versions))
+        return response
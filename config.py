@@ -18,12 +18,33 @@ class Config:
         else:
             MONGODB_URI = f'mongodb://{MONGODB_HOST}:{MONGODB_PORT}/{MONGODB_DATABASE}'
     
-    # MongoDB settings for MongoEngine
+    # Connection pool sizing (per worker process)
+    MONGODB_MAX_POOL_SIZE = int(os.environ.get('MONGODB_MAX_POOL_SIZE') or 20)
+    MONGODB_MIN_POOL_SIZE = int(os.environ.get('MONGODB_MIN_POOL_SIZE') or 0)
+    MONGODB_MAX_CONNECTING = int(os.environ.get('MONGODB_MAX_CONNECTING') or 2)
+    MONGODB_MAX_IDLE_TIME_MS = int(os.environ.get('MONGODB_MAX_IDLE_TIME_MS') or 60000)
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGODB_WAIT_QUEUE_TIMEOUT_MS') or 5000)
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS') or 5000)
+    
+    # MongoDB settings for MongoEngine (see db.py). The client is created lazily
+    # in each worker process; minPoolSize defaults to 0 and maxConnecting is low
+    # so restarting workers do not open a burst of connections at once.
     MONGODB_SETTINGS = {
         'host': MONGODB_URI,
-        'connect': False  # Disable connection pooling for better compatibility with Flask
+        'maxPoolSize': MONGODB_MAX_POOL_SIZE,
+        'minPoolSize': MONGODB_MIN_POOL_SIZE,
+        'maxConnecting': MONGODB_MAX_CONNECTING,
+        'maxIdleTimeMS': MONGODB_MAX_IDLE_TIME_MS,
+        'waitQueueTimeoutMS': MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': MONGODB_SERVER_SELECTION_TIMEOUT_MS
     }
     
+    # Catalogue, search and facet reads may be served by secondaries (see
+    # db.catalog_read_preference). MongoDB accepts no max staleness below 90
+    # seconds; a visitor who wrote is kept on the primary for that long.
+    MONGODB_CATALOG_READ_PREFERENCE = os.environ.get('MONGODB_CATALOG_READ_PREFERENCE') or 'secondaryPreferred'
+    MONGODB_MAX_STALENESS_SECONDS = int(os.environ.get('MONGODB_MAX_STALENESS_SECONDS') or 90)
+    
     # Flask configuration
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-change-this-in-production'
     
@@ -32,5 +53,78 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     
+    # In-process cache of logged-in user snapshots (see auth.py)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 10000)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 30)  # seconds
+    
+    # In-process cache of User and Product documents by id (see cache.py)
+    DOCUMENT_CACHE_SIZE = int(os.environ.get('DOCUMENT_CACHE_SIZE') or 5000)
+    DOCUMENT_CACHE_TTL = int(os.environ.get('DOCUMENT_CACHE_TTL') or 60)  # max staleness, seconds
+    
+    # In-process cache of catalog facet counts per search filter (see facets.py)
+    FACET_CACHE_SIZE = int(os.environ.get('FACET_CACHE_SIZE') or 1000)
+    FACET_CACHE_TTL = int(os.environ.get('FACET_CACHE_TTL') or 60)  # max staleness, seconds
+    
+    # In-process type-ahead index (see suggest.py)
+    SUGGEST_MAX_TERMS = int(os.environ.get('SUGGEST_MAX_TERMS') or 200000)
+    SUGGEST_TOP_K = int(os.environ.get('SUGGEST_TOP_K') or 8)
+    SUGGEST_MEMO_SIZE = int(os.environ.get('SUGGEST_MEMO_SIZE') or 20000)  # cached long prefixes
+    SUGGEST_REFRESH_INTERVAL = int(os.environ.get('SUGGEST_REFRESH_INTERVAL') or 3600)  # full rebuild, seconds
+    
+    # In-process fuzzy product search index (see search.py)
+    SEARCH_MIN_SIMILARITY = float(os.environ.get('SEARCH_MIN_SIMILARITY') or 0.45)  # share of query trigrams
+    SEARCH_DESCRIPTION_CHARS = int(os.environ.get('SEARCH_DESCRIPTION_CHARS') or 200)
+    SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS') or 500)
+    SEARCH_REFRESH_INTERVAL = int(os.environ.get('SEARCH_REFRESH_INTERVAL') or 3600)  # full rebuild, seconds
+    
+    # Farmer/product locations and the "near me" filter (see geo.py)
+    GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.csv')
+    GEO_MAX_RADIUS_KM = float(os.environ.get('GEO_MAX_RADIUS_KM') or 500)
+    
+    # In-process caches of rendered catalog pages for anonymous visitors and of
+    # product card fragments for everyone (see render_cache.py)
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE') or 500)
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL') or 30)  # max staleness, seconds
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE') or 5000)
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL') or 600)  # seconds
+    
+    # In-process cache of the per-user counts /api/bootstrap returns (see bootstrap.py)
+    BOOTSTRAP_CACHE_SIZE = int(os.environ.get('BOOTSTRAP_CACHE_SIZE') or 10000)
+    BOOTSTRAP_CACHE_TTL = int(os.environ.get('BOOTSTRAP_CACHE_TTL') or 5)  # max staleness, seconds
+    
+    # Response compression (see compression.py). Levels are for dynamic
+    # responses; compress_static.py always uses the maximum.
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 1024)  # bytes
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL') or 6)
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY') or 5)
+    
+    # Password hashing (see passwords.py). The method must be fully specified as
+    # werkzeug writes it into the hash, e.g. 'pbkdf2:sha256:600000' or
+    # 'scrypt:32768:8:1'; stored hashes with other parameters are upgraded on login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1)
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT') or 8)
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT') or 10)  # seconds
+    
+    # Threads for the farmer dashboard's concurrent queries (see dashboard.py)
+    DASHBOARD_QUERY_THREADS = int(os.environ.get('DASHBOARD_QUERY_THREADS') or 6)
+    
+    # Cart items expire this long after they were last added, changed or seen on
+    # the cart page (TTL index, see cart_cleanup.py)
+    CART_ITEM_TTL_DAYS = int(os.environ.get('CART_ITEM_TTL_DAYS') or 30)
+    # sweep_carts.py: products looked up per query, and how long a product must
+    # have been unavailable before its cart items are removed
+    CART_SWEEP_BATCH_SIZE = int(os.environ.get('CART_SWEEP_BATCH_SIZE') or 500)
+    CART_UNAVAILABLE_GRACE_DAYS = int(os.environ.get('CART_UNAVAILABLE_GRACE_DAYS') or 7)
+    
+    # Resolved offers and finished orders older than this move to archive
+    # collections (archive_history.py, see archive.py)
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS') or 90)
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE') or 1000)
+    # Per-user archived counts, for the page count of the offers/orders lists
+    ARCHIVE_COUNT_CACHE_SIZE = int(os.environ.get('ARCHIVE_COUNT_CACHE_SIZE') or 10000)
+    ARCHIVE_COUNT_CACHE_TTL = int(os.environ.get('ARCHIVE_COUNT_CACHE_TTL') or 600)
+    
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=2)
@@ -0,0 +1,35 @@
+from mongoengine import connect
+from models import User, Product, CartItem, Offer, Order, FarmerDailyRollup, PriceTrend
+from config import Config
+from cart_cleanup import update_ttl
+from archive import MODELS as ARCHIVED_MODELS, ensure_indexes as ensure_archive_indexes
+from price_history import ensure_collection as ensure_price_history
+
+def create_indexes():
+    """Create the indexes declared in the models' meta.
+
+    Automatic index creation is disabled at runtime (``auto_create_index``)
+    so that the first query in a fresh process does not issue createIndexes
+    commands. Run this once after deploying model changes. The ``User``
+    indexes are also created by each app process (``db.require_indexes``).
+    """
+    connect(host=Config.MONGODB_URI)
+    
+    # createIndexes cannot change the TTL of the existing cart expiry index
+    if update_ttl():
+        print("Updated the cart item expiry (CART_ITEM_TTL_DAYS)")
+    
+    # Before any product save, which would create a plain collection
+    if ensure_price_history():
+        print("Created the 'price_history' time-series collection")
+    
+    for document in (User, Product, CartItem, Offer, Order, FarmerDailyRollup, PriceTrend):
+        document.ensure_indexes()
+        print(f"Indexes ensured for '{document._get_collection_name()}'")
+    
+    ensure_archive_indexes()
+    for document in ARCHIVED_MODELS:
+        print(f"Indexes ensured for '{document.archive_collection}'")
+
+if __name__ == '__main__':
+    create_indexes()
@@ -0,0 +1,62 @@
+"""Farmer dashboard data loader.
+
+The dashboard needs four independent queries (recent products, offers and
+orders, and the analytics rollups) plus the products the top-product totals
+point to; offers and orders carry their own product snapshot. The primary
+queries run concurrently on a small thread pool, then the top products are
+resolved in one batched step through the document cache, so the page costs
+about the slowest query instead of the sum of all of them.
+"""
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import analytics
+from cache import documents
+from config import Config
+from models import Offer, Order, Product
+
+FarmerDashboard = namedtuple('FarmerDashboard', ['products', 'offers', 'orders', 'analytics'])
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """Pool threads do not survive fork; build a new pool on next use"""
+    global _executor, _lock
+    _executor = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.DASHBOARD_QUERY_THREADS,
+                                               thread_name_prefix='dashboard')
+    return _executor
+
+
+def _recent(model, farmer_id, limit):
+    return list(model.objects(farmer_id=farmer_id).order_by('-created_at').limit(limit))
+
+
+def load_farmer_dashboard(farmer_id):
+    """Return a ready-to-render FarmerDashboard for ``farmer_id``"""
+    pool = _pool()
+    products = pool.submit(_recent, Product, farmer_id, 20)
+    offers = pool.submit(_recent, Offer, farmer_id, 10)
+    orders = pool.submit(_recent, Order, farmer_id, 10)
+    summary = pool.submit(analytics.farmer_summary, farmer_id)
+    dashboard = FarmerDashboard(products.result(), offers.result(), orders.result(), summary.result())
+
+    # One batched lookup for the products named in the analytics widgets
+    documents.get_many(Product, [totals.product_id for totals in dashboard.analytics.top_products])
+    return dashboard
@@ -0,0 +1,319 @@
+"""MongoDB connection management.
+
+Connection settings (including pool sizing) come from ``Config.MONGODB_SETTINGS``
+and are registered with MongoEngine without creating a client. The MongoClient
+is created lazily by the first query in each process, and any client inherited
+across ``fork()`` (gunicorn ``--preload``) is dropped in the child so that
+workers never share sockets with their parent.
+
+Reads go to the primary unless a query asks otherwise. Catalogue, search and
+facet reads use ``catalog_read_preference()`` (``secondaryPreferred`` with a
+``maxStalenessSeconds`` bound by default), so browsing scales with the
+replica set's secondaries. A visitor whose request wrote to a catalogue
+collection (``CATALOG_COLLECTIONS``: products, or user names and locations
+shown on them) reads the catalogue from the primary for the next
+``MONGODB_MAX_STALENESS_SECONDS``, so they always see their own changes.
+Cart, offer and order writes, including ephemeral ones such as the cart
+expiry touch, leave the visitor on the secondaries.
+
+Indexes are created offline by create_indexes.py, except those the app
+relies on for correctness (the unique user names and emails):
+``require_indexes`` models have theirs created by each process before it
+serves its first request, which costs one round trip when they exist.
+
+Writes carry one of three durability classes (``WRITE_CONCERNS``):
+``ephemeral`` for cart UI state, acknowledged by the primary alone;
+``financial`` for orders and stock, acknowledged once journaled on a
+majority; and ``standard``, the connection's default, for everything else.
+"""
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, session
+from mongoengine import DEFAULT_CONNECTION_NAME, Document, register_connection
+from mongoengine import connection as me_connection
+from mongoengine.base.common import _document_registry
+from pymongo import ReadPreference, WriteConcern, monitoring
+from pymongo.errors import OperationFailure
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Keep per-process connection pool counters for instrumentation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {
+                'open': 0,
+                'checked_out': 0,
+                'created_total': 0,
+                'closed_total': 0,
+                'checkout_failures_total': 0,
+                'pools_cleared_total': 0,
+            }
+
+    def _update(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+        _publish(deltas)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(pools_cleared_total=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(open=1, created_total=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(open=-1, closed_total=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._update(checkout_failures_total=1)
+
+    def connection_checked_out(self, event):
+        self._update(checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._update(checked_out=-1)
+
+
+EPHEMERAL = 'ephemeral'
+STANDARD = 'standard'
+FINANCIAL = 'financial'
+# Durability class -> write concern options over the connection's default
+WRITE_CONCERNS = {
+    EPHEMERAL: {'w': 1, 'j': False},
+    STANDARD: {},
+    FINANCIAL: {'w': 'majority', 'j': True},
+}
+
+WRITE_COMMANDS = {'insert', 'update', 'delete', 'findAndModify'}
+READ_COMMANDS = {'find', 'aggregate', 'count', 'distinct'}
+# Writes to these change what catalogue reads return
+CATALOG_COLLECTIONS = {'products', 'users'}
+SERVER_ROLES = {'RSPrimary': 'primary', 'RSSecondary': 'secondary', 'Standalone': 'standalone',
+                'Mongos': 'mongos', 'LoadBalancer': 'load_balancer'}
+
+
+class ReadRoutingListener(monitoring.CommandListener, monitoring.ServerListener):
+    """Count read commands by the role of the server that ran them, and
+    note in ``g`` when a request writes to a catalogue collection"""
+
+    def __init__(self):
+        self.roles = {}  # server address -> role
+
+    def started(self, event):
+        if event.command_name in WRITE_COMMANDS:
+            if event.command.get(event.command_name) in CATALOG_COLLECTIONS and has_request_context():
+                g.mongo_wrote = True
+        elif event.command_name in READ_COMMANDS:
+            collection = event.command.get(event.command_name)
+            metrics.MONGO_READS.labels(
+                collection=collection if isinstance(collection, str) else 'none',
+                server=self.roles.get(event.connection_id, 'unknown')).inc()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        self.roles[event.server_address] = SERVER_ROLES.get(
+            event.new_description.server_type_name, 'other')
+
+    def closed(self, event):
+        self.roles.pop(event.server_address, None)
+
+
+pool_listener = PoolStatsListener()
+routing_listener = ReadRoutingListener()
+
+_settings = {}
+_pid = None
+_lock = threading.Lock()
+_required_indexes = []  # models whose indexes each process creates
+_catalog_reads = ReadPreference.PRIMARY
+_max_staleness = 0
+
+
+def _publish(deltas):
+    """Forward pool counter changes to the Prometheus collectors"""
+    for key, delta in deltas.items():
+        if key in ('open', 'checked_out'):
+            metrics.MONGO_POOL_CONNECTIONS.labels(state=key).inc(delta)
+        else:
+            metrics.MONGO_POOL_EVENTS.labels(event=key[:-len('_total')]).inc(delta)
+
+
+def pool_stats():
+    """Return a snapshot of this process' connection pool counters"""
+    with pool_listener._lock:
+        stats = dict(pool_listener.stats)
+    stats['pid'] = os.getpid()
+    stats['max_pool_size'] = _settings.get('maxPoolSize')
+    stats['min_pool_size'] = _settings.get('minPoolSize')
+    return stats
+
+
+def _drop_inherited_client():
+    """Forget the client and cached collections without touching their sockets.
+
+    Closing an inherited client from the child would talk over sockets that
+    still belong to the parent, so the references are simply discarded and a
+    fresh client is built from the registered settings on next use.
+    """
+    global _pid
+    me_connection._connections.pop(DEFAULT_CONNECTION_NAME, None)
+    me_connection._dbs.pop(DEFAULT_CONNECTION_NAME, None)
+    for document_cls in _document_registry.values():
+        # Embedded documents are registered too but hold no collection
+        if issubclass(document_cls, Document):
+            document_cls._disconnect()
+    pool_listener.reset()
+    _pid = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_drop_inherited_client)
+
+
+def configure(settings):
+    """Register connection settings without opening a connection"""
+    global _settings
+    _settings = dict(settings)
+    kwargs = dict(_settings)
+    kwargs['connect'] = False
+    kwargs['event_listeners'] = [pool_listener, routing_listener]
+    register_connection(DEFAULT_CONNECTION_NAME, **kwargs)
+
+
+def client_settings():
+    """MongoClient keyword arguments (``host`` included) for clients that
+    MongoEngine does not create, such as Motor's"""
+    kwargs = {key: value for key, value in _settings.items() if key not in ('db', 'name', 'alias')}
+    kwargs['event_listeners'] = [pool_listener, routing_listener]
+    return kwargs
+
+
+def database_name():
+    """The database MongoEngine uses: the settings' ``db``, else the URI's"""
+    return me_connection._connection_settings[DEFAULT_CONNECTION_NAME]['name']
+
+
+def require_indexes(*models):
+    """Create the indexes of ``models`` in each process before it serves a request"""
+    _required_indexes.extend(models)
+
+
+def _create_required_indexes():
+    for model in _required_indexes:
+        try:
+            model.ensure_indexes()
+        except OperationFailure:
+            # E.g. duplicates stored before the index existed; serve anyway
+            logger.exception('Could not create the indexes of %s', model._get_collection_name())
+
+
+def configure_reads(mode, max_staleness):
+    """Set the read preference of catalogue reads (a MongoDB mode name)"""
+    global _catalog_reads, _max_staleness
+    _max_staleness = max_staleness
+    if mode == 'primary':
+        _catalog_reads = ReadPreference.PRIMARY
+    else:
+        _catalog_reads = make_read_preference(read_pref_mode_from_name(mode), None, max_staleness)
+
+
+def catalog_read_preference():
+    """Read preference for catalogue, search and facet reads.
+
+    The configured one, except for a visitor who wrote in the last max
+    staleness seconds: a secondary may not have their write yet, so they
+    read from the primary.
+    """
+    if (_catalog_reads.mode and has_request_context()
+            and session.get('primary_until', 0) > time.time()):
+        metrics.CATALOG_READ_ROUTES.labels(read_preference='primary_after_write').inc()
+        return ReadPreference.PRIMARY
+    metrics.CATALOG_READ_ROUTES.labels(read_preference=_catalog_reads.mongos_mode).inc()
+    return _catalog_reads
+
+
+def write_concern(durability):
+    """mongoengine ``write_concern`` argument for a durability class"""
+    return dict(WRITE_CONCERNS[durability])
+
+
+def durable_collection(model, durability):
+    """``model``'s collection for raw writes of a durability class"""
+    return with_durability(model._get_collection(), durability)
+
+
+def with_durability(collection, durability):
+    """``collection`` with the write concern of a durability class"""
+    options = dict(collection.write_concern.document)
+    options.update(WRITE_CONCERNS[durability])
+    return collection.with_options(write_concern=WriteConcern(**options))
+
+
+def catalog_collection(model):
+    """``model``'s collection for catalogue reads"""
+    return model._get_collection().with_options(read_preference=catalog_read_preference())
+
+
+def ensure_connection():
+    """Make sure this process owns its MongoClient (created on first use)"""
+    global _pid
+    if _pid == os.getpid():
+        return
+    with _lock:
+        if _pid == os.getpid():
+            return
+        if _pid is not None:
+            # Fork without register_at_fork support
+            _drop_inherited_client()
+        # Connection errors propagate and the next request tries again
+        _create_required_indexes()
+        _pid = os.getpid()
+
+
+def init_app(app):
+    """Configure MongoDB for the Flask app"""
+    configure(app.config['MONGODB_SETTINGS'])
+    configure_reads(app.config['MONGODB_CATALOG_READ_PREFERENCE'], app.config['MONGODB_MAX_STALENESS_SECONDS'])
+    app.before_request(ensure_connection)
+
+    @app.after_request
+    def read_own_writes(response):
+        if g.pop('mongo_wrote', False) and _catalog_reads.mode:
+            session['primary_until'] = int(time.time()) + _max_staleness
+        return response
@@ -0,0 +1,143 @@
+"""Catalog facets: category counts, a price histogram and the price range.
+
+All facets for a search come from one ``$facet`` aggregation. Each facet
+ignores its own filter (category counts apply the price filter but not the
+category, the price facets apply the category but not the price), so the
+numbers next to the filters say how many products each choice would show.
+
+Results are cached per normalized filter in ``cache.product_facets``; product
+writes that touch a filtered field retire the whole cache (see models.py).
+"""
+import re
+from collections import namedtuple
+
+import db
+import geo
+from cache import product_facets
+from models import Product
+
+# Lower bounds of the price histogram buckets; the last bucket is open-ended
+PRICE_BOUNDARIES = (0, 25, 50, 100, 250, 500, 1000)
+
+FacetFilter = namedtuple('FacetFilter', ['search_query', 'category', 'min_price', 'max_price', 'near'])
+PriceBucket = namedtuple('PriceBucket', ['low', 'high', 'count'])
+
+
+class Facets(namedtuple('Facets', ['total', 'categories', 'price_buckets', 'min_price', 'max_price'])):
+    """Facet counts for one filter"""
+
+    def count(self, category):
+        """Number of matching products in ``category``"""
+        return self.categories.get(category, 0)
+
+
+def normalize(args, near=None):
+    """Build the cache key for the search filters in ``args`` (request.args)
+    and the distance filter ``near`` (geo.Near or None)"""
+    search_query = ' '.join(args.get('search_query', '').split()).lower()
+    return FacetFilter(
+        search_query=search_query,
+        category=args.get('category', '').strip(),
+        min_price=args.get('min_price', type=float),
+        max_price=args.get('max_price', type=float),
+        near=near
+    )
+
+
+def _base_match(flt, ids=None):
+    query = {'is_available': True}
+    if ids is not None:
+        query['_id'] = {'$in': ids}
+    elif flt.search_query:
+        pattern = {'$regex': re.escape(flt.search_query), '$options': 'i'}
+        query['$or'] = [{'name': pattern}, {'description': pattern}, {'category': pattern}]
+    if flt.near:
+        query.update(geo.within(flt.near))
+    return query
+
+
+def _category_match(flt):
+    return {'category': flt.category} if flt.category else {}
+
+
+def _price_match(flt):
+    price = {}
+    if flt.min_price is not None:
+        price['$gte'] = flt.min_price
+    if flt.max_price is not None:
+        price['$lte'] = flt.max_price
+    return {'price': price} if price else {}
+
+
+def match(flt, ids=None):
+    """Raw query for the products matching every filter.
+
+    ``ids`` are the search index matches for ``flt.search_query``; without
+    them the search term is matched as a substring.
+    """
+    return dict(_base_match(flt, ids), **_category_match(flt), **_price_match(flt))
+
+
+def pipeline(flt, ids=None):
+    """The single ``$facet`` aggregation computing every facet for ``flt``"""
+    in_category = _category_match(flt)
+    in_price = _price_match(flt)
+    return [
+        {'$match': _base_match(flt, ids)},
+        {'$facet': {
+            'total': [{'$match': dict(in_category, **in_price)}, {'$count': 'count'}],
+            'categories': [
+                {'$match': in_price},
+                {'$group': {'_id': '$category', 'count': {'$sum': 1}}},
+            ],
+            'prices': [
+                {'$match': in_category},
+                {'$bucket': {
+                    'groupBy': '$price',
+                    'boundaries': list(PRICE_BOUNDARIES) + [float('inf')],
+                    'default': 'other',
+                    'output': {'count': {'$sum': 1}},
+                }},
+            ],
+            'range': [
+                {'$match': in_category},
+                {'$group': {'_id': None, 'min': {'$min': '$price'}, 'max': {'$max': '$price'}}},
+            ],
+        }},
+    ]
+
+
+def parse(result):
+    """Turn the ``$facet`` output document into Facets"""
+    counts = {row['_id']: row['count'] for row in result['prices']}
+    buckets = []
+    for index, low in enumerate(PRICE_BOUNDARIES):
+        high = PRICE_BOUNDARIES[index + 1] if index + 1 < len(PRICE_BOUNDARIES) else None
+        buckets.append(PriceBucket(low, high, counts.get(low, 0)))
+    price_range = result['range'][0] if result['range'] else {}
+    return Facets(
+        total=result['total'][0]['count'] if result['total'] else 0,
+        categories={row['_id']: row['count'] for row in result['categories'] if row['_id']},
+        price_buckets=buckets,
+        min_price=price_range.get('min'),
+        max_price=price_range.get('max')
+    )
+
+
+def lookup(flt, ids=None):
+    """Return ``(cached Facets or None, generation)`` for ``flt``"""
+    return product_facets.lookup((flt, ids is not None))
+
+
+def store(flt, ids, facets, generation):
+    product_facets.store((flt, ids is not None), facets, generation)
+
+
+def get_facets(flt, ids=None):
+    """Return the Facets for ``flt``, running the aggregation on a cache miss"""
+    facets, generation = lookup(flt, ids)
+    if facets is None:
+        result = next(db.catalog_collection(Product).aggregate(pipeline(flt, ids)))
+        facets = parse(result)
+        store(flt, ids, facets, generation)
+    return facets
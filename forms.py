@@ -1,8 +1,7 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, TextAreaField, DecimalField, IntegerField, SelectField, PasswordField, SubmitField, HiddenField
-from wtforms.validators import DataRequired, Email, Length, NumberRange, EqualTo, ValidationError, Optional
-from models import User
+from wtforms.validators import DataRequired, Email, Length, NumberRange, EqualTo, Optional
 
 class RegistrationForm(FlaskForm):
     username = StringField('Username', validators=[
@@ -39,15 +38,12 @@ class RegistrationForm(FlaskForm):
     ])
     submit = SubmitField('Register')
     
-    def validate_username(self, username):
-        user = User.objects(username=username.data).first()
-        if user:
-            raise ValidationError('Username already exists. Please choose a different one.')
-    
-    def validate_email(self, email):
-        user = User.objects(email=email.data).first()
-        if user:
-            raise ValidationError('Email already registered. Please use a different email address.')
+    # Username/email uniqueness is enforced by the unique indexes on User:
+    # register() inserts directly and maps NotUniqueError back to the field.
+    DUPLICATE_ERRORS = {
+        'username': 'Username already exists. Please choose a different one.',
+        'email': 'Email already registered. Please use a different email address.'
+    }
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -0,0 +1,201 @@
+"""Farmer and product locations and the "near me" catalog filter.
+
+Users have a free-text address; ``User.location`` is a GeoJSON point
+geocoded from it against a local gazetteer file (``GAZETTEER_PATH``, no
+external service). Every product carries a copy of its farmer's point
+(``Product.location``, kept in step by ``User.save``) so a distance filter is
+one query on products, served by their 2dsphere index and combined with the
+category, price and search filters like any other condition.
+
+The filter uses ``$geoWithin``/``$centerSphere`` rather than ``$near``:
+``$near`` sorts by distance, which rules out ``count_documents`` and
+``$facet`` stages, both of which the catalog pages need.
+"""
+import csv
+import math
+import os
+import re
+from collections import namedtuple
+
+from config import Config
+
+EARTH_RADIUS_KM = 6378.1
+# Choices offered by the catalog filter, in km
+RADIUS_CHOICES = (5, 10, 25, 50, 100, 250)
+
+Near = namedtuple('Near', ['lat', 'lon', 'radius_km'])
+
+
+def point(lat, lon):
+    """GeoJSON point (longitude first, as MongoDB expects)"""
+    return {'type': 'Point', 'coordinates': [lon, lat]}
+
+
+def coordinates(location):
+    """``(lat, lon)`` of a GeoJSON point, or None"""
+    if not location:
+        return None
+    lon, lat = location['coordinates']
+    return lat, lon
+
+
+def distance_km(origin, destination):
+    """Great-circle distance between two ``(lat, lon)`` pairs"""
+    lat1, lon1 = map(math.radians, origin)
+    lat2, lon2 = map(math.radians, destination)
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def parse_near(args, fallback=None):
+    """The Near filter asked for in ``args`` (request.args), or None.
+
+    ``radius`` is in km; the centre is ``lat``/``lon`` from the browser or
+    else ``fallback``, the user's saved location. Coordinates are rounded to
+    about 100 m so nearby requests share facet cache entries.
+    """
+    radius = args.get('radius', type=float)
+    if not radius or radius <= 0:
+        return None
+    lat = args.get('lat', type=float)
+    lon = args.get('lon', type=float)
+    if lat is None or lon is None:
+        if not fallback:
+            return None
+        lat, lon = coordinates(fallback)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return Near(round(lat, 3), round(lon, 3), min(radius, Config.GEO_MAX_RADIUS_KM))
+
+
+def within(near):
+    """Raw query for products within ``near.radius_km`` of the centre"""
+    return {'location': {'$geoWithin': {
+        '$centerSphere': [[near.lon, near.lat], near.radius_km / EARTH_RADIUS_KM]
+    }}}
+
+
+def distances(products, near):
+    """``{product id: km}`` from the centre of ``near`` for products with a location"""
+    if near is None:
+        return {}
+    origin = (near.lat, near.lon)
+    return {product.id: distance_km(origin, coordinates(product.location))
+            for product in products if product.location}
+
+
+def _normalize(text):
+    return ' '.join(re.sub(r'[^\w]+', ' ', text.lower()).split())
+
+
+class Gazetteer:
+    """Place names and postal codes with their coordinates.
+
+    Loaded from a CSV file with ``name,lat,lon`` columns; a name made of
+    digits is a postal code. Several names may share coordinates
+    (``Bangalore`` and ``Bengaluru``).
+    """
+
+    # Longest place name looked for inside an address part, in words
+    MAX_NAME_WORDS = 4
+
+    def __init__(self, places):
+        self.places = places  # normalized name or postal code -> (lat, lon)
+
+    def __len__(self):
+        return len(self.places)
+
+    @classmethod
+    def load(cls, path):
+        places = {}
+        with open(path, newline='', encoding='utf-8') as handle:
+            for row in csv.DictReader(handle):
+                name = _normalize(row['name'])
+                if name:
+                    places[name] = (float(row['lat']), float(row['lon']))
+        return cls(places)
+
+    def locate(self, address):
+        """``(lat, lon)`` for a free-text address, or None.
+
+        A known postal code wins; otherwise the first comma- or line-separated
+        part that is a place name (addresses go from specific to general),
+        then the first place name found inside a part.
+        """
+        parts = [_normalize(part) for part in re.split(r'[,\n;]', address or '')]
+        for part in parts:
+            for word in part.split():
+                if word.isdigit() and word in self.places:
+                    return self.places[word]
+        names = [' '.join(word for word in part.split() if not word.isdigit()) for part in parts]
+        for name in names:
+            if name in self.places:
+                return self.places[name]
+        for name in names:
+            words = name.split()
+            for size in range(min(len(words), self.MAX_NAME_WORDS), 0, -1):
+                for start in range(len(words) - size + 1):
+                    found = self.places.get(' '.join(words[start:start + size]))
+                    if found:
+                        return found
+        return None
+
+
+_gazetteer = None
+
+
+def gazetteer():
+    """The gazetteer at ``GAZETTEER_PATH``, loaded once per process (empty if missing)"""
+    global _gazetteer
+    if _gazetteer is None:
+        path = Config.GAZETTEER_PATH
+        _gazetteer = Gazetteer.load(path) if os.path.exists(path) else Gazetteer({})
+    return _gazetteer
+
+
+def locate(address):
+    """GeoJSON point for ``address``, or None when the gazetteer has no match"""
+    found = gazetteer().locate(address)
+    return point(*found) if found else None
+
+
+def backfill(places, overwrite=False, batch_size=1000):
+    """Geocode stored user addresses with ``places`` (a Gazetteer) in batches.
+
+    Users that already have a location keep it unless ``overwrite``. Each
+    geocoded farmer's products get the new location too. Returns
+    ``(located, unmatched)`` user counts.
+    """
+    # Imported here because models imports this module
+    from pymongo import UpdateMany, UpdateOne
+    from models import Product, User
+
+    query = {'address': {'$nin': [None, '']}}
+    if not overwrite:
+        query['location'] = None
+    located = unmatched = 0
+    users, products = [], []
+
+    def flush():
+        if users:
+            User._get_collection().bulk_write(users, ordered=False)
+        if products:
+            Product._get_collection().bulk_write(products, ordered=False)
+        users.clear()
+        products.clear()
+
+    for son in User._get_collection().find(query, {'address': 1, 'role': 1}):
+        found = places.locate(son['address'])
+        if found is None:
+            unmatched += 1
+            continue
+        location = point(*found)
+        users.append(UpdateOne({'_id': son['_id']}, {'$set': {'location': location}}))
+        if son.get('role') == 'farmer':
+            products.append(UpdateMany({'farmer_id': son['_id']}, {'$set': {'location': location}}))
+        located += 1
+        if len(users) >= batch_size:
+            flush()
+    flush()
+    return located, unmatched
@@ -0,0 +1,23 @@
+import sys
+from mongoengine import connect
+from geo import Gazetteer, backfill
+from config import Config
+
+def geocode_users(path=None, overwrite=False):
+    """Fill in user and product locations from the stored user addresses.
+
+    New and edited addresses are geocoded on save; run this once after
+    deploying the location fields (backfill), or with ``--overwrite`` after
+    extending the gazetteer file. Products of each located farmer get the
+    farmer's location. Facet counts cached by running workers catch up within
+    FACET_CACHE_TTL.
+    """
+    connect(host=Config.MONGODB_URI)
+
+    places = Gazetteer.load(path or Config.GAZETTEER_PATH)
+    located, unmatched = backfill(places, overwrite=overwrite)
+    print(f"Located {located} users from {len(places)} gazetteer entries; {unmatched} addresses not matched")
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if arg != '--overwrite']
+    geocode_users(args[0] if args else None, overwrite='--overwrite' in sys.argv[1:])
@@ -0,0 +1,12 @@
+# Gunicorn configuration for AgriConnect
+# Usage: PROMETHEUS_MULTIPROC_DIR=/tmp/agriconnect-metrics gunicorn app:app
+import os
+
+from metrics import child_exit  # noqa: F401  (gunicorn server hook)
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# The app can be preloaded safely: db.py creates the MongoClient lazily in each
+# worker after fork and discards any client inherited from the master.
+preload_app = True
@@ -0,0 +1,73 @@
+"""Background building of the per-process in-memory catalog indexes.
+
+The type-ahead (suggest.py) and fuzzy search (search.py) indexes live in each
+worker's memory. An ``IndexLoader`` builds its index in a daemon thread when
+the worker first needs it (the first search or suggestion request), so
+startup and the request that triggers it never wait for a catalog scan, and
+pages that never search (or a serverless instance that only serves them)
+never pay for one. Later uses rebuild it once it is ``interval`` seconds
+old, to pick up writes made by other processes. Writes in this process reach the indexes
+directly through the Product/Order save hooks (see models.py).
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+import db
+
+# Product fields the in-memory indexes are built from
+IndexedProduct = namedtuple('IndexedProduct', ['name', 'category', 'description'])
+
+_loaders = []
+
+
+class IndexLoader:
+    """(Re)build an index in the background when it is missing or stale"""
+
+    def __init__(self, name, build, interval):
+        self.name = name
+        self.build = build
+        self.interval = interval
+        self.loaded_at = None
+        self._loading = False
+        self._lock = threading.Lock()
+        _loaders.append(self)
+
+    def _run(self):
+        try:
+            self.build()
+            self.loaded_at = time.monotonic()
+        finally:
+            self._loading = False
+
+    def ensure(self):
+        """Start a background build if none has finished within ``interval``"""
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.interval:
+            return
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+
+    def is_ready(self):
+        return self.loaded_at is not None
+
+
+def _reset_after_fork():
+    """Build threads do not survive fork; the copied indexes stay usable"""
+    for loader in _loaders:
+        loader._loading = False
+        loader._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def available_products(fields):
+    """Stream raw available products with ``fields`` for an index build"""
+    # Imported here because models imports the index modules
+    from models import Product
+    return db.catalog_collection(Product).find({'is_available': True}, {field: 1 for field in fields})
@@ -2,6 +2,10 @@
 
 // Global variables
 let cartCount = 0;
+let bootstrapRequest = null;
+
+// Calls to loadBootstrap() within this long of each other share one request
+const BOOTSTRAP_REUSE_MS = 2000;
 
 // Document ready
 document.addEventListener('DOMContentLoaded', function() {
@@ -10,7 +14,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
 // Initialize application
 function initializeApp() {
-    updateCartBadge();
+    loadBootstrap();
     setupEventListeners();
     loadAnimations();
 }
@@ -31,6 +35,9 @@ function setupEventListeners() {
     
     // Search functionality
     setupSearchFunctionality();
+    
+    // Product page price chart
+    setupPriceChart();
 }
 
 // Cart functionality
@@ -264,6 +271,12 @@ function setupForms() {
         offerForm.addEventListener('submit', handleOfferSubmission);
     }
     
+    // Live username availability on the registration form
+    const usernameInput = document.querySelector('input[data-availability-url]');
+    if (usernameInput) {
+        usernameInput.addEventListener('input', debounce(checkUsernameAvailability, 400));
+    }
+    
     // Search form auto-submit on filter change
     const searchFilters = document.querySelectorAll('.search-filter');
     searchFilters.forEach(filter => {
@@ -275,6 +288,28 @@ function setupForms() {
     });
 }
 
+// Check whether the typed username is still free
+function checkUsernameAvailability() {
+    const input = document.querySelector('input[data-availability-url]');
+    const feedback = document.getElementById('username-availability');
+    const username = input.value.trim();
+    if (!feedback) return;
+    
+    if (username.length < 3) {
+        feedback.textContent = '';
+        return;
+    }
+    
+    fetch(`${input.dataset.availabilityUrl}?username=${encodeURIComponent(username)}`)
+        .then(response => response.json())
+        .then(data => {
+            if (input.value.trim() !== username) return;
+            feedback.textContent = data.available ? 'Username is available' : 'Username already exists';
+            feedback.className = `form-text ${data.available ? 'text-success' : 'text-danger'}`;
+        })
+        .catch(error => console.error('Error checking username:', error));
+}
+
 // Handle offer submission
 function handleOfferSubmission(e) {
     e.preventDefault();
@@ -324,13 +359,139 @@ function handleOfferSubmission(e) {
 
 // Setup search functionality
 function setupSearchFunctionality() {
-    const searchInput = document.querySelector('input[name="search_query"]');
+    const searchInput = document.querySelector('input[name="search_query"][data-suggest-url]');
     if (searchInput) {
-        // Add search suggestions functionality here if needed
         searchInput.addEventListener('input', debounce(function() {
-            // Auto-search functionality can be added here
-        }, 300));
+            loadSearchSuggestions(searchInput);
+        }, 150));
+    }
+    
+    setupDistanceFilter();
+}
+
+// Ask the browser for coordinates when filtering by distance without a saved address
+function setupDistanceFilter() {
+    const radiusSelect = document.querySelector('select[name="radius"]');
+    if (!radiusSelect || !navigator.geolocation) return;
+    
+    const form = radiusSelect.form;
+    form.addEventListener('submit', function(e) {
+        if (!radiusSelect.value || radiusSelect.dataset.hasLocation === 'true' || form.elements.lat.value) {
+            return;
+        }
+        e.preventDefault();
+        navigator.geolocation.getCurrentPosition(function(position) {
+            form.elements.lat.value = position.coords.latitude.toFixed(3);
+            form.elements.lon.value = position.coords.longitude.toFixed(3);
+            form.submit();
+        }, function() {
+            form.submit();
+        }, { timeout: 10000, maximumAge: 600000 });
+    });
+}
+
+// Fill the search box's datalist with type-ahead suggestions
+function loadSearchSuggestions(input) {
+    const list = document.getElementById(input.getAttribute('list'));
+    const query = input.value.trim();
+    if (!list) return;
+    
+    if (!query) {
+        list.innerHTML = '';
+        return;
     }
+    
+    fetch(`${input.dataset.suggestUrl}?q=${encodeURIComponent(query)}`)
+        .then(response => response.json())
+        .then(data => {
+            if (input.value.trim() !== query) return;
+            list.innerHTML = '';
+            data.suggestions.forEach(suggestion => {
+                const option = document.createElement('option');
+                option.value = suggestion.text;
+                if (suggestion.kind === 'category') {
+                    option.label = 'Category';
+                }
+                list.appendChild(option);
+            });
+        })
+        .catch(error => console.error('Error loading suggestions:', error));
+}
+
+// Price history chart on the product page
+function setupPriceChart() {
+    const chart = document.getElementById('price-chart');
+    if (!chart) return;
+    
+    const buttons = document.querySelectorAll('[data-price-period]');
+    buttons.forEach(button => {
+        button.addEventListener('click', function() {
+            buttons.forEach(other => other.classList.toggle('active', other === this));
+            loadPriceHistory(chart, this.dataset.pricePeriod);
+        });
+    });
+    loadPriceHistory(chart, 'day');
+}
+
+// Load one period's price summaries and draw them
+function loadPriceHistory(chart, period) {
+    chart.dataset.period = period;
+    fetch(`${chart.dataset.url}?period=${period}`)
+        .then(response => response.json())
+        .then(data => {
+            if (chart.dataset.period !== period) return;
+            renderPriceChart(chart, data);
+        })
+        .catch(error => console.error('Error loading price history:', error));
+}
+
+// Draw the closing prices as a step line, with each period's low-high range
+function renderPriceChart(chart, data) {
+    const columns = data.columns || [];
+    const rows = (data.points || []).map(point => {
+        const row = {};
+        columns.forEach((name, i) => { row[name] = point[i]; });
+        row.time = new Date(row.start).getTime();
+        return row;
+    });
+    if (rows.length === 0) {
+        chart.innerHTML = '<p class="text-muted small mb-0">No price changes recorded yet.</p>';
+        return;
+    }
+    
+    const width = 600, height = 200, pad = 10;
+    const now = Date.now();
+    const first = rows[0].time;
+    const span = Math.max(now - first, 1);
+    const low = Math.min(...rows.map(row => row.low));
+    const high = Math.max(...rows.map(row => row.high));
+    const range = (high - low) || 1;
+    const x = time => pad + (time - first) / span * (width - 2 * pad);
+    const y = price => height - pad - (price - low) / range * (height - 2 * pad);
+    
+    let path = `M${x(rows[0].time)},${y(rows[0].open)}`;
+    rows.forEach((row, i) => {
+        path += ` V${y(row.close)}`;
+        path += ` H${x(i + 1 < rows.length ? rows[i + 1].time : now)}`;
+    });
+    const ranges = rows.filter(row => row.high > row.low).map(row =>
+        `<line class="price-range" x1="${x(row.time)}" x2="${x(row.time)}" y1="${y(row.low)}" y2="${y(row.high)}"></line>`
+    ).join('');
+    const dots = rows.map(row =>
+        `<circle class="price-point" cx="${x(row.time)}" cy="${y(row.close)}" r="3">` +
+        `<title>${formatDate(row.start)}: ${formatPrice(row.close)} / ${chart.dataset.unit}` +
+        ` (${row.quantity} ${chart.dataset.unit} in stock)</title></circle>`
+    ).join('');
+    
+    chart.innerHTML = `
+        <svg viewBox="0 0 ${width} ${height}" role="img" aria-label="Price history">
+            ${ranges}<path class="price-line" d="${path}"></path>${dots}
+        </svg>
+        <div class="d-flex justify-content-between small text-muted">
+            <span>${formatDate(rows[0].start)}</span>
+            <span>Low ${formatPrice(low)} &middot; High ${formatPrice(high)}</span>
+            <span>Today</span>
+        </div>`;
 }
 
 // Update cart badge
@@ -342,17 +503,55 @@ function updateCartBadge(count = null) {
         cartCount = count;
     } else {
         // Fetch current cart count
-        fetch('/api/cart_count')
+        loadBootstrap();
+        return;
+    }
+    
+    updateBadgeDisplay();
+}
+
+// Load the page chrome's state (counts, CSRF token) in one request
+function loadBootstrap() {
+    if (!bootstrapRequest) {
+        bootstrapRequest = fetch('/api/bootstrap', { credentials: 'same-origin' })
             .then(response => response.json())
             .then(data => {
-                cartCount = data.count;
-                updateBadgeDisplay();
+                applyBootstrap(data);
+                return data;
             })
-            .catch(error => console.error('Error fetching cart count:', error));
-        return;
+            .catch(error => console.error('Error loading page state:', error))
+            .finally(() => {
+                setTimeout(() => { bootstrapRequest = null; }, BOOTSTRAP_REUSE_MS);
+            });
+    }
+    return bootstrapRequest;
+}
+
+// Apply the /api/bootstrap response to the page
+function applyBootstrap(data) {
+    const csrfMeta = document.querySelector('meta[name=csrf-token]');
+    if (csrfMeta && data.csrf_token) {
+        csrfMeta.setAttribute('content', data.csrf_token);
     }
+    if (!data.authenticated) return;
     
+    cartCount = data.cart_count;
     updateBadgeDisplay();
+    setCountBadge('offers-badge', data.pending_offers);
+    setCountBadge('orders-badge', data.order_updates);
+}
+
+// Show a count badge, or hide it at zero
+function setCountBadge(id, count) {
+    const badge = document.getElementById(id);
+    if (!badge) return;
+    
+    if (count > 0) {
+        badge.textContent = count;
+        badge.style.display = 'block';
+    } else {
+        badge.style.display = 'none';
+    }
 }
 
 // Update badge display
@@ -0,0 +1,205 @@
+"""Prometheus instrumentation for AgriConnect.
+
+Collectors are created at import time so that the MongoDB command listener is
+registered before any MongoClient exists. When ``PROMETHEUS_MULTIPROC_DIR`` is
+set (gunicorn with several workers), prometheus_client writes every sample to
+per-process files and ``/metrics`` aggregates them, so numbers are correct no
+matter which worker answers the scrape.
+"""
+import os
+import threading
+import time
+
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from pymongo import monitoring
+
+# Request metrics
+REQUEST_LATENCY = Histogram(
+    'agriconnect_request_latency_seconds',
+    'Request latency by endpoint',
+    ['endpoint', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+REQUEST_COUNT = Counter(
+    'agriconnect_requests_total',
+    'Responses by endpoint and status code',
+    ['endpoint', 'method', 'status']
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'agriconnect_requests_in_flight',
+    'Requests currently being handled',
+    multiprocess_mode='livesum'
+)
+
+# MongoDB metrics
+MONGO_OPERATIONS = Counter(
+    'agriconnect_mongo_operations_total',
+    'MongoDB commands by collection, command and outcome',
+    ['collection', 'command', 'outcome']
+)
+MONGO_LATENCY = Histogram(
+    'agriconnect_mongo_operation_latency_seconds',
+    'MongoDB command latency by collection and command',
+    ['collection', 'command'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+MONGO_READS = Counter(
+    'agriconnect_mongo_reads_total',
+    'MongoDB read commands by collection and the role of the server that ran them',
+    ['collection', 'server']
+)
+CATALOG_READ_ROUTES = Counter(
+    'agriconnect_mongo_catalog_read_routes_total',
+    'Read preferences chosen for catalogue reads (primary_after_write: read-your-writes)',
+    ['read_preference']
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    'agriconnect_mongo_pool_connections',
+    'MongoDB pool connections by state (open, checked_out)',
+    ['state'],
+    multiprocess_mode='livesum'
+)
+MONGO_POOL_EVENTS = Counter(
+    'agriconnect_mongo_pool_events_total',
+    'MongoDB pool events (created, closed, checkout_failures, pools_cleared)',
+    ['event']
+)
+
+# Cache metrics
+CACHE_REQUESTS = Counter(
+    'agriconnect_cache_requests_total',
+    'Cache lookups by cache name and result',
+    ['cache', 'result']
+)
+
+# Cart cleanup metrics (sweep_carts.py; run it with the app's
+# PROMETHEUS_MULTIPROC_DIR for /metrics to include them)
+CART_ITEMS_PURGED = Counter(
+    'agriconnect_cart_items_purged_total',
+    'Cart items removed by the sweeper, by reason',
+    ['reason']
+)
+
+# Password hashing metrics
+PASSWORD_HASH_QUEUE = Gauge(
+    'agriconnect_password_hash_in_progress',
+    'Password hashes running or waiting in the hashing pool',
+    multiprocess_mode='livesum'
+)
+PASSWORD_HASH_REJECTED = Counter(
+    'agriconnect_password_hash_rejected_total',
+    'Password hash requests rejected because the pool was saturated'
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    'agriconnect_password_hash_seconds',
+    'Time to hash or verify a password, including queueing',
+    ['operation'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+# Upload metrics
+UPLOAD_SIZE = Histogram(
+    'agriconnect_upload_size_bytes',
+    'Size of uploaded product images',
+    buckets=(16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024)
+)
+
+# Commands that are not worth tracking (driver handshakes and heartbeats)
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'saslStart', 'saslContinue',
+                    'buildInfo', 'endSessions', 'getMore'}
+
+
+def record_cache(cache_name, hit):
+    """Record a cache lookup result for the named cache"""
+    CACHE_REQUESTS.labels(cache=cache_name, result='hit' if hit else 'miss').inc()
+
+
+def record_upload(size):
+    """Record the size in bytes of an uploaded file"""
+    UPLOAD_SIZE.observe(size)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Track MongoDB command counts and latencies by collection"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _key(self, event):
+        return (event.connection_id, event.request_id, event.operation_id)
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = 'none'
+        with self._lock:
+            self._pending[self._key(event)] = collection
+
+    def _finish(self, event, outcome):
+        with self._lock:
+            collection = self._pending.pop(self._key(event), None)
+        if collection is None:
+            return
+        MONGO_OPERATIONS.labels(collection=collection, command=event.command_name, outcome=outcome).inc()
+        MONGO_LATENCY.labels(collection=collection, command=event.command_name).observe(
+            event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._finish(event, 'success')
+
+    def failed(self, event):
+        self._finish(event, 'failure')
+
+
+monitoring.register(MongoCommandListener())
+
+
+def _endpoint_label():
+    return request.url_rule.endpoint if request.url_rule else 'unmatched'
+
+
+def init_app(app):
+    """Attach request instrumentation and the /metrics endpoint to the app"""
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_request(response):
+        start = g.get('metrics_start')
+        if start is not None:
+            endpoint = _endpoint_label()
+            REQUEST_LATENCY.labels(endpoint=endpoint, method=request.method).observe(
+                time.perf_counter() - start)
+            REQUEST_COUNT.labels(endpoint=endpoint, method=request.method,
+                                 status=response.status_code).inc()
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        if g.pop('metrics_start', None) is not None:
+            REQUESTS_IN_FLIGHT.dec()
+
+    @app.route('/metrics')
+    def metrics():
+        """Expose metrics in Prometheus text format"""
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            data = generate_latest(registry)
+        else:
+            data = generate_latest(REGISTRY)
+        return Response(data, mimetype=CONTENT_TYPE_LATEST)
+
+
+def child_exit(server, worker):
+    """Gunicorn hook: drop the live gauges of a worker that has exited"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,14 +1,48 @@
 from flask_login import UserMixin
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-from mongoengine import Document, fields, connect
+from datetime import datetime, timedelta
+from mongoengine import Document, EmbeddedDocument, fields, connect
 from bson import ObjectId
+from bson.decimal128 import Decimal128
+from pymongo import UpdateOne
 from decimal import Decimal
+from cache import documents, pages, product_facets, user_snapshots
+from config import Config
+import bootstrap
+import db
+import geo
+import passwords
+import render_cache
+import search
+import suggest
+from indexing import IndexedProduct
 
-class User(UserMixin, Document):
+# Product fields that the catalog filters and facet counts depend on (see facets.py)
+FACET_FIELDS = {'name', 'description', 'category', 'price', 'is_available', 'location'}
+# Product fields the in-memory suggestion and search indexes use (see indexing.py)
+INDEXED_FIELDS = {'name', 'category', 'description', 'is_available'}
+# Viewing the cart pushes back its expiry at most this often
+CART_TOUCH_INTERVAL = timedelta(days=1)
+# Downsampled price series kept for each product (see price_history.py)
+PRICE_PERIODS = ('day', 'week')
+
+class DurableWrites:
+    """Save and delete with the write concern of the document's durability
+    class (see db.WRITE_CONCERNS) unless the caller passes its own"""
+    durability = db.STANDARD
+    
+    def save(self, *args, **kwargs):
+        if kwargs.get('write_concern') is None:
+            kwargs['write_concern'] = db.write_concern(self.durability)
+        return super(DurableWrites, self).save(*args, **kwargs)
+    
+    def delete(self, signal_kwargs=None, **write_concern):
+        return super(DurableWrites, self).delete(signal_kwargs, **(write_concern or db.write_concern(self.durability)))
+
+class User(UserMixin, DurableWrites, Document):
     """User document for MongoDB"""
     meta = {
         'collection': 'users',
+        'auto_create_index': False,  # created on startup (db.require_indexes)
         'indexes': [
             {'fields': ['username'], 'unique': True},
             {'fields': ['email'], 'unique': True}
@@ -22,35 +56,72 @@ class User(UserMixin, Document):
     phone = fields.StringField(max_length=20)
     role = fields.StringField(max_length=20, choices=['farmer', 'consumer'], required=True)
     address = fields.StringField()
+    location = fields.PointField(auto_index=False)  # geocoded from address (see geo.py)
     created_at = fields.DateTimeField(default=datetime.utcnow)
     is_active = fields.BooleanField(default=True)
     
     def set_password(self, password):
-        """Set password hash"""
-        self.password_hash = generate_password_hash(password)
+        """Set password hash (raises passwords.HashingBusy when saturated)"""
+        self.password_hash = passwords.hash_password(password)
     
     def check_password(self, password):
-        """Check password against hash"""
-        return check_password_hash(self.password_hash, password)
+        """Check password against hash (raises passwords.HashingBusy when saturated)"""
+        return passwords.verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """True if the stored hash uses outdated hashing parameters"""
+        return passwords.needs_rehash(self.password_hash)
     
     def get_id(self):
         """Return the user ID as string for Flask-Login"""
         return str(self.id)
     
+    def save(self, *args, **kwargs):
+        """Override save to geocode the address, drop cached copies of this
+        user and move a farmer's products with their location"""
+        created = self.pk is None
+        changed = set(self._get_changed_fields())
+        if ('address' in changed and 'location' not in changed) or (created and self.location is None):
+            self.location = geo.locate(self.address)
+            changed.add('location')
+        result = super(User, self).save(*args, **kwargs)
+        user_snapshots.pop(str(self.id))
+        documents.invalidate(User, self.id)
+        if 'location' in changed and not created and self.role == 'farmer':
+            Product.relocate(self.id, self.location)
+        elif 'full_name' in changed and self.role == 'farmer':
+            # Shown on every card and detail page of the farmer's products
+            pages.clear()
+            CatalogVersion.bump('all')
+        return result
+    
+    def delete(self, *args, **kwargs):
+        """Override delete to drop cached copies of this user"""
+        result = super(User, self).delete(*args, **kwargs)
+        user_snapshots.pop(str(self.id))
+        documents.invalidate(User, self.id)
+        return result
+    
     def __repr__(self):
         return f'<User {self.username}>'
 
-class Product(Document):
+# Registration relies on the unique indexes to reject duplicates
+db.require_indexes(User)
+
+class Product(DurableWrites, Document):
     """Product document for MongoDB"""
     meta = {
         'collection': 'products',
+        'auto_create_index': False,  # created offline by create_indexes.py
         'indexes': [
             'farmer_id',
             'category',
             'is_available',
-            'created_at'
+            'created_at',
+            {'fields': ['(location', 'category', 'price']}  # "near me" filter (see geo.py)
         ]
     }
+    durability = db.FINANCIAL  # price and stock
     
     name = fields.StringField(max_length=200, required=True)
     description = fields.StringField()
@@ -63,28 +134,159 @@ class Product(Document):
     created_at = fields.DateTimeField(default=datetime.utcnow)
     updated_at = fields.DateTimeField(default=datetime.utcnow)
     is_available = fields.BooleanField(default=True)
+    location = fields.PointField(auto_index=False)  # copy of the farmer's location
     
     @property
     def farmer(self):
         """Get farmer user object"""
-        return User.objects(id=self.farmer_id).first()
+        return documents.get(User, self.farmer_id)
+    
+    @classmethod
+    def relocate(cls, farmer_id, location):
+        """Copy a farmer's new location onto all of their products"""
+        product_ids = [son['_id'] for son in cls._get_collection().find({'farmer_id': farmer_id}, {'_id': 1})]
+        # Only a copy of the farmer's location, so not as durable as stock
+        collection = db.durable_collection(cls, db.STANDARD)
+        if location:
+            collection.update_many({'farmer_id': farmer_id}, {'$set': {'location': location}})
+        else:
+            collection.update_many({'farmer_id': farmer_id}, {'$unset': {'location': ''}})
+        for product_id in product_ids:
+            documents.invalidate(Product, product_id)
+        product_facets.bump()
+        pages.clear()
+        CatalogVersion.bump('all')
+    
+    def index_entry(self):
+        """The IndexedProduct for suggestions and search, or None if not listed"""
+        if not self.is_available:
+            return None
+        return IndexedProduct(self.name, self.category, self.description)
+    
+    def _product_changed(self, before, after):
+        """Send a product change event to the in-memory indexes"""
+        suggest.index.product_changed(before, after)
+        search.index.product_changed(self.id, before, after)
+    
+    def _catalog_changed(self, *categories, facets=True):
+        """Purge cached pages showing this product and bump the validators
+        of the listings it appears in (see render_cache.py, conditional.py)"""
+        pages.purge(*render_cache.product_tags(self.id, *categories, facets=facets))
+        CatalogVersion.bump(*render_cache.listing_tags(*categories, facets=facets))
     
     def save(self, *args, **kwargs):
-        """Override save to update timestamp"""
+        """Override save to update timestamp, caches and in-memory indexes"""
         self.updated_at = datetime.utcnow()
-        return super(Product, self).save(*args, **kwargs)
+        created = self.pk is None
+        if created and self.location is None:
+            farmer = self.farmer
+            self.location = farmer.location if farmer else None
+        changed = set(self._get_changed_fields())
+        # Stock-only updates do not change what the catalog facets count
+        facets_changed = created or bool(FACET_FIELDS & changed)
+        index_changed = created or bool(INDEXED_FIELDS & changed)
+        before = None
+        before_category = None
+        if index_changed and not created:
+            # Edits to these fields are rare; read the stored values so the
+            # indexes can drop what they had for this product
+            stored = Product.objects(id=self.id).only(*INDEXED_FIELDS).first()
+            before = stored.index_entry() if stored else None
+            before_category = stored.category if stored else None
+        result = super(Product, self).save(*args, **kwargs)
+        if created or 'price' in changed:
+            PricePoint.record(self, self.updated_at)
+        documents.invalidate(Product, self.id)
+        if facets_changed:
+            product_facets.bump()
+        self._catalog_changed(before_category, self.category, facets=facets_changed)
+        if index_changed:
+            self._product_changed(before, self.index_entry())
+        return result
+    
+    def delete(self, *args, **kwargs):
+        """Override delete to update caches and in-memory indexes"""
+        result = super(Product, self).delete(*args, **kwargs)
+        # Deletes on a time-series metaField need MongoDB 5.1+
+        PricePoint.objects(product_id=self.id).delete()
+        PriceTrend.objects(product_id=self.id).delete()
+        documents.invalidate(Product, self.id)
+        product_facets.bump()
+        self._catalog_changed(self.category)
+        self._product_changed(self.index_entry(), None)
+        return result
     
     def __repr__(self):
         return f'<Product {self.name}>'
 
-class CartItem(Document):
+class ProductSnapshot(EmbeddedDocument):
+    """The product and the people involved as they were when a cart item,
+    offer or order was created.
+
+    Written once and never updated, so pages listing these documents render
+    without looking up products or users, and history still reads correctly
+    after a product is edited or deleted.
+    """
+    name = fields.StringField(max_length=200)
+    unit = fields.StringField(max_length=20)
+    category = fields.StringField(max_length=100)
+    price = fields.DecimalField(min_value=0, precision=2)  # listed price per unit at the time
+    image_path = fields.StringField(max_length=255)
+    farmer_name = fields.StringField(max_length=200)
+    consumer_name = fields.StringField(max_length=200)
+    
+    @classmethod
+    def build(cls, product, farmer, consumer):
+        """Snapshot from loaded documents; any of them may be None"""
+        snapshot = cls(
+            farmer_name=farmer.full_name if farmer else None,
+            consumer_name=consumer.full_name if consumer else None
+        )
+        if product:
+            snapshot.name = product.name
+            snapshot.unit = product.unit
+            snapshot.category = product.category
+            snapshot.price = product.price
+            snapshot.image_path = product.image_path
+        return snapshot
+    
+    @classmethod
+    def capture(cls, product_id, consumer_id, farmer_id=None):
+        """Snapshot the current product and user names through the document cache"""
+        product = documents.get(Product, product_id)
+        if farmer_id is None and product:
+            farmer_id = product.farmer_id
+        users = documents.get_many(User, [user_id for user_id in (farmer_id, consumer_id) if user_id])
+        return cls.build(product, users.get(farmer_id), users.get(consumer_id))
+    
+    def copy(self):
+        return ProductSnapshot(**{name: self[name] for name in self._fields})
+
+class SnapshotDisplay:
+    """``display``, what pages show of a document's product and people: its
+    snapshot, or for documents saved before snapshots existed (until
+    backfill_snapshots.py has run) one taken from the live documents"""
+    
+    @property
+    def display(self):
+        if self.snapshot is not None:
+            return self.snapshot
+        if getattr(self, '_live_snapshot', None) is None:
+            self._live_snapshot = ProductSnapshot.capture(self.product_id, self.consumer_id,
+                                                          getattr(self, 'farmer_id', None))
+        return self._live_snapshot
+
+class CartItem(SnapshotDisplay, DurableWrites, Document):
     """Cart item document for MongoDB"""
     meta = {
         'collection': 'cart_items',
+        'auto_create_index': False,  # created offline by create_indexes.py
         'indexes': [
             'consumer_id',
             'product_id',
-            ('consumer_id', 'product_id')
+            ('consumer_id', 'product_id'),
+            # Abandoned items expire (see cart_cleanup.py for changing the TTL)
+            {'fields': ['touched_at'], 'expireAfterSeconds': Config.CART_ITEM_TTL_DAYS * 24 * 3600}
         ]
     }
     
@@ -93,16 +295,18 @@ class CartItem(Document):
     quantity = fields.IntField(min_value=1, required=True)
     selected = fields.BooleanField(default=False)
     added_at = fields.DateTimeField(default=datetime.utcnow)
+    touched_at = fields.DateTimeField(default=datetime.utcnow)  # expiry clock
+    snapshot = fields.EmbeddedDocumentField(ProductSnapshot)
     
     @property
     def consumer(self):
         """Get consumer user object"""
-        return User.objects(id=self.consumer_id).first()
+        return documents.get(User, self.consumer_id)
     
     @property
     def product(self):
         """Get product object"""
-        return Product.objects(id=self.product_id).first()
+        return documents.get(Product, self.product_id)
     
     @property
     def total_price(self):
@@ -112,6 +316,31 @@ class CartItem(Document):
             return float(product.price) * self.quantity
         return 0
     
+    @classmethod
+    def touch(cls, consumer_id):
+        """Push back the expiry of a consumer's cart items, unless they were
+        touched within ``CART_TOUCH_INTERVAL``"""
+        now = datetime.utcnow()
+        db.durable_collection(cls, db.EPHEMERAL).update_many(
+            {'consumer_id': consumer_id, 'touched_at': {'$lt': now - CART_TOUCH_INTERVAL}},
+            {'$set': {'touched_at': now}})
+    
+    def save(self, *args, **kwargs):
+        """Override save to record the product snapshot when the item is added
+        and restart its expiry"""
+        if self.pk is None and self.snapshot is None:
+            self.snapshot = ProductSnapshot.capture(self.product_id, self.consumer_id)
+        self.touched_at = datetime.utcnow()
+        result = super(CartItem, self).save(*args, **kwargs)
+        bootstrap.forget(self.consumer_id)
+        return result
+    
+    def delete(self, *args, **kwargs):
+        """Override delete to drop the consumer's cached cart count"""
+        result = super(CartItem, self).delete(*args, **kwargs)
+        bootstrap.forget(self.consumer_id)
+        return result
+    
     def __repr__(self):
         consumer = self.consumer
         product = self.product
@@ -119,10 +348,11 @@ class CartItem(Document):
         product_name = product.name if product else "Unknown"
         return f'<CartItem {consumer_name} - {product_name}>'
 
-class Offer(Document):
+class Offer(SnapshotDisplay, DurableWrites, Document):
     """Offer document for MongoDB"""
     meta = {
         'collection': 'offers',
+        'auto_create_index': False,  # created offline by create_indexes.py
         'indexes': [
             'consumer_id',
             'farmer_id',
@@ -131,6 +361,9 @@ class Offer(Document):
             'created_at'
         ]
     }
+    # Resolved offers move here once old (see archive.py)
+    archive_collection = 'offers_archive'
+    archived_statuses = ('accepted', 'rejected')
     
     consumer_id = fields.ObjectIdField(required=True)
     farmer_id = fields.ObjectIdField(required=True)
@@ -141,32 +374,52 @@ class Offer(Document):
     status = fields.StringField(max_length=20, choices=['pending', 'accepted', 'rejected'], default='pending')
     created_at = fields.DateTimeField(default=datetime.utcnow)
     responded_at = fields.DateTimeField()
+    snapshot = fields.EmbeddedDocumentField(ProductSnapshot)
     
     @property
     def consumer(self):
         """Get consumer user object"""
-        return User.objects(id=self.consumer_id).first()
+        return documents.get(User, self.consumer_id)
     
     @property
     def farmer(self):
         """Get farmer user object"""
-        return User.objects(id=self.farmer_id).first()
+        return documents.get(User, self.farmer_id)
     
     @property
     def product(self):
         """Get product object"""
-        return Product.objects(id=self.product_id).first()
+        return documents.get(Product, self.product_id)
     
     @property
     def total_amount(self):
         """Calculate total amount"""
         return float(self.offered_price) * self.quantity
     
+    def save(self, *args, **kwargs):
+        """Override save to record the product snapshot and keep the farmer
+        analytics rollups current"""
+        created = self.pk is None
+        if created and self.snapshot is None:
+            self.snapshot = ProductSnapshot.capture(self.product_id, self.consumer_id, self.farmer_id)
+        responded = not created and 'status' in self._get_changed_fields()
+        result = super(Offer, self).save(*args, **kwargs)
+        bootstrap.forget(self.consumer_id, self.farmer_id)
+        if created:
+            FarmerDailyRollup.increment(self.farmer_id, self.product_id, self.created_at,
+                                        offers_received=1)
+        elif responded and self.status in ('accepted', 'rejected'):
+            FarmerDailyRollup.increment(self.farmer_id, self.product_id,
+                                        self.responded_at or datetime.utcnow(),
+                                        **{f'offers_{self.status}': 1})
+        return result
+    
     def accept(self):
         """Accept offer and create order"""
         self.status = 'accepted'
         self.responded_at = datetime.utcnow()
-        self.save()
+        # Part of the sale, as durable as the order it creates
+        self.save(write_concern=db.write_concern(db.FINANCIAL))
         
         # Create an order when offer is accepted
         order = Order(
@@ -176,7 +429,9 @@ class Offer(Document):
             quantity=self.quantity,
             price_per_unit=self.offered_price,
             total_amount=Decimal(str(self.total_amount)),
-            offer_id=self.id
+            offer_id=self.id,
+            # The order shows what was negotiated, even if the product changed since
+            snapshot=self.snapshot.copy() if self.snapshot else None
         )
         order.save()
         return order
@@ -194,10 +449,11 @@ class Offer(Document):
         farmer_name = farmer.username if farmer else "Unknown"
         return f'<Offer {consumer_name} to {farmer_name}>'
 
-class Order(Document):
+class Order(SnapshotDisplay, DurableWrites, Document):
     """Order document for MongoDB"""
     meta = {
         'collection': 'orders',
+        'auto_create_index': False,  # created offline by create_indexes.py
         'indexes': [
             'consumer_id',
             'farmer_id',
@@ -206,6 +462,10 @@ class Order(Document):
             'created_at'
         ]
     }
+    durability = db.FINANCIAL
+    # Delivered and cancelled orders move here once old (see archive.py)
+    archive_collection = 'orders_archive'
+    archived_statuses = ('delivered', 'cancelled')
     
     consumer_id = fields.ObjectIdField(required=True)
     farmer_id = fields.ObjectIdField(required=True)
@@ -223,35 +483,205 @@ class Order(Document):
     updated_at = fields.DateTimeField(default=datetime.utcnow)
     delivery_address = fields.StringField()
     notes = fields.StringField()
+    snapshot = fields.EmbeddedDocumentField(ProductSnapshot)
     
     @property
     def consumer(self):
         """Get consumer user object"""
-        return User.objects(id=self.consumer_id).first()
+        return documents.get(User, self.consumer_id)
     
     @property
     def farmer(self):
         """Get farmer user object"""
-        return User.objects(id=self.farmer_id).first()
+        return documents.get(User, self.farmer_id)
     
     @property
     def product(self):
         """Get product object"""
-        return Product.objects(id=self.product_id).first()
+        return documents.get(Product, self.product_id)
     
     @property
     def offer(self):
         """Get offer object if exists"""
         if self.offer_id:
-            return Offer.objects(id=self.offer_id).first()
+            offer = Offer.objects(id=self.offer_id).first()
+            if offer is None:
+                # Resolved offers are archived before the orders they created
+                son = Offer._get_db()[Offer.archive_collection].find_one({'_id': self.offer_id})
+                offer = Offer._from_son(son) if son is not None else None
+            return offer
         return None
     
     def save(self, *args, **kwargs):
-        """Override save to update timestamp"""
+        """Override save to update timestamp, record the product snapshot and
+        keep the farmer analytics rollups current"""
         self.updated_at = datetime.utcnow()
-        return super(Order, self).save(*args, **kwargs)
+        created = self.pk is None
+        if created and self.snapshot is None:
+            self.snapshot = ProductSnapshot.capture(self.product_id, self.consumer_id, self.farmer_id)
+        cancelled = (not created and 'status' in self._get_changed_fields()
+                     and self.status == 'cancelled')
+        result = super(Order, self).save(*args, **kwargs)
+        bootstrap.forget(self.consumer_id, self.farmer_id)
+        if created and self.status != 'cancelled':
+            FarmerDailyRollup.increment(self.farmer_id, self.product_id, self.created_at,
+                                        order_count=1, quantity=self.quantity,
+                                        revenue=Decimal(str(self.total_amount)))
+            product = self.product
+            if product:
+                suggest.index.product_ordered(product.name, product.category)
+        elif cancelled:
+            # Cancelled orders no longer count as sales on the day they were placed
+            FarmerDailyRollup.increment(self.farmer_id, self.product_id, self.created_at,
+                                        order_count=-1, quantity=-self.quantity,
+                                        revenue=-Decimal(str(self.total_amount)))
+        return result
     
     def __repr__(self):
         consumer = self.consumer
         consumer_name = consumer.username if consumer else "Unknown"
         return f'<Order {self.id} - {consumer_name}>'
+
+class FarmerDailyRollup(DurableWrites, Document):
+    """Sales and offer totals for one farmer, product and UTC day (see analytics.py)"""
+    meta = {
+        'collection': 'farmer_daily_rollups',
+        'auto_create_index': False,  # created offline by create_indexes.py
+        'indexes': [
+            {'fields': ['farmer_id', 'day', 'product_id'], 'unique': True}
+        ]
+    }
+    
+    farmer_id = fields.ObjectIdField(required=True)
+    product_id = fields.ObjectIdField(required=True)
+    day = fields.DateTimeField(required=True)
+    order_count = fields.IntField(default=0)
+    quantity = fields.IntField(default=0)
+    revenue = fields.Decimal128Field(default=Decimal('0'))
+    offers_received = fields.IntField(default=0)
+    offers_accepted = fields.IntField(default=0)
+    offers_rejected = fields.IntField(default=0)
+    
+    @staticmethod
+    def day_of(moment):
+        """Truncate a UTC datetime to the start of its day"""
+        return datetime(moment.year, moment.month, moment.day)
+    
+    @classmethod
+    def increment(cls, farmer_id, product_id, moment, **counts):
+        """Atomically add ``counts`` to the rollup for the day of ``moment``"""
+        updates = {f'inc__{field}': value for field, value in counts.items()}
+        cls.objects(farmer_id=farmer_id, product_id=product_id,
+                    day=cls.day_of(moment)).update_one(upsert=True, write_concern=db.write_concern(cls.durability),
+                                                       **updates)
+    
+    def __repr__(self):
+        return f'<FarmerDailyRollup {self.farmer_id} {self.product_id} {self.day:%Y-%m-%d}>'
+
+class PricePoint(DurableWrites, Document):
+    """A product's price, and its stock at the time, whenever the price is set.
+
+    Stored in the ``price_history`` time-series collection (``product_id`` is
+    its metaField), which create_indexes.py creates. Pages never read these
+    points, only the ``PriceTrend`` summaries.
+    """
+    meta = {
+        'collection': 'price_history',
+        'auto_create_index': False  # a time-series collection (see price_history.py)
+    }
+    
+    product_id = fields.ObjectIdField(required=True)
+    recorded_at = fields.DateTimeField(required=True)
+    price = fields.Decimal128Field(required=True)
+    quantity = fields.IntField()
+    
+    @classmethod
+    def record(cls, product, moment=None):
+        """Store the product's current price and fold it into its trends"""
+        moment = moment or datetime.utcnow()
+        cls(product_id=product.id, recorded_at=moment, price=product.price,
+            quantity=product.quantity).save()
+        PriceTrend.add(product.id, moment, product.price, product.quantity)
+    
+    def __repr__(self):
+        return f'<PricePoint {self.product_id} {self.recorded_at:%Y-%m-%d %H:%M}>'
+
+class PriceTrend(DurableWrites, Document):
+    """Open, high, low and close price of one product over a UTC day or
+    week (starting Monday), kept current by ``PricePoint.record``"""
+    meta = {
+        'collection': 'price_trends',
+        'auto_create_index': False,  # created offline by create_indexes.py
+        'indexes': [
+            {'fields': ['product_id', 'period', '-start'], 'unique': True}
+        ]
+    }
+    
+    product_id = fields.ObjectIdField(required=True)
+    period = fields.StringField(choices=PRICE_PERIODS, required=True)
+    start = fields.DateTimeField(required=True)
+    open = fields.Decimal128Field()
+    high = fields.Decimal128Field()
+    low = fields.Decimal128Field()
+    close = fields.Decimal128Field()
+    quantity = fields.IntField()  # stock when the closing price was set
+    changes = fields.IntField(default=0)
+    
+    @staticmethod
+    def period_start(moment, period):
+        """Truncate a UTC datetime to the start of its day or week"""
+        day = datetime(moment.year, moment.month, moment.day)
+        if period == 'week':
+            return day - timedelta(days=day.weekday())
+        return day
+    
+    @classmethod
+    def add(cls, product_id, moment, price, quantity):
+        """Fold a price set at ``moment`` into the day and week it falls in"""
+        price = Decimal128(Decimal(price))
+        db.durable_collection(cls, cls.durability).bulk_write([
+            UpdateOne({'product_id': product_id, 'period': period, 'start': cls.period_start(moment, period)},
+                      {'$setOnInsert': {'open': price}, '$min': {'low': price}, '$max': {'high': price},
+                       '$set': {'close': price, 'quantity': quantity}, '$inc': {'changes': 1}},
+                      upsert=True)
+            for period in PRICE_PERIODS
+        ], ordered=False)
+    
+    def __repr__(self):
+        return f'<PriceTrend {self.product_id} {self.period} {self.start:%Y-%m-%d}>'
+
+class CatalogVersion(DurableWrites, Document):
+    """Change counter for a group of catalog pages, shared by all workers.
+
+    ``key`` is a render_cache tag (``listing``, ``category:<name>``,
+    ``facets``) or ``all`` for changes shown on every catalog page (farmer
+    names and locations). conditional.py builds validators from them.
+    ``archive:<collection>`` keys count archive batches (see archive.py).
+    """
+    meta = {
+        'collection': 'catalog_versions',
+        'auto_create_index': False  # looked up by _id only
+    }
+    
+    key = fields.StringField(primary_key=True)
+    version = fields.IntField(default=0)
+    updated_at = fields.DateTimeField()
+    
+    @classmethod
+    def bump(cls, *keys):
+        """Advance the counters for ``keys`` in one round trip"""
+        now = datetime.utcnow()
+        db.durable_collection(cls, cls.durability).bulk_write([
+            UpdateOne({'_id': key}, {'$inc': {'version': 1}, '$max': {'updated_at': now}}, upsert=True)
+            for key in keys
+        ], ordered=False)
+    
+    @classmethod
+    def current(cls, *keys):
+        """``{key: (version, updated_at)}``; keys never bumped are ``(0, None)``"""
+        found = {son['_id']: (son.get('version', 0), son.get('updated_at'))
+                 for son in db.catalog_collection(cls).find({'_id': {'$in': list(keys)}})}
+        return {key: found.get(key, (0, None)) for key in keys}
+    
+    def __repr__(self):
+        return f'<CatalogVersion {self.key} {self.version}>'
@@ -0,0 +1,84 @@
+"""Password hashing on a bounded worker pool.
+
+PBKDF2 and scrypt are CPU-bound and hashlib releases the GIL while computing
+them, so verification runs on a small thread pool sized to the CPU count. At
+most ``PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT`` hashes may be
+running or waiting at once; beyond that ``HashingBusy`` is raised immediately
+so a login burst gets a fast "try again" instead of stalling every request.
+A hash that times out keeps its slot until it finishes (or is cancelled
+before it starts), so timeouts never let more work pile up than the limit.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import metrics
+from config import Config
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated"""
+
+
+_executor = None
+_slots = None
+_init_lock = threading.Lock()
+
+
+def _pool():
+    global _executor, _slots
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                _slots = threading.BoundedSemaphore(Config.PASSWORD_HASH_WORKERS + Config.PASSWORD_HASH_QUEUE_LIMIT)
+                _executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS,
+                                               thread_name_prefix='password-hash')
+    return _executor, _slots
+
+
+def _run(operation, func, *args):
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        metrics.PASSWORD_HASH_REJECTED.inc()
+        raise HashingBusy()
+    metrics.PASSWORD_HASH_QUEUE.inc()
+    start = time.perf_counter()
+
+    def finished(_future):
+        metrics.PASSWORD_HASH_QUEUE.dec()
+        metrics.PASSWORD_HASH_LATENCY.labels(operation=operation).observe(time.perf_counter() - start)
+        slots.release()
+
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        finished(None)
+        raise
+    future.add_done_callback(finished)
+    try:
+        return future.result(timeout=Config.PASSWORD_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        # Frees the slot now only if the hash has not started; otherwise
+        # ``finished`` frees it when the hash completes
+        future.cancel()
+        metrics.PASSWORD_HASH_REJECTED.inc()
+        raise HashingBusy()
+
+
+def hash_password(password):
+    """Hash ``password`` with the configured method"""
+    return _run('hash', generate_password_hash, password, Config.PASSWORD_HASH_METHOD,
+                Config.PASSWORD_SALT_LENGTH)
+
+
+def verify_password(pwhash, password):
+    """Check ``password`` against ``pwhash``"""
+    return _run('verify', check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """True if ``pwhash`` was made with different hashing parameters"""
+    return pwhash.split('$', 1)[0] != Config.PASSWORD_HASH_METHOD
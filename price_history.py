@@ -0,0 +1,77 @@
+"""Product price history.
+
+Every time a product's price is set (on creation and on each edit that
+changes it) ``PricePoint.record`` stores the price and the stock at that
+moment in ``price_history``, a MongoDB time-series collection with the
+product id as its metaField. ``create_indexes.py`` creates it
+(``ensure_collection``); it must exist before the first write, or MongoDB
+creates a plain collection under that name.
+
+The same write folds the price into one ``PriceTrend`` document per UTC day
+and per week: open, high, low and close price, the stock at the close and
+the number of changes. The product page chart reads only these summaries
+through ``/api/price_history/<product_id>``, never the raw points, so a
+chart costs one indexed range read whatever the number of changes.
+
+``python backfill_price_history.py`` records the current price of products
+that have no history yet, e.g. after deploying this.
+"""
+import db
+from models import PRICE_PERIODS, PricePoint, PriceTrend, Product
+
+TIME_SERIES = {'timeField': 'recorded_at', 'metaField': 'product_id', 'granularity': 'hours'}
+# Most recent days and weeks with a price change returned for a chart
+SERIES_LENGTH = {'day': 90, 'week': 104}
+COLUMNS = ('start', 'open', 'high', 'low', 'close', 'quantity')
+# Browsers and shared caches may reuse a series this long (seconds)
+MAX_AGE = 300
+
+
+def ensure_collection():
+    """Create the ``price_history`` time-series collection; returns True when created"""
+    database = PricePoint._get_db()
+    name = PricePoint._get_collection_name()
+    if name in database.list_collection_names(filter={'name': name}):
+        return False
+    database.create_collection(name, timeseries=TIME_SERIES)
+    return True
+
+
+def trend_query(product_id, period):
+    """``(query, sort, limit)`` of the summaries charted for one period"""
+    return {'product_id': product_id, 'period': period}, [('start', -1)], SERIES_LENGTH[period]
+
+
+def _price(value):
+    return None if value is None else float(value)
+
+
+def serialize(period, trends):
+    """The endpoint's body: one ``COLUMNS`` row per period, oldest first.
+
+    ``trends`` are ``PriceTrend`` documents, newest first.
+    """
+    points = [[trend.start.strftime('%Y-%m-%d'), _price(trend.open), _price(trend.high),
+               _price(trend.low), _price(trend.close), trend.quantity]
+              for trend in reversed(list(trends))]
+    return {'period': period, 'columns': list(COLUMNS), 'points': points}
+
+
+def series(product_id, period):
+    query, sort, limit = trend_query(product_id, period)
+    trends = db.catalog_collection(PriceTrend).find(query, sort=sort, limit=limit)
+    return serialize(period, [PriceTrend._from_son(son) for son in trends])
+
+
+def backfill():
+    """Record the current price of every product without history, dated at
+    its last update. Returns the number of products recorded."""
+    recorded = set(PricePoint._get_collection().distinct('product_id'))
+    count = 0
+    for product in Product.objects.only('id', 'price', 'quantity', 'updated_at', 'created_at'):
+        if product.id in recorded:
+            continue
+        PricePoint.record(product, product.updated_at or product.created_at)
+        count += 1
+    return count
+
@@ -0,0 +1,22 @@
+import sys
+from bson import ObjectId
+from mongoengine import connect
+from analytics import rebuild
+from config import Config
+
+def rebuild_analytics(farmer_id=None):
+    """Recompute the farmer analytics rollups from order and offer history.
+
+    The rollups are normally kept current by Offer/Order saves. Run this once
+    after deploying the analytics collection (backfill) or to repair drift,
+    preferably while traffic is low. Pass a farmer id to rebuild only that
+    farmer's rollups.
+    """
+    connect(host=Config.MONGODB_URI)
+
+    written = rebuild(ObjectId(farmer_id) if farmer_id else None)
+    scope = f"farmer {farmer_id}" if farmer_id else "all farmers"
+    print(f"Rebuilt {written} daily rollups for {scope}")
+
+if __name__ == '__main__':
+    rebuild_analytics(sys.argv[1] if len(sys.argv) > 1 else None)
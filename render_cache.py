@@ -0,0 +1,151 @@
+"""Whole-page and fragment caching for the catalog pages.
+
+Anonymous visitors all see the same home page, product list and product
+detail for the same query string, so those pages are rendered once per
+worker and kept in ``cache.pages``, keyed by endpoint, view arguments and the
+sorted non-empty query arguments. Entries are tagged with surrogate keys and
+``Product.save``/``delete`` purge the tags they affect:
+
+``product:<id>``
+    the product's detail page
+``category:<name>`` / ``listing``
+    listings filtered to that category / not filtered by category (stock,
+    name and price shown on the cards)
+``facets``
+    every listing, for changes that move the facet counts
+
+Logged-in users (and anyone with a remember-me cookie) always get a fresh
+render, but the product cards inside it come from ``cache.fragments`` through
+the ``{% cache %}`` template tag, keyed by product id and ``updated_at``, so
+an edited product never matches its old entry.
+
+Nothing per-visitor is stored: a page is only cached when no flash message
+was pending or flashed while rendering it, and ``csrf_token()`` renders a
+per-process placeholder that is swapped for the visitor's own token on every
+response, cached or not.
+"""
+import secrets
+
+from flask import g, message_flashed, request, session
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from cache import fragments, pages
+
+# Endpoints whose anonymous responses are cached
+CACHED_ENDPOINTS = {'index', 'product_list', 'product_detail'}
+
+CSRF_PLACEHOLDER = 'csrf-' + secrets.token_hex(16)
+
+
+def listing_tags(*categories, facets=True):
+    """Tags of the listings a write to products in ``categories`` affects"""
+    tags = ['listing']
+    tags.extend(f'category:{category}' for category in set(categories) if category)
+    if facets:
+        tags.append('facets')
+    return tags
+
+
+def product_tags(product_id, *categories, facets=True):
+    """Tags to purge after a product write"""
+    return [f'product:{product_id}'] + listing_tags(*categories, facets=facets)
+
+
+def _page_tags():
+    if request.endpoint == 'product_detail':
+        return [f"product:{request.view_args['product_id']}"]
+    category = request.args.get('category', '').strip()
+    return ['facets', f'category:{category}' if category else 'listing']
+
+
+def _page_key():
+    args = sorted((name, value) for name, values in request.args.lists()
+                  for value in values if value)
+    return request.endpoint, tuple(sorted(request.view_args.items())), tuple(args)
+
+
+def _is_anonymous(app):
+    return ('_user_id' not in session and '_flashes' not in session
+            and not request.cookies.get(app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')))
+
+
+def _with_csrf_token(body):
+    # Imported here like forms: flask_wtf also loads WTForms (see app.py)
+    from flask_wtf.csrf import generate_csrf
+    return body.replace(CSRF_PLACEHOLDER.encode(), generate_csrf().encode())
+
+
+def flashed():
+    """True if a flash message was added while handling this request"""
+    return g.get('page_flashed', False)
+
+
+def csrf_token():
+    """The ``csrf_token()`` template global: a placeholder while rendering a
+    cacheable page, the visitor's token otherwise"""
+    if g.get('page_cache_key') is not None:
+        return CSRF_PLACEHOLDER
+    from flask_wtf.csrf import generate_csrf
+    return generate_csrf()
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache key, ... %}...{% endcache %}``: render the body once per key
+    and keep the markup in ``cache.fragments``"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cached', [nodes.Tuple(key, 'load')]),
+                               [], [], body).set_lineno(lineno)
+
+    def _cached(self, key, caller):
+        markup = fragments.get(key)
+        if markup is None:
+            markup = caller()
+            fragments.set(key, markup)
+        return markup
+
+
+def init_app(app):
+    """Serve and store anonymous catalog pages and register the fragment tag"""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+    @app.before_request
+    def serve_cached_page():
+        if (request.method != 'GET' or request.endpoint not in CACHED_ENDPOINTS
+                or not _is_anonymous(app)):
+            return None
+        key = _page_key()
+        body, stamp = pages.lookup(key)
+        if body is not None:
+            g.page_cache_hit = True
+            response = app.response_class(_with_csrf_token(body), mimetype='text/html')
+            response.headers['X-Render-Cache'] = 'hit'
+            return response
+        g.page_cache_key = key
+        g.page_cache_stamp = stamp
+        return None
+
+    @message_flashed.connect_via(app)
+    def skip_flashed_page(sender, message, category):
+        g.page_flashed = True
+
+    @app.after_request
+    def store_page(response):
+        key = g.pop('page_cache_key', None)
+        if key is None or g.get('page_cache_hit') or response.is_streamed:
+            return response
+        body = response.get_data()
+        if (response.status_code == 200 and response.mimetype == 'text/html'
+                and not flashed()):
+            pages.store(key, body, _page_tags(), g.page_cache_stamp)
+            response.headers['X-Render-Cache'] = 'miss'
+        response.set_data(_with_csrf_token(body))
+        return response
@@ -0,0 +1,269 @@
+"""Typo-tolerant product search over a character-trigram inverted index.
+
+Every available product is split into character trigrams (each word padded
+as "  word ", so word starts weigh more) for its name and category and, with
+half the weight, the start of its description. Each trigram maps to a sorted
+``array('I')`` of internal document numbers. A query matches a product when
+enough of the query's trigrams occur in it (``SEARCH_MIN_SIMILARITY``), so
+"tomatoe" still finds "Tomato". Only the rarest query trigrams are used to
+collect candidates (a product that misses all of them cannot reach the
+threshold) and counted in one pass; each candidate is then checked against
+the common posting lists with ``bisect`` until it can no longer qualify.
+
+Regional and transliterated names are handled by a synonym table: the query
+is also searched with every alias substituted ("tamatar" -> "tomato").
+
+The index is built in the background like the suggestion index (indexing.py)
+and kept current by product change events from models.py. Updated and
+deleted products leave a tombstone until the next periodic rebuild.
+"""
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from config import Config
+from indexing import IndexedProduct, IndexLoader, available_products
+
+DESCRIPTION_WEIGHT = 0.5
+MAX_VARIANTS = 8
+EMPTY = array('I')
+
+# Interchangeable names; every alias of a group is searched when one is typed
+SYNONYMS = [
+    ('tomato', 'tamatar'),
+    ('potato', 'aloo', 'alu'),
+    ('onion', 'pyaz', 'pyaaz', 'kanda'),
+    ('brinjal', 'eggplant', 'aubergine', 'baingan'),
+    ('okra', 'bhindi', 'ladyfinger', 'lady finger'),
+    ('cauliflower', 'gobi', 'phool gobi'),
+    ('cabbage', 'patta gobi', 'band gobi'),
+    ('spinach', 'palak'),
+    ('fenugreek', 'methi'),
+    ('coriander', 'dhania', 'dhaniya', 'cilantro'),
+    ('turmeric', 'haldi'),
+    ('chilli', 'chili', 'mirchi'),
+    ('garlic', 'lahsun', 'lehsun'),
+    ('ginger', 'adrak'),
+    ('peas', 'matar', 'mutter'),
+    ('carrot', 'gajar'),
+    ('radish', 'mooli', 'muli'),
+    ('cucumber', 'kheera', 'khira'),
+    ('bitter gourd', 'karela'),
+    ('bottle gourd', 'lauki', 'doodhi'),
+    ('mango', 'aam'),
+    ('banana', 'kela'),
+    ('guava', 'amrood', 'peru'),
+    ('chickpea', 'chana', 'garbanzo'),
+    ('pigeon pea', 'toor dal', 'arhar', 'tuvar'),
+    ('finger millet', 'ragi', 'nachni'),
+    ('pearl millet', 'bajra'),
+    ('sorghum', 'jowar'),
+    ('jaggery', 'gur'),
+    ('cottage cheese', 'paneer'),
+    ('clarified butter', 'ghee'),
+]
+
+_ALIASES = {}
+for _group in SYNONYMS:
+    for _alias in _group:
+        _ALIASES[_alias] = _group
+_ALIAS_PATTERN = re.compile(r'\b(%s)\b' % '|'.join(
+    re.escape(alias) for alias in sorted(_ALIASES, key=len, reverse=True)))
+
+
+def normalize(text):
+    """Lowercase, keep letters and digits, collapse whitespace"""
+    return ' '.join(re.sub(r'[^\w]+', ' ', (text or '').lower()).split())
+
+
+def trigrams(text):
+    """The set of padded word trigrams of normalized ``text``"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        for start in range(len(padded) - 2):
+            grams.add(padded[start:start + 3])
+    return grams
+
+
+def expand(query):
+    """``query`` plus its synonym substitutions (normalized, at most MAX_VARIANTS)"""
+    variants = [normalize(query)]
+    for text in variants:
+        for match in _ALIAS_PATTERN.finditer(text):
+            for alias in _ALIASES[match.group(1)]:
+                variant = text[:match.start()] + alias + text[match.end():]
+                if variant not in variants and len(variants) < MAX_VARIANTS:
+                    variants.append(variant)
+    return variants
+
+
+def _contains(postings, number):
+    index = bisect_left(postings, number)
+    return index < len(postings) and postings[index] == number
+
+
+class SearchIndex:
+    """Trigram index of products; all methods are thread-safe"""
+
+    def __init__(self, min_similarity=Config.SEARCH_MIN_SIMILARITY,
+                 description_chars=Config.SEARCH_DESCRIPTION_CHARS):
+        self.min_similarity = min_similarity
+        self.description_chars = description_chars
+        self._lock = threading.Lock()
+        self._pending = None              # changes seen while a rebuild is reading the catalog
+        self._ids = []                    # document number -> product id, None once removed
+        self._numbers = {}                # product id -> document number
+        self._title_sizes = array('H')    # document number -> trigrams in name + category
+        self._title = {}                  # trigram -> sorted document numbers
+        self._description = {}
+
+    def __len__(self):
+        return len(self._numbers)
+
+    def _add(self, product_id, product):
+        number = len(self._ids)
+        self._ids.append(product_id)
+        self._numbers[product_id] = number
+        title = trigrams(normalize(f'{product.name} {product.category or ""}'))
+        self._title_sizes.append(min(len(title), 0xFFFF))
+        for gram in title:
+            self._title.setdefault(gram, array('I')).append(number)
+        description = normalize((product.description or '')[:self.description_chars])
+        for gram in trigrams(description):
+            self._description.setdefault(gram, array('I')).append(number)
+
+    def _remove(self, product_id):
+        number = self._numbers.pop(product_id, None)
+        if number is not None:
+            self._ids[number] = None
+
+    def load(self, products):
+        """Replace the contents with ``products``: ``(product id, IndexedProduct)`` pairs.
+
+        Changes applied while ``products`` is being read are replayed on top,
+        so a product saved during a rebuild is not lost.
+        """
+        with self._lock:
+            self._pending = []
+        fresh = SearchIndex(self.min_similarity, self.description_chars)
+        for product_id, product in products:
+            fresh._add(product_id, product)
+        with self._lock:
+            for product_id, after in self._pending:
+                fresh._remove(product_id)
+                if after is not None:
+                    fresh._add(product_id, after)
+            self._pending = None
+            self._ids, self._numbers, self._title_sizes = fresh._ids, fresh._numbers, fresh._title_sizes
+            self._title, self._description = fresh._title, fresh._description
+
+    def product_changed(self, product_id, before, after):
+        """Apply a product create/update/delete; ``after`` is the IndexedProduct
+        of the available product, or None"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((product_id, after))
+            self._remove(product_id)
+            if after is not None:
+                self._add(product_id, after)
+
+    def _snapshot(self, variants):
+        """``(ids, title sizes, title postings, description postings)`` for the
+        trigrams of ``variants``, copied under the lock.
+
+        Changes append to posting lists and ``load`` swaps in new tables, so
+        the copies and table references stay consistent without the lock.
+        """
+        grams = set()
+        for text in variants:
+            grams |= trigrams(text)
+        with self._lock:
+            title = {gram: self._title[gram][:] for gram in grams if gram in self._title}
+            description = {gram: self._description[gram][:] for gram in grams if gram in self._description}
+            return self._ids, self._title_sizes, title, description
+
+    @staticmethod
+    def _matches(postings, grams, needed):
+        """Yield ``(number, hits)`` for documents holding at least ``needed`` of ``grams``"""
+        lists = sorted((postings.get(gram, EMPTY) for gram in grams), key=len)
+        # A document missing all of the rarest len - needed + 1 lists cannot qualify,
+        # so candidates are counted there and only checked against the common lists
+        split = len(lists) - needed + 1
+        counts = Counter()
+        for postings_list in lists[:split]:
+            counts.update(postings_list)
+        common = lists[split:]
+        for number, hits in counts.items():
+            remaining = len(common)
+            for postings_list in common:
+                if hits + remaining < needed:
+                    break
+                remaining -= 1
+                if _contains(postings_list, number):
+                    hits += 1
+            if hits >= needed:
+                yield number, hits
+
+    def search(self, query, limit=Config.SEARCH_MAX_RESULTS):
+        """Return ``[(product id, score)]`` for ``query``, best first.
+
+        Only copying the query's posting lists holds the lock; scoring runs
+        outside it, so a slow query never blocks saves or other searches.
+        """
+        variants = expand(query)
+        ids, title_sizes, title, description = self._snapshot(variants)
+        best = {}
+        for text in variants:
+            grams = trigrams(text)
+            if not grams:
+                continue
+            size = len(grams)
+            needed = max(1, math.ceil(self.min_similarity * size))
+            for number, hits in self._matches(title, grams, needed):
+                # Share of the query found, then closeness in length as tie-break
+                rank = (hits / size, hits / (size + title_sizes[number] - hits))
+                if rank > best.get(number, (0, 0)):
+                    best[number] = rank
+            needed = math.ceil(self.min_similarity / DESCRIPTION_WEIGHT * size)
+            if needed <= size:
+                for number, hits in self._matches(description, grams, needed):
+                    rank = (DESCRIPTION_WEIGHT * hits / size, 0)
+                    if rank > best.get(number, (0, 0)):
+                        best[number] = rank
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for number, (score, _) in ranked:
+            product_id = ids[number]
+            if product_id is not None:
+                results.append((product_id, score))
+                if len(results) >= limit:
+                    break
+        return results
+
+
+index = SearchIndex()
+
+
+def _catalog():
+    for son in available_products(['name', 'category', 'description']):
+        yield son['_id'], IndexedProduct(son.get('name'), son.get('category'), son.get('description'))
+
+
+loader = IndexLoader('search-index', lambda: index.load(_catalog()), Config.SEARCH_REFRESH_INTERVAL)
+
+
+def ranked_ids(query):
+    """Product ids matching ``query`` by relevance, or None until the index is built"""
+    ensure_index()
+    if not loader.is_ready():
+        return None
+    return [product_id for product_id, _ in index.search(query)]
+
+
+def ensure_index():
+    """Start a background (re)build if the index is missing or stale"""
+    loader.ensure()
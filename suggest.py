@@ -0,0 +1,263 @@
+"""In-memory type-ahead index for product names and categories.
+
+Suggestions are the distinct names and categories of available products,
+weighted by how many products carry them plus how many orders those products
+received. Keys are kept in a sorted array (one key per word start, so "tom"
+finds "Organic Tomatoes") and searched with ``bisect``. The best completions
+of every prefix up to ``PREFIX_CACHE_LENGTH`` characters are precomputed, so
+short prefixes, which match the most keys, are answered from a dict; longer
+prefixes match fewer keys, are ranked on first use and then kept in a bounded
+memo that incremental updates keep current.
+
+Each worker process builds its own index in the background (indexing.py) and
+then applies Product/Order changes made in that process (see models.py).
+Changes made by other processes, and counts that drift through renames, are
+picked up by a full rebuild every ``SUGGEST_REFRESH_INTERVAL`` seconds.
+Memory is bounded by ``SUGGEST_MAX_TERMS`` distinct terms however
+large the catalog is.
+"""
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+import db
+from config import Config
+from indexing import IndexLoader, available_products
+
+PREFIX_CACHE_LENGTH = 3
+# Upper bound on keys ranked for one long prefix
+SCAN_LIMIT = 2000
+
+
+def normalize(text):
+    """Lowercase ``text`` and collapse whitespace"""
+    return ' '.join((text or '').lower().split())
+
+
+class Term:
+    """A suggestion and its popularity counters"""
+
+    __slots__ = ('text', 'kind', 'products', 'orders')
+
+    def __init__(self, text, kind):
+        self.text = text
+        self.kind = kind
+        self.products = 0
+        self.orders = 0
+
+    @property
+    def weight(self):
+        return self.products + self.orders
+
+
+class SuggestIndex:
+    """Prefix index over weighted terms; all methods are thread-safe"""
+
+    def __init__(self, max_terms=Config.SUGGEST_MAX_TERMS, top_k=Config.SUGGEST_TOP_K,
+                 memo_size=Config.SUGGEST_MEMO_SIZE):
+        self.max_terms = max_terms
+        self.top_k = top_k
+        self.memo_size = memo_size
+        self._lock = threading.Lock()
+        self._terms = {}            # normalized term -> Term
+        self._keys = []             # sorted (key, normalized term) pairs
+        self._top = {}              # every short prefix -> best terms, best first
+        self._memo = OrderedDict()  # recently asked long prefixes -> best terms
+
+    def __len__(self):
+        return len(self._terms)
+
+    @staticmethod
+    def _keys_of(term):
+        words = term.split(' ')
+        return [(' '.join(words[start:]), term) for start in range(len(words))]
+
+    def _order(self, term):
+        return (-self._terms[term].weight, term)
+
+    def _scan(self, prefix, limit=None):
+        """Distinct terms that have a key starting with ``prefix``"""
+        found = set()
+        index = bisect_left(self._keys, (prefix,))
+        end = len(self._keys) if limit is None else min(len(self._keys), index + limit)
+        while index < end and self._keys[index][0].startswith(prefix):
+            found.add(self._keys[index][1])
+            index += 1
+        return found
+
+    def _cached_prefixes(self, term):
+        """Yield ``(prefix, table)`` for every cached prefix that ``term`` completes.
+
+        Short prefixes are yielded even when not cached yet so a new term
+        creates them; long prefixes only when they are in the memo.
+        """
+        seen = set()
+        for key, _ in self._keys_of(term):
+            for length in range(1, len(key) + 1):
+                prefix = key[:length]
+                if prefix in seen:
+                    continue
+                seen.add(prefix)
+                if length <= PREFIX_CACHE_LENGTH:
+                    yield prefix, self._top
+                elif prefix in self._memo:
+                    yield prefix, self._memo
+
+    def _promote(self, term):
+        """Re-rank ``term`` in the cached prefixes after its weight went up"""
+        for prefix, table in self._cached_prefixes(term):
+            best = table.get(prefix, [])
+            if term not in best:
+                best = best + [term]
+            table[prefix] = sorted(best, key=self._order)[:self.top_k]
+
+    def _demote(self, term):
+        """Recompute the cached prefixes that held ``term`` after it lost weight"""
+        for prefix, table in list(self._cached_prefixes(term)):
+            if term not in table.get(prefix, ()):
+                continue
+            if table is self._memo:
+                del self._memo[prefix]  # recomputed when asked again
+                continue
+            best = heapq.nsmallest(self.top_k, self._scan(prefix), key=self._order)
+            if best:
+                self._top[prefix] = best
+            else:
+                del self._top[prefix]
+
+    def _add(self, text, kind, products=0, orders=0):
+        term = normalize(text)
+        if not term:
+            return
+        entry = self._terms.get(term)
+        if entry is None:
+            if len(self._terms) >= self.max_terms:
+                return  # admitted by the next rebuild if it is popular enough
+            entry = self._terms[term] = Term(' '.join(text.split()), kind)
+            for key in self._keys_of(term):
+                insort(self._keys, key)
+        entry.products += products
+        entry.orders += orders
+        self._promote(term)
+
+    def _remove(self, text):
+        term = normalize(text)
+        entry = self._terms.get(term)
+        if entry is None:
+            return
+        entry.products -= 1
+        if entry.products <= 0:
+            for key in self._keys_of(term):
+                index = bisect_left(self._keys, key)
+                if index < len(self._keys) and self._keys[index] == key:
+                    del self._keys[index]
+            self._demote(term)
+            del self._terms[term]
+        else:
+            self._demote(term)
+
+    def load(self, terms):
+        """Replace the contents with ``terms``: an iterable of ``(text, kind, products, orders)``.
+
+        Only the ``max_terms`` heaviest terms are kept.
+        """
+        merged = {}
+        for text, kind, products, orders in terms:
+            term = normalize(text)
+            if not term:
+                continue
+            entry = merged.get(term)
+            if entry is None:
+                entry = merged[term] = Term(' '.join(text.split()), kind)
+            entry.products += products
+            entry.orders += orders
+
+        ranked = sorted(merged, key=lambda term: (-merged[term].weight, term))[:self.max_terms]
+        merged = {term: merged[term] for term in ranked}
+
+        # Walking terms best first fills each short prefix with its best terms
+        keys = []
+        top = {}
+        for term in ranked:
+            for key in self._keys_of(term):
+                keys.append(key)
+                for length in range(1, min(len(key[0]), PREFIX_CACHE_LENGTH) + 1):
+                    best = top.setdefault(key[0][:length], [])
+                    if len(best) < self.top_k and term not in best:
+                        best.append(term)
+        keys.sort()
+
+        with self._lock:
+            self._terms, self._keys, self._top = merged, keys, top
+            self._memo = OrderedDict()
+
+    def product_changed(self, before, after):
+        """Apply a product create/update/delete; ``before`` and ``after`` are
+        the IndexedProduct of the available product, or None"""
+        with self._lock:
+            if before is not None:
+                self._remove(before.name)
+                self._remove(before.category)
+            if after is not None:
+                self._add(after.name, 'product', products=1)
+                self._add(after.category, 'category', products=1)
+
+    def product_ordered(self, name, category):
+        """Count one more order for a product"""
+        with self._lock:
+            for text in (name, category):
+                entry = self._terms.get(normalize(text))
+                if entry is not None:
+                    entry.orders += 1
+                    self._promote(normalize(text))
+
+    def suggest(self, prefix, limit=None):
+        """Return up to ``limit`` Terms completing ``prefix``, most popular first"""
+        prefix = normalize(prefix)
+        limit = min(limit or self.top_k, self.top_k)
+        if not prefix:
+            return []
+        with self._lock:
+            if len(prefix) <= PREFIX_CACHE_LENGTH:
+                best = self._top.get(prefix, [])
+            else:
+                best = self._memo.get(prefix)
+                if best is None:
+                    best = heapq.nsmallest(self.top_k, self._scan(prefix, SCAN_LIMIT), key=self._order)
+                    self._memo[prefix] = best
+                    if len(self._memo) > self.memo_size:
+                        self._memo.popitem(last=False)
+                else:
+                    self._memo.move_to_end(prefix)
+            return [self._terms[term] for term in best[:limit]]
+
+
+index = SuggestIndex()
+
+
+def _catalog_terms():
+    """Stream ``(text, kind, products, orders)`` for every available product"""
+    # Imported here because models imports this module
+    from models import Order
+
+    orders = {row['_id']: row['count'] for row in db.catalog_collection(Order).aggregate([
+        {'$match': {'status': {'$ne': 'cancelled'}}},
+        {'$group': {'_id': '$product_id', 'count': {'$sum': 1}}},
+    ])}
+    for son in available_products(['name', 'category']):
+        ordered = orders.get(son['_id'], 0)
+        yield son.get('name'), 'product', 1, ordered
+        yield son.get('category'), 'category', 1, ordered
+
+
+loader = IndexLoader('suggest-index', lambda: index.load(_catalog_terms()), Config.SUGGEST_REFRESH_INTERVAL)
+
+
+def ensure_index():
+    """Start a background (re)build if the index is missing or stale"""
+    loader.ensure()
+
+
+def is_ready():
+    return loader.is_ready()
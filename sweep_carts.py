@@ -0,0 +1,25 @@
+import sys
+from mongoengine import connect
+from cart_cleanup import REASONS, backfill_touched_at, sweep
+from config import Config
+
+def sweep_carts(batch_size=None):
+    """Remove cart items whose product was deleted or has stayed unavailable.
+
+    Abandoned items expire on their own through the TTL index; this catches
+    the items that still look active but can never be bought. Run it daily
+    from cron, with the app's PROMETHEUS_MULTIPROC_DIR set so /metrics counts
+    what was removed. The first run also starts the expiry clock of items
+    created before it existed.
+    """
+    connect(host=Config.MONGODB_URI)
+
+    backfilled = backfill_touched_at()
+    if backfilled:
+        print(f"Started the expiry clock of {backfilled} older cart items")
+    purged = sweep(batch_size)
+    for reason in REASONS:
+        print(f"Removed {purged[reason]} cart items ({reason.replace('_', ' ')})")
+
+if __name__ == '__main__':
+    sweep_carts(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,65 @@
+"""Shared fixtures.
+
+Most tests exercise pure functions and need no database. Tests that save
+documents take the ``database`` fixture, which connects MongoEngine to an
+in-memory mongomock client (skipped when mongomock is not installed). Tests
+of updates mongomock does not support take ``mongodb``, a real server named
+by ``TEST_MONGODB_URI`` (skipped when unset); its database is dropped after
+each test. ``client`` is a test client of the app on the mongomock database.
+"""
+import os
+
+import pytest
+
+# Never resolve the deployment's URI (.env) from a test run
+os.environ['MONGODB_URI'] = 'mongodb://localhost:27017/agri_connect_test'
+
+
+def _reset_caches():
+    from cache import archive_counts, pages, product_facets
+
+    # Document ids never repeat, so only the caches keyed by queries are reset
+    pages.clear()
+    archive_counts.clear()
+    product_facets.bump()
+
+
+@pytest.fixture
+def database():
+    mongomock = pytest.importorskip('mongomock')
+    from mongoengine import connect, disconnect
+
+    disconnect()
+    connect('agri_connect_test', host='mongodb://localhost', mongo_client_class=mongomock.MongoClient)
+    yield
+    disconnect()
+    _reset_caches()
+
+
+@pytest.fixture
+def mongodb():
+    uri = os.environ.get('TEST_MONGODB_URI')
+    if not uri:
+        pytest.skip('TEST_MONGODB_URI is not set')
+    from mongoengine import connect, disconnect
+    from mongoengine.connection import get_db
+
+    disconnect()
+    connect(host=uri)
+    yield
+    database = get_db()
+    database.client.drop_database(database.name)
+    disconnect()
+    _reset_caches()
+
+
+@pytest.fixture
+def client(database):
+    import db
+    from app import app
+
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    # As in a fresh worker: the first request creates the required indexes
+    db._pid = None
+    with app.test_client() as client:
+        yield client
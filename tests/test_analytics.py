@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+import analytics
+from models import FarmerDailyRollup, Offer, Order
+
+FARMER = ObjectId()
+
+
+def rollup(product_id, revenue='0', order_count=0, quantity=0, received=0, accepted=0, rejected=0):
+    return SimpleNamespace(product_id=product_id, revenue=Decimal(revenue), order_count=order_count,
+                           quantity=quantity, offers_received=received, offers_accepted=accepted,
+                           offers_rejected=rejected)
+
+
+def rollups(farmer_id):
+    return {(rollup.product_id, rollup.day): rollup for rollup in FarmerDailyRollup.objects(farmer_id=farmer_id)}
+
+
+def test_summarize_adds_up_days_and_products():
+    tomato, onion, okra = ObjectId(), ObjectId(), ObjectId()
+    summary = analytics.summarize([
+        rollup(tomato, '100.50', 2, 10, received=3, accepted=2),
+        rollup(tomato, '49.505', 1, 5, rejected=1),
+        rollup(onion, '300', 1, 30),
+        rollup(okra, received=4),
+    ], days=7)
+    assert summary.days == 7
+    assert summary.revenue == Decimal('450.00')
+    assert (summary.order_count, summary.quantity) == (4, 45)
+    assert (summary.offers_received, summary.offers_accepted, summary.offers_rejected) == (7, 2, 1)
+    assert summary.acceptance_rate == 2 / 3
+    # Products without orders are left out of the ranking
+    assert [(totals.product_id, totals.revenue, totals.order_count, totals.quantity)
+            for totals in summary.top_products] == [(onion, Decimal('300.00'), 1, 30),
+                                                    (tomato, Decimal('150.00'), 3, 15)]
+
+
+def test_acceptance_rate_without_answers():
+    assert analytics.summarize([rollup(ObjectId(), received=2)]).acceptance_rate is None
+
+
+def test_top_products_are_capped():
+    summary = analytics.summarize([rollup(ObjectId(), str(n), 1, 1) for n in range(1, 9)])
+    assert [totals.revenue for totals in summary.top_products] == [Decimal(n) for n in (8, 7, 6, 5, 4)]
+
+
+def test_summary_query_covers_today():
+    query = analytics.summary_query(FARMER, days=1)
+    assert query == {'farmer_id': FARMER, 'day': {'$gte': FarmerDailyRollup.day_of(datetime.utcnow())}}
+
+
+def test_offers_count_on_the_day_they_are_received_and_answered(database):
+    product_id = ObjectId()
+    created_at = datetime(2024, 3, 7, 22, 0)
+    offers = [Offer(consumer_id=ObjectId(), farmer_id=FARMER, product_id=product_id, quantity=1,
+                    offered_price=Decimal('10'), created_at=created_at).save() for _ in range(3)]
+    offers[0].reject()
+    offers[1].status = 'rejected'
+    offers[1].responded_at = datetime(2024, 3, 8, 9, 0)
+    offers[1].save()
+
+    days = rollups(FARMER)
+    received = days[(product_id, datetime(2024, 3, 7))]
+    assert received.offers_received == 3
+    assert days[(product_id, datetime(2024, 3, 8))].offers_rejected == 1
+    assert sum(rollup.offers_rejected for rollup in days.values()) == 2
+
+
+def test_orders_count_until_cancelled(mongodb):
+    product_id = ObjectId()
+    created_at = datetime.utcnow() - timedelta(days=2)
+    orders = [Order(consumer_id=ObjectId(), farmer_id=FARMER, product_id=product_id, quantity=quantity,
+                    price_per_unit=Decimal('12.50'), total_amount=Decimal('12.50') * quantity,
+                    created_at=created_at).save() for quantity in (2, 3)]
+    day = rollups(FARMER)[(product_id, FarmerDailyRollup.day_of(created_at))]
+    assert (day.order_count, day.quantity, day.revenue) == (2, 5, Decimal('62.50'))
+
+    orders[0].status = 'cancelled'
+    orders[0].save()
+    day = rollups(FARMER)[(product_id, FarmerDailyRollup.day_of(created_at))]
+    assert (day.order_count, day.quantity, day.revenue) == (1, 3, Decimal('37.50'))
+    summary = analytics.farmer_summary(FARMER)
+    assert (summary.order_count, summary.revenue) == (1, Decimal('37.50'))
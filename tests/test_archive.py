@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+import archive
+from cache import archive_counts
+from models import Offer
+
+PER_PAGE = 10
+
+
+@pytest.mark.parametrize('hot_total, page, window', [
+    # Pages holding only hot documents
+    (30, 1, None),
+    (30, 3, None),
+    # The page the hot documents end on
+    (25, 3, (0, 5)),
+    # Pages past them
+    (30, 4, (0, 10)),
+    (25, 4, (5, 10)),
+    (25, 5, (15, 10)),
+    # Nothing hot
+    (0, 1, (0, 10)),
+    (0, 2, (10, 10)),
+])
+def test_archive_window(hot_total, page, window):
+    assert archive.archive_window(hot_total, page, PER_PAGE) == window
+
+
+def test_archive_windows_cover_every_document_once():
+    hot_total, archived_total = 23, 31
+    shown = []
+    for page in range(1, 7):
+        start = (page - 1) * PER_PAGE
+        shown.extend(range(start, min(start + PER_PAGE, hot_total)))
+        window = archive.archive_window(hot_total, page, PER_PAGE)
+        if window is not None:
+            skip, limit = window
+            shown.extend(hot_total + n for n in range(skip, min(skip + limit, archived_total)))
+    assert shown == list(range(hot_total + archived_total))
+
+
+def test_merge_drops_documents_in_both_collections():
+    hot = [SimpleNamespace(id=1), SimpleNamespace(id=2)]
+    archived = [SimpleNamespace(id=2), SimpleNamespace(id=3)]
+    assert [item.id for item in archive.merge(hot, archived)] == [1, 2, 3]
+
+
+def test_counts_are_cached_per_generation():
+    query = {'farmer_id': 'f1'}
+    archive.store_count(Offer, query, 4, 12)
+    try:
+        assert archive.lookup_count(Offer, query, 4) == 12
+        assert archive.lookup_count(Offer, query, 5) is None
+        assert archive.lookup_count(Offer, {'farmer_id': 'f2'}, 4) is None
+    finally:
+        archive_counts.clear()
+
+
+def offers(farmer_id, count, status, created_at):
+    return [Offer(consumer_id=ObjectId(), farmer_id=farmer_id, product_id=ObjectId(), quantity=1,
+                  offered_price=Decimal('10'), status=status,
+                  created_at=created_at - timedelta(minutes=n)).save()
+            for n in range(count)]
+
+
+def test_paginate_lists_hot_then_archived_offers(database):
+    farmer_id = ObjectId()
+    old = offers(farmer_id, 12, 'accepted', datetime.utcnow() - timedelta(days=400))
+    recent = offers(farmer_id, 5, 'pending', datetime.utcnow())
+    query = {'farmer_id': farmer_id}
+    assert archive.paginate(Offer, query, 1, PER_PAGE)[0] == 17
+
+    assert archive.archive(Offer, batch_size=5) == 12
+    # The archive run invalidates the counts cached before it
+    total, first = archive.paginate(Offer, query, 1, PER_PAGE)
+    _, second = archive.paginate(Offer, query, 2, PER_PAGE)
+    assert total == 17
+    assert [offer.id for offer in first + second] == [offer.id for offer in recent + old]
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import assets
+from assets import minify_css, minify_js
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('var a = 1;  // one\nvar b = 2;\n', 'var a = 1;\nvar b = 2;\n'),
+    ('a = b /* note */ + c;', 'a = b + c;\n'),
+    # A comment spanning lines still ends the statement
+    ('a = b\n/* one\ntwo */c()', 'a = b\nc()\n'),
+])
+def test_js_comments_and_whitespace(source, expected):
+    assert minify_js(source) == expected
+
+
+@pytest.mark.parametrize('source', [
+    "var s = 'a  // not a comment';\n",
+    'var s = "it\'s /* kept */";\n',
+    "var s = 'escaped \\'  quote';\n",
+    'var s = `a  ${ b + "  }" }  c`;\n',
+    'var s = `outer ${ `inner  ${x}` }`;\n',
+])
+def test_js_strings_are_kept(source):
+    assert minify_js(source) == source
+
+
+@pytest.mark.parametrize('source', [
+    "var re = /\\/\\/  x/g;\n",
+    "if (/[/]  */.test(s)) f();\n",
+    "return /'  \"/.test(s);\n",
+    "s = s.replace(/ +/g, ' ');\n",
+])
+def test_js_regexes_are_kept(source):
+    assert minify_js(source) == source
+
+
+def test_js_division_is_not_a_regex():
+    assert minify_js('var x = a / b;  // half\nvar y = c / 2 / d;') == 'var x = a / b;\nvar y = c / 2 / d;\n'
+
+
+def test_css_whitespace_and_comments():
+    source = '/* Layout */\n.card  >  .title {\n  color: red ;\n  margin: 0 auto;\n}\n'
+    assert minify_css(source) == '.card>.title{color:red;margin:0 auto}\n'
+
+
+def test_css_keeps_the_space_of_descendant_pseudo_classes():
+    assert minify_css('.menu :hover { color: red; }') == '.menu :hover{color:red}\n'
+
+
+def test_css_strings_are_kept():
+    source = '.a::before { content: "  /* x */  ;"; }\n'
+    assert minify_css(source) == '.a::before{content:"  /* x */  ;"}\n'
+
+
+def test_build_writes_hashed_copies_and_the_manifest(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'css' / 'site.css').write_text('body {  margin: 0; }\n')
+    (tmp_path / 'js' / 'site.js').write_text('var a = 1; // x\n')
+
+    manifest = assets.build(str(tmp_path))
+
+    assert set(manifest) == {'css/site.css', 'js/site.js'}
+    assert (tmp_path / manifest['css/site.css']).read_text() == 'body{margin:0}\n'
+    assert json.loads((tmp_path / assets.MANIFEST).read_text()) == manifest
+    # Building again skips the hashed copies and gives the same names
+    assert assets.build(str(tmp_path)) == manifest
@@ -0,0 +1,88 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from bson import ObjectId
+from flask import Flask, session
+
+import conditional
+from cache import documents
+from models import Product
+
+DETAIL = '/product/{}'
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', WTF_CSRF_TIME_LIMIT=3600)
+    app.add_url_rule('/product/<product_id>', 'product_detail', lambda product_id: '')
+    app.add_url_rule('/products', 'product_list', lambda: '')
+    return app
+
+
+def stored_product():
+    """A product written directly, so no price history is recorded"""
+    product = Product(id=ObjectId(), name='Tomato', description='Red', price=Decimal('30.00'),
+                      quantity=10, category='Vegetables', farmer_id=ObjectId(),
+                      created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 1))
+    Product._get_collection().insert_one(product.to_mongo())
+    return product.id
+
+
+def detail_validators(app, product_id):
+    with app.test_request_context(DETAIL.format(product_id)):
+        return conditional._validators(app, conditional._versions())
+
+
+def listing_validators(app, query=''):
+    with app.test_request_context('/products' + query):
+        return conditional._validators(app, conditional._versions())
+
+
+def test_etag_changes_after_a_product_save(app, database):
+    product_id = stored_product()
+    etag, last_modified = detail_validators(app, product_id)
+    assert detail_validators(app, product_id) == (etag, last_modified)
+
+    product = Product.objects.get(id=product_id)
+    product.description = 'Ripe and red'
+    product.save()
+    documents.invalidate(Product, product_id)
+
+    new_etag, new_last_modified = detail_validators(app, product_id)
+    assert new_etag != etag
+    assert new_last_modified > last_modified
+
+
+def test_listing_etag_follows_the_category_counter(app, database):
+    product_id = stored_product()
+    vegetables = listing_validators(app, '?category=Vegetables')
+    fruits = listing_validators(app, '?category=Fruits')
+
+    product = Product.objects.get(id=product_id)
+    product.quantity = 5
+    product.save()
+
+    assert listing_validators(app, '?category=Vegetables')[0] != vegetables[0]
+    # A stock change leaves the facets and other categories alone
+    assert listing_validators(app, '?category=Fruits')[0] == fruits[0]
+
+
+def test_unknown_products_are_rendered(app, database):
+    with app.test_request_context(DETAIL.format('not-an-id')):
+        assert conditional._versions() is None
+    with app.test_request_context(DETAIL.format(ObjectId())):
+        assert conditional._versions() is None
+
+
+def test_logged_in_pages_have_no_last_modified(app):
+    versions = [('all', datetime(2024, 1, 1))]
+    with app.test_request_context('/products'):
+        anonymous = conditional._validators(app, versions)
+    with app.test_request_context('/products'):
+        session['_user_id'] = 'u1'
+        logged_in = conditional._validators(app, versions)
+    assert anonymous[1] is not None
+    assert logged_in[1] is None
+    assert logged_in[0] != anonymous[0]
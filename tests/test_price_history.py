@@ -0,0 +1,70 @@
+from datetime import datetime
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+
+import price_history
+from models import PriceTrend
+
+
+def trend(start, open, high, low, close, quantity):
+    """A summary as ``series`` loads it from its BSON"""
+    return PriceTrend._from_son({
+        '_id': ObjectId(), 'product_id': ObjectId(), 'period': 'day', 'start': start,
+        'open': Decimal128(open), 'high': Decimal128(high), 'low': Decimal128(low),
+        'close': Decimal128(close), 'quantity': quantity, 'changes': 1,
+    })
+
+
+def test_serialize_lists_periods_oldest_first():
+    newest_first = [
+        trend(datetime(2024, 3, 3), '12', '14', '11', '13', 40),
+        trend(datetime(2024, 3, 2), '10', '12.5', '10', '12', 50),
+    ]
+    body = price_history.serialize('day', newest_first)
+    assert body == {
+        'period': 'day',
+        'columns': ['start', 'open', 'high', 'low', 'close', 'quantity'],
+        'points': [['2024-03-02', 10.0, 12.5, 10.0, 12.0, 50],
+                   ['2024-03-03', 12.0, 14.0, 11.0, 13.0, 40]],
+    }
+
+
+def test_serialize_accepts_a_cursor_and_missing_prices():
+    empty = PriceTrend(start=datetime(2024, 3, 1))
+    assert price_history.serialize('week', iter([empty]))['points'] == [
+        ['2024-03-01', None, None, None, None, None]]
+    assert price_history.serialize('week', [])['points'] == []
+
+
+def test_period_start():
+    # Thursday 7 March 2024
+    moment = datetime(2024, 3, 7, 18, 30)
+    assert PriceTrend.period_start(moment, 'day') == datetime(2024, 3, 7)
+    assert PriceTrend.period_start(moment, 'week') == datetime(2024, 3, 4)
+    assert PriceTrend.period_start(datetime(2024, 3, 4), 'week') == datetime(2024, 3, 4)
+
+
+def test_trend_query_reads_the_newest_periods():
+    product_id = ObjectId()
+    query, sort, limit = price_history.trend_query(product_id, 'week')
+    assert query == {'product_id': product_id, 'period': 'week'}
+    assert sort == [('start', -1)]
+    assert limit == price_history.SERIES_LENGTH['week']
+
+
+def test_add_keeps_open_high_low_close(mongodb):
+    product_id = ObjectId()
+    for hour, price, quantity in [(8, '20', 100), (9, '25.50', 90), (10, '18', 80), (11, '22', 70)]:
+        PriceTrend.add(product_id, datetime(2024, 3, 7, hour), Decimal(price), quantity)
+    # The next day opens a new daily summary but stays in the same week
+    PriceTrend.add(product_id, datetime(2024, 3, 8, 9), Decimal('30'), 60)
+
+    days = price_history.serialize('day', PriceTrend.objects(product_id=product_id, period='day')
+                                   .order_by('-start'))['points']
+    weeks = price_history.serialize('week', PriceTrend.objects(product_id=product_id, period='week')
+                                    .order_by('-start'))['points']
+    assert days == [['2024-03-07', 20.0, 25.5, 18.0, 22.0, 70],
+                    ['2024-03-08', 30.0, 30.0, 30.0, 30.0, 60]]
+    assert weeks == [['2024-03-04', 20.0, 30.0, 18.0, 30.0, 60]]
+    assert PriceTrend.objects.get(product_id=product_id, period='week').changes == 5
@@ -0,0 +1,80 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+from pymongo import ReadPreference
+
+import db
+
+
+def write_event(collection, command='update'):
+    return SimpleNamespace(command_name=command, command={command: collection})
+
+
+@pytest.fixture
+def app(monkeypatch):
+    catalog_reads, max_staleness = db._catalog_reads, db._max_staleness
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', MONGODB_CATALOG_READ_PREFERENCE='secondaryPreferred',
+                      MONGODB_MAX_STALENESS_SECONDS=90,
+                      MONGODB_SETTINGS={'host': 'mongodb://localhost:27017/agri_connect_test'})
+    db.init_app(app)
+    # No query runs, so there is no connection (or required index) to set up
+    monkeypatch.setattr(db, '_pid', os.getpid())
+
+    @app.route('/write/<collection>')
+    def write(collection):
+        db.routing_listener.started(write_event(collection))
+        return db.catalog_read_preference().mongos_mode
+
+    @app.route('/read')
+    def read():
+        return db.catalog_read_preference().mongos_mode
+
+    yield app
+    db._catalog_reads, db._max_staleness = catalog_reads, max_staleness
+
+
+def test_catalog_reads_go_to_secondaries(app):
+    preference = db.catalog_read_preference()
+    assert preference.mongos_mode == 'secondaryPreferred'
+    assert preference.max_staleness == 90
+    assert app.test_client().get('/read').text == 'secondaryPreferred'
+
+
+def test_catalog_writes_pin_reads_to_the_primary(app):
+    client = app.test_client()
+    # The write itself was routed before it happened
+    assert client.get('/write/products').text == 'secondaryPreferred'
+    assert client.get('/read').text == 'primary'
+    with client.session_transaction() as session:
+        assert session['primary_until'] == pytest.approx(time.time() + 90, abs=2)
+
+
+@pytest.mark.parametrize('collection', ['cart_items', 'offers', 'orders'])
+def test_other_writes_leave_reads_on_secondaries(app, collection):
+    client = app.test_client()
+    client.get(f'/write/{collection}')
+    assert client.get('/read').text == 'secondaryPreferred'
+
+
+def test_pin_expires(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['primary_until'] = int(time.time()) - 1
+    assert client.get('/read').text == 'secondaryPreferred'
+
+
+def test_writes_outside_requests_are_ignored(app):
+    db.routing_listener.started(write_event('products', 'insert'))
+    assert db.catalog_read_preference().mongos_mode == 'secondaryPreferred'
+
+
+def test_primary_mode_never_pins(app):
+    db.configure_reads('primary', 90)
+    client = app.test_client()
+    assert client.get('/write/users').text == 'primary'
+    with client.session_transaction() as session:
+        assert 'primary_until' not in session
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import pytest
+from mongoengine import NotUniqueError
+
+from app import duplicate_user_field
+from forms import RegistrationForm
+from models import User
+
+
+def register(client, username, email):
+    return client.post('/register', data={
+        'username': username, 'email': email, 'full_name': 'Asha Patil', 'role': 'farmer',
+        'password': 'secret123', 'confirm_password': 'secret123',
+    })
+
+
+def test_registration_creates_the_user(client):
+    response = register(client, 'asha', 'asha@example.com')
+    assert response.status_code == 302
+    assert User.objects(username='asha').count() == 1
+
+
+@pytest.mark.parametrize('username, email, field', [
+    ('asha', 'other@example.com', 'username'),
+    ('other', 'asha@example.com', 'email'),
+])
+def test_duplicates_are_rejected_without_create_indexes(client, username, email, field):
+    register(client, 'asha', 'asha@example.com')
+    response = register(client, username, email)
+    assert response.status_code == 200
+    assert RegistrationForm.DUPLICATE_ERRORS[field].encode() in response.data
+    assert User.objects.count() == 1
+
+
+@pytest.mark.parametrize('message, field', [
+    ('E11000 duplicate key error collection: agri.users index: username_1 dup key', 'username'),
+    ('E11000 duplicate key error collection: agri.users index: email_1 dup key', 'email'),
+])
+def test_duplicate_user_field_reads_the_index_name(message, field):
+    form = SimpleNamespace(DUPLICATE_ERRORS=RegistrationForm.DUPLICATE_ERRORS)
+    assert duplicate_user_field(NotUniqueError(message), form) == field
+
+
+def test_duplicate_user_field_without_an_index_name(database):
+    User(username='asha', email='asha@example.com', full_name='Asha', role='farmer',
+         password_hash='x').save()
+    form = SimpleNamespace(DUPLICATE_ERRORS=RegistrationForm.DUPLICATE_ERRORS,
+                           email=SimpleNamespace(data='asha@example.com'))
+    assert duplicate_user_field(NotUniqueError('duplicate'), form) == 'email'
+    form.email.data = 'new@example.com'
+    assert duplicate_user_field(NotUniqueError('duplicate'), form) == 'username'
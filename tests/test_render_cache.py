@@ -0,0 +1,81 @@
+import pytest
+from flask import Flask, flash, render_template_string
+
+import render_cache
+from cache import fragments, pages
+from render_cache import CSRF_PLACEHOLDER
+
+PAGE = '<form><input name="csrf_token" value="{{ csrf_token() }}"></form>'
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', WTF_CSRF_ENABLED=True)
+    render_cache.init_app(app)
+    app.context_processor(lambda: {'csrf_token': render_cache.csrf_token})
+
+    @app.route('/')
+    def index():
+        return render_template_string(PAGE)
+
+    @app.route('/flashed')
+    def product_list():
+        flash('Saved')
+        return render_template_string(PAGE)
+
+    yield app
+    pages.clear()
+
+
+def test_cacheable_page_renders_the_placeholder(app):
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        assert render_cache.csrf_token() == CSRF_PLACEHOLDER
+
+
+def test_other_pages_render_the_token(app):
+    with app.test_request_context('/', method='POST'):
+        app.preprocess_request()
+        token = render_cache.csrf_token()
+    assert token != CSRF_PLACEHOLDER
+    assert CSRF_PLACEHOLDER not in token
+
+
+def test_placeholder_is_swapped_on_every_response(app):
+    first = app.test_client().get('/')
+    second = app.test_client().get('/')
+    assert first.headers['X-Render-Cache'] == 'miss'
+    assert second.headers['X-Render-Cache'] == 'hit'
+    for response in (first, second):
+        assert CSRF_PLACEHOLDER.encode() not in response.data
+    # Each visitor's session gets its own token, the cached body stays shared
+    assert first.data != second.data
+    body, _ = pages.lookup(('index', (), ()))
+    assert CSRF_PLACEHOLDER.encode() in body
+
+
+def test_flashed_pages_are_not_stored(app):
+    response = app.test_client().get('/flashed')
+    assert 'X-Render-Cache' not in response.headers
+    assert CSRF_PLACEHOLDER.encode() not in response.data
+
+
+def test_product_tags():
+    tags = render_cache.product_tags('p1', 'Fruits', 'Fruits', '', facets=False)
+    assert tags == ['product:p1', 'listing', 'category:Fruits']
+    assert render_cache.listing_tags() == ['listing', 'facets']
+
+
+def test_fragment_tag_renders_once_per_key():
+    env = Flask(__name__).jinja_env
+    env.add_extension(render_cache.FragmentCacheExtension)
+    template = env.from_string('{% cache "card", id %}{{ calls.append(id) or id }}{% endcache %}')
+    calls = []
+    try:
+        assert template.render(id='a', calls=calls) == 'a'
+        assert template.render(id='a', calls=calls) == 'a'
+        assert template.render(id='b', calls=calls) == 'b'
+        assert calls == ['a', 'b']
+    finally:
+        fragments.clear()
@@ -0,0 +1,107 @@
+from bson import ObjectId
+
+import search
+from indexing import IndexedProduct
+from search import SearchIndex, expand, normalize, trigrams
+
+
+def product(name, category='Vegetables', description=''):
+    return IndexedProduct(name, category, description)
+
+
+def build(*products):
+    ids = [ObjectId() for _ in products]
+    index = SearchIndex(min_similarity=0.45, description_chars=200)
+    index.load(zip(ids, products))
+    return index, ids
+
+
+def test_normalize_lowercases_and_drops_punctuation():
+    assert normalize('  Fresh  TOMATOES, (organic)! ') == 'fresh tomatoes organic'
+    assert normalize(None) == ''
+
+
+def test_trigrams_pad_word_starts():
+    assert trigrams('ab') == {'  a', ' ab', 'ab '}
+    assert trigrams('') == set()
+
+
+def test_expand_adds_synonyms_after_the_query():
+    variants = expand('Tamatar')
+    assert variants[0] == 'tamatar'
+    assert 'tomato' in variants
+
+
+def test_expand_substitutes_inside_longer_queries():
+    assert 'fresh okra' in expand('fresh bhindi')
+    assert 'fresh lady finger' in expand('fresh bhindi')
+
+
+def test_expand_without_synonyms_is_the_normalized_query():
+    assert expand('Red  Apples') == ['red apples']
+
+
+def test_expand_is_capped():
+    assert len(expand('aloo pyaz bhindi gobi methi')) == search.MAX_VARIANTS
+
+
+def test_search_tolerates_typos():
+    index, (tomato, onion) = build(product('Tomato'), product('Onion'))
+    results = index.search('tomatoe')
+    assert [product_id for product_id, _ in results] == [tomato]
+
+
+def test_search_finds_regional_names():
+    index, (okra, tomato) = build(product('Okra'), product('Tomato'))
+    assert [product_id for product_id, _ in index.search('bhindi')] == [okra]
+    assert [product_id for product_id, _ in index.search('tamatar')] == [tomato]
+
+
+def test_title_matches_rank_above_description_matches():
+    index, (in_title, in_description) = build(
+        product('Mango', 'Fruits'),
+        product('Fruit box', 'Fruits', 'Seasonal mango and banana'),
+    )
+    results = index.search('mango')
+    assert [product_id for product_id, _ in results] == [in_title, in_description]
+    assert results[0][1] > results[1][1]
+
+
+def test_closer_length_breaks_ties():
+    index, (short, long_name) = build(product('Rice', ''), product('Rice bran oil extra', ''))
+    assert [product_id for product_id, _ in index.search('rice')] == [short, long_name]
+
+
+def test_unrelated_query_finds_nothing():
+    index, _ = build(product('Tomato'))
+    assert index.search('xyz') == []
+    assert index.search('') == []
+
+
+def test_limit():
+    index, _ = build(*[product(f'Tomato {n}') for n in range(5)])
+    assert len(index.search('tomato', limit=3)) == 3
+
+
+def test_product_changes_apply_to_search():
+    index, (tomato,) = build(product('Tomato'))
+    index.product_changed(tomato, product('Tomato'), None)
+    assert index.search('tomato') == []
+    added = ObjectId()
+    index.product_changed(added, None, product('Cherry tomato'))
+    assert [product_id for product_id, _ in index.search('tomato')] == [added]
+
+
+def test_changes_during_a_rebuild_are_replayed():
+    index, (old,) = build(product('Tomato'))
+    added = ObjectId()
+
+    def catalog():
+        yield old, product('Tomato')
+        # Saved in this process while the rebuild reads the catalog
+        index.product_changed(added, None, product('Potato'))
+        index.product_changed(old, product('Tomato'), None)
+
+    index.load(catalog())
+    assert index.search('tomato') == []
+    assert [product_id for product_id, _ in index.search('potato')] == [added]
@@ -0,0 +1,88 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from bson import ObjectId
+
+from cache import documents
+from models import CartItem, Offer, Order, Product, ProductSnapshot, User
+
+
+def user(username, role):
+    return User(username=username, email=f'{username}@example.com', full_name=username.title(),
+                role=role, password_hash='x').save()
+
+
+def stored(document):
+    """Insert ``document`` as is, like one saved before snapshots existed
+    (Product.save would also record price history, which mongomock lacks)"""
+    document.id = ObjectId()
+    type(document)._get_collection().insert_one(document.to_mongo())
+    return document
+
+
+@pytest.fixture
+def people(database):
+    farmer, consumer = user('ravi', 'farmer'), user('asha', 'consumer')
+    product = stored(Product(name='Tomato', description='Ripe', price=Decimal('30.00'), quantity=50, unit='kg',
+                             category='Vegetables', farmer_id=farmer.id))
+    return farmer, consumer, product
+
+
+def log_in(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+
+def test_snapshot_is_taken_when_an_item_is_added(people):
+    farmer, consumer, product = people
+    item = CartItem(consumer_id=consumer.id, product_id=product.id, quantity=2).save()
+    assert (item.snapshot.name, item.snapshot.unit, item.snapshot.price) == ('Tomato', 'kg', Decimal('30.00'))
+    assert (item.snapshot.farmer_name, item.snapshot.consumer_name) == ('Ravi', 'Asha')
+
+
+def test_snapshot_keeps_what_was_shown(people):
+    farmer, consumer, product = people
+    offer = Offer(consumer_id=consumer.id, farmer_id=farmer.id, product_id=product.id, quantity=3,
+                  offered_price=Decimal('25')).save()
+    Product._get_collection().update_one({'_id': product.id}, {'$set': {'name': 'Cherry tomato'}})
+    documents.invalidate(Product, product.id)
+
+    offer = Offer.objects.get(id=offer.id)
+    assert offer.display.name == 'Tomato'
+    assert offer.display.farmer_name == 'Ravi'
+
+
+def test_build_without_a_product():
+    snapshot = ProductSnapshot.build(None, None, None)
+    assert snapshot.name is None and snapshot.price is None
+
+
+def test_display_falls_back_to_the_live_documents(people):
+    farmer, consumer, product = people
+    item = stored(CartItem(consumer_id=consumer.id, product_id=product.id, quantity=2))
+    assert item.snapshot is None
+    assert (item.display.name, item.display.farmer_name) == ('Tomato', 'Ravi')
+    assert item.display is item.display
+
+
+def test_pages_render_documents_without_snapshots(client, people):
+    farmer, consumer, product = people
+    stored(CartItem(consumer_id=consumer.id, product_id=product.id, quantity=2))
+    stored(Offer(consumer_id=consumer.id, farmer_id=farmer.id, product_id=product.id, quantity=3,
+                 offered_price=Decimal('25')))
+    stored(Order(consumer_id=consumer.id, farmer_id=farmer.id, product_id=product.id, quantity=4,
+                 price_per_unit=Decimal('30'), total_amount=Decimal('120'),
+                 created_at=datetime.utcnow()))
+
+    log_in(client, consumer)
+    for path in ('/cart', '/offers', '/orders'):
+        response = client.get(path)
+        assert response.status_code == 200, path
+        assert b'Tomato' in response.data, path
+    log_in(client, farmer)
+    for path in ('/farmer/dashboard', '/offers', '/orders'):
+        response = client.get(path)
+        assert response.status_code == 200, path
+        assert b'Asha' in response.data, path